@@ -1,7 +1,5 @@
-from .service import Cart
+from .service import get_lazy_cart
 
 
 def cart(request):
-    # cart = Cart(request)
-    # quantity = cart.get_total_quantity
-    return {'cart': Cart(request)}
+    return {'cart': get_lazy_cart(request)}
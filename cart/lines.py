@@ -0,0 +1,92 @@
+# Компактные позиции корзины и их сериализация для хранения в сессии
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Dict, Union
+
+
+def to_cents(price: Union[Decimal, str, int, float]) -> int:
+    """
+    Переводит цену в копейки.
+    :param price: цена
+    :return: цена в копейках
+    """
+    return int((Decimal(str(price)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+class CartLine:
+    """
+    Позиция корзины: только id предложения, кол-во и цена в копейках.
+    Предложения к позициям не привязываются, их загружает корзина при переборе.
+    """
+    __slots__ = ('offer_id', 'quantity', 'price_cents')
+
+    def __init__(self, offer_id: str, quantity: int, price_cents: int):
+        self.offer_id = str(offer_id)
+        self.quantity = int(quantity)
+        self.price_cents = int(price_cents)
+
+    @property
+    def price(self) -> Decimal:
+        """Цена единицы товара."""
+        return Decimal(self.price_cents).scaleb(-2)
+
+    @property
+    def total_price(self) -> Decimal:
+        """Стоимость позиции."""
+        return Decimal(self.price_cents * self.quantity).scaleb(-2)
+
+    def __eq__(self, other):
+        if not isinstance(other, CartLine):
+            return NotImplemented
+        return (self.offer_id, self.quantity, self.price_cents) == \
+            (other.offer_id, other.quantity, other.price_cents)
+
+    def __repr__(self):
+        return f'CartLine(offer_id={self.offer_id!r}, quantity={self.quantity}, price_cents={self.price_cents})'
+
+
+def dump_line(line: CartLine) -> list:
+    """
+    Сериализует позицию корзины.
+    :param line: позиция корзины
+    :return: [кол-во, цена в копейках]
+    """
+    return [line.quantity, line.price_cents]
+
+
+def load_line(offer_id: str, data: Union[list, dict]) -> CartLine:
+    """
+    Восстанавливает позицию корзины.
+    Поддерживается прежний формат сессии {'quantity': ..., 'price': цена строкой}.
+    :param offer_id: id предложения
+    :param data: сериализованная позиция
+    :return: позиция корзины
+    """
+    if isinstance(data, dict):
+        return CartLine(offer_id, data['quantity'], to_cents(data['price']))
+    quantity, price_cents = data
+    return CartLine(offer_id, quantity, price_cents)
+
+
+def dump_lines(lines: Dict[str, CartLine]) -> Dict[str, list]:
+    """
+    Сериализует позиции корзины в минимальный для сессии вид {id предложения: [кол-во, цена в копейках]}.
+    :param lines: позиции корзины по id предложения
+    :return: данные для сессии
+    """
+    return {offer_id: dump_line(line) for offer_id, line in lines.items() if line.quantity > 0}
+
+
+def load_lines(payload) -> Dict[str, CartLine]:
+    """
+    Восстанавливает позиции корзины из данных сессии.
+    :param payload: данные сессии
+    :return: позиции корзины по id предложения
+    """
+    if not isinstance(payload, dict):
+        return {}
+    lines = {}
+    for offer_id, data in payload.items():
+        line = load_line(offer_id, data)
+        if line.quantity > 0:
+            lines[line.offer_id] = line
+    return lines
@@ -1,42 +1,49 @@
-from typing import List
-from django.conf import settings
-from django.shortcuts import get_object_or_404
+from typing import Dict, List
+from django.utils.functional import cached_property
 
 from product.models import Offer
 from decimal import Decimal
-from promotions.discount_handlers import DISCOUNT_HANDLERS
-from promotions.discount import promos_for_product, is_full_cart_discount
+from cart.lines import CartLine, to_cents
+from cart.storage import get_cart_storage
+from promotions.discount_engine import calculate_cart_discounts
+from shop.memo import get_instances
 
 
 class Cart:
+    """
+    Корзина запроса. Позиции хранятся в компактном виде (CartLine), предложения
+    загружаются только при переборе корзины и в хранилище не попадают.
+    """
 
     def __init__(self, request):
         """
         Инициализация корзины
         """
         self.session = request.session
-        cart = self.session.get(settings.CART_SESSION_ID)
-        if not cart:
-            cart = self.session[settings.CART_SESSION_ID] = {}
-        self.cart = cart
+        self.storage = get_cart_storage(request)
+        self.cart: Dict[str, CartLine] = self.storage.load()
+        self._discounts = None
+
+    def _set_quantity(self, offer_id: str, price_cents: int, quantity: int) -> None:
+        """Обновляет позицию корзины после изменения в хранилище."""
+        if quantity <= 0:
+            self.cart.pop(offer_id, None)
+        elif offer_id in self.cart:
+            self.cart[offer_id].quantity = quantity
+        else:
+            self.cart[offer_id] = CartLine(offer_id, quantity, price_cents)
 
     def add(self, offer, quantity=1, update_quantity=False):
         """
         Добавить товар в корзину или обновить его кол-во
         """
         offer_id = str(offer.id)
-        if offer_id not in self.cart:
-            self.cart[offer_id] = {'quantity': 0,
-                                   'price': str(offer.price)}
-        if update_quantity:
-            self.cart[offer_id]['quantity'] = quantity
-        else:
-            self.cart[offer_id]['quantity'] += quantity
-        self.save()
+        price_cents = to_cents(offer.price)
+        quantity = self.storage.add(offer_id, price_cents, quantity, update_quantity)
+        self._set_quantity(offer_id, price_cents, quantity)
 
     def save(self):
-        self.session[settings.CART_SESSION_ID] = self.cart
-        self.session.modified = True
+        self.storage.save(self.cart)
 
     def remove(self, offer):
         """
@@ -44,118 +51,155 @@ class Cart:
         """
         offer_id = str(offer.id)
         if offer_id in self.cart:
+            self.storage.remove(offer_id)
             del self.cart[offer_id]
-            self.save()
 
     def __iter__(self):
         """
-        Перебор элементов в корзине и получение продуктов из базы данных.
+        Перебор элементов в корзине и получение предложений из базы данных одним запросом.
+        Возвращает для каждой позиции словарь с предложением, ценой, кол-вом и стоимостью;
+        позиции предложений, удаленных из БД, пропускаются.
         """
-        offer_ids = self.cart.keys()
-        offers = Offer.objects.filter(id__in=offer_ids)
-        for offer in offers:
-            self.cart[str(offer.id)]['product'] = offer
-
-        for item in self.cart.values():
-            item['price'] = Decimal(item['price'])
-            item['total_price'] = item['price'] * item['quantity']
-            yield item
+        offers = get_instances(Offer, [int(offer_id) for offer_id in self.cart])
+        for offer_id, line in list(self.cart.items()):
+            offer = offers.get(int(offer_id))
+            if offer is not None:
+                yield {'product': offer, 'price': line.price, 'quantity': line.quantity,
+                       'total_price': line.total_price}
 
     def __len__(self):
         """
         Подсчет всех товаров в корзине.
         """
-        return sum(item['quantity'] for item in self.cart.values())
+        return self.get_total_quantity()
 
     def get_total_price(self):
         """
         Подсчет стоимости товаров в корзине.
         """
-        return sum(Decimal(item['price']) * item['quantity'] for item in self.cart.values())
+        return sum((line.total_price for line in self.cart.values()), Decimal(0))
 
     def clear(self):
         """
-        Удаление корзины из сессии
+        Удаление корзины
         """
-        del self.session[settings.CART_SESSION_ID]
-        self.session.modified = True
+        self.storage.clear()
+        self.cart = {}
 
     def get_total_quantity(self):
-        return sum(item['quantity'] for item in self.cart.values())
+        return sum(line.quantity for line in self.cart.values())
 
     def add_quantity(self, offer):
         offer_id = str(offer.id)
-        quantity = 1
-        self.cart[offer_id]['quantity'] += quantity
-        self.save()
+        quantity = self.storage.incr(offer_id, 1)
+        self._set_quantity(offer_id, to_cents(offer.price), quantity)
 
     def remove_quantity(self, offer):
         offer_id = str(offer.id)
-        quantity = 1
-        self.cart[offer_id]['quantity'] -= quantity
-        if self.cart[offer_id]['quantity'] == 0:
-            del self.cart[offer_id]
-        self.save()
+        quantity = self.storage.incr(offer_id, -1)
+        self._set_quantity(offer_id, to_cents(offer.price), quantity)
+
+    def revision(self) -> tuple:
+        """
+        Ревизия корзины: состав, кол-во и цены позиций.
+        Меняется при любом изменении корзины.
+        """
+        return tuple(sorted((offer_id, line.quantity, line.price_cents) for offer_id, line in self.cart.items()))
+
+    def get_discounts(self) -> Dict[str, Decimal]:
+        """
+        Возвращает приоритетную скидку для каждой позиции корзины.
+        Скидки вычисляются один раз для каждой ревизии корзины.
+        :return: скидка по id предложения
+        """
+        revision = self.revision()
+        if self._discounts is None or self._discounts[0] != revision:
+            self._discounts = (revision, calculate_cart_discounts(
+                {offer_id: {'price': line.price, 'quantity': line.quantity} for offer_id, line in self.cart.items()}))
+        return self._discounts[1]
 
     def total_discount(self):
         """
         Вычисляет суммарную скидку товаров в корзине.
         """
-        total_discount = Decimal(0)
-        for product in self.cart:
-            total_discount += self.__get_best_discount(product)
-
-        return total_discount
+        return sum(self.get_discounts().values(), Decimal(0))
 
     def due(self):
         """Вычисляет сумму корзины с учетом скидки."""
         return self.get_total_price() - self.total_discount()
 
-    def __get_best_discount(self, offer_id: str) -> Decimal:
+
+def get_cart(request) -> Cart:
+    """
+    Возвращает корзину текущего запроса. Корзина создается один раз на запрос,
+    поэтому вычисленные скидки используются повторно.
+    :param request: запрос
+    :return: корзина
+    """
+    if not hasattr(request, '_cart'):
+        request._cart = Cart(request)
+    return request._cart
+
+
+class LazyCart:
+    """
+    Корзина для шаблонов. Кол-во и стоимость товаров вычисляются по данным хранилища корзины без запросов к БД,
+    корзина создается при первом обращении, а предложения загружаются и скидки вычисляются
+    только если шаблон перебирает корзину или выводит скидку.
+    """
+
+    def __init__(self, request):
+        self._request = request
+        self._items = None
+
+    @cached_property
+    def _cart(self) -> Cart:
+        return get_cart(self._request)
+
+    def __len__(self):
         """
-            Вычисляет приоритетную скидку.
-            :param offer_id: id товара (предложения).
-            :return: Приоритетная скидка.
+        Подсчет всех товаров в корзине.
         """
-        all_discounts = self.__get_discounts(offer_id)
-
-        if all_discounts:
-            return max(all_discounts)
+        return self.get_total_quantity()
 
-        return Decimal(0)
+    def get_total_quantity(self):
+        return self._cart.get_total_quantity()
 
-    def __get_discounts(self, offer_id: str) -> List[Decimal]:
+    def get_total_price(self):
         """
-            Возвращает список скидок на товар, для всех акций в которых
-            он участвует.
-            :param offer_id: id товара (предложения).
-            :return: Список скидок.
+        Подсчет стоимости товаров в корзине.
         """
-        result = []
-        # Получаем продукт и его id
-        offer = get_object_or_404(Offer, id=int(offer_id))
-        product_id = offer.product.id
+        return self._cart.get_total_price()
 
-        # Получаем список акций для этого продукта
-        promo_list = promos_for_product(product_id)
+    def items(self) -> List[dict]:
+        """
+        Возвращает позиции корзины с предложениями. Предложения загружаются один раз для каждой ревизии корзины.
+        """
+        revision = self._cart.revision()
+        if self._items is None or self._items[0] != revision:
+            self._items = (revision, list(self._cart))
+        return self._items[1]
 
-        # для каждой акции вычисляем скидку
-        for promo in promo_list:
-            # Определяем тип акции и применяем соответствующий обработчик
-            # для вычисления скидки
-            promo_code = promo.promo_type.code
+    def __iter__(self):
+        return iter(self.items())
 
-            # Вычисление скидки для всех акций
-            discount = Decimal(0)
-            if promo_code in DISCOUNT_HANDLERS:
-                handler = DISCOUNT_HANDLERS[promo_code]
-                if promo_code == 5:
-                    qty = len(self.cart)
-                    total_price = self.get_total_price()
-                    if is_full_cart_discount(qty=qty, total_price=total_price, promo=promo):
-                        discount = handler(self.cart[offer_id], promo)
-                elif promo_code in (1, 3, 4):
-                    discount = handler(self.cart[offer_id], promo)
-            result.append(discount)
+    def total_discount(self):
+        """
+        Вычисляет суммарную скидку товаров в корзине.
+        """
+        return self._cart.total_discount()
 
-        return result
+    def due(self):
+        """Вычисляет сумму корзины с учетом скидки."""
+        return self._cart.due()
+
+
+def get_lazy_cart(request) -> LazyCart:
+    """
+    Возвращает корзину текущего запроса для шаблонов.
+    :param request: запрос
+    :return: корзина для шаблонов
+    """
+    if not hasattr(request, '_lazy_cart'):
+        request._lazy_cart = LazyCart(request)
+    return request._lazy_cart
@@ -0,0 +1,11 @@
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+
+from cart.storage import get_cart_storage
+
+
+@receiver(user_logged_in)
+def merge_cart_on_login(sender, request, user, **kwargs):
+    """Объединяет корзину анонимного пользователя с его корзиной после входа."""
+    if request is not None and hasattr(request, 'session'):
+        get_cart_storage(request).login()
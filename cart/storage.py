@@ -0,0 +1,265 @@
+# Хранилища корзины: в сессии (по умолчанию) и в хеше Redis
+import uuid
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from cart.lines import CartLine, dump_lines, load_lines
+
+# Ключ id корзины в сессии (для корзин анонимных пользователей в Redis)
+CART_ID_SESSION_KEY = 'cart_id'
+
+
+class BaseCartStorage:
+    """
+    Интерфейс хранилища корзины. Позиции корзины передаются как {id предложения: CartLine}.
+    """
+
+    def __init__(self, request):
+        self.request = request
+
+    def load(self) -> Dict[str, CartLine]:
+        """Возвращает позиции корзины."""
+        raise NotImplementedError
+
+    def add(self, offer_id: str, price_cents: int, quantity: int, update_quantity: bool = False) -> int:
+        """
+        Добавляет товар в корзину или обновляет его кол-во.
+        :param offer_id: id предложения
+        :param price_cents: цена в копейках, сохраняется при первом добавлении товара
+        :param quantity: кол-во
+        :param update_quantity: заменить кол-во, а не увеличить
+        :return: новое кол-во товара
+        """
+        raise NotImplementedError
+
+    def incr(self, offer_id: str, delta: int) -> int:
+        """
+        Изменяет кол-во товара, находящегося в корзине. Товар с нулевым кол-вом удаляется.
+        :param offer_id: id предложения
+        :param delta: изменение кол-ва
+        :return: новое кол-во товара, 0 - если товара нет в корзине
+        """
+        raise NotImplementedError
+
+    def remove(self, offer_id: str) -> None:
+        """Удаляет товар из корзины."""
+        raise NotImplementedError
+
+    def save(self, lines: Dict[str, CartLine]) -> None:
+        """Сохраняет все позиции корзины."""
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        """Удаляет корзину."""
+        raise NotImplementedError
+
+    def merge(self, lines: Dict[str, CartLine]) -> None:
+        """
+        Добавляет в корзину позиции другой корзины: кол-во одинаковых товаров суммируется,
+        сохраняется цена текущей корзины.
+        :param lines: позиции другой корзины
+        """
+        for offer_id, line in lines.items():
+            self.add(offer_id, line.price_cents, line.quantity)
+
+    def login(self) -> None:
+        """Объединяет корзину, собранную до входа, с корзиной пользователя. Вызывается после входа."""
+
+
+class SessionCartStorage(BaseCartStorage):
+    """
+    Корзина в сессии пользователя в компактном виде {id предложения: [кол-во, цена в копейках]}.
+    Каждое изменение сохраняет сессию целиком.
+    """
+
+    def __init__(self, request):
+        super().__init__(request)
+        self.session = request.session
+
+    def load(self) -> Dict[str, CartLine]:
+        return load_lines(self.session.get(settings.CART_SESSION_ID))
+
+    def _payload(self) -> dict:
+        """Возвращает данные корзины в сессии, корзина в прежнем формате преобразуется в компактный."""
+        payload = self.session.get(settings.CART_SESSION_ID)
+        if not isinstance(payload, dict) or any(isinstance(data, dict) for data in payload.values()):
+            payload = self.session[settings.CART_SESSION_ID] = dump_lines(load_lines(payload))
+        return payload
+
+    def _modified(self) -> None:
+        self.session.modified = True
+
+    def add(self, offer_id: str, price_cents: int, quantity: int, update_quantity: bool = False) -> int:
+        payload = self._payload()
+        current, price_cents = payload.get(offer_id, (0, price_cents))
+        quantity = quantity if update_quantity else current + quantity
+        if quantity > 0:
+            payload[offer_id] = [quantity, price_cents]
+        else:
+            payload.pop(offer_id, None)
+        self._modified()
+        return quantity
+
+    def incr(self, offer_id: str, delta: int) -> int:
+        payload = self._payload()
+        if offer_id not in payload:
+            return 0
+        return self.add(offer_id, payload[offer_id][1], delta)
+
+    def remove(self, offer_id: str) -> None:
+        payload = self._payload()
+        if offer_id in payload:
+            del payload[offer_id]
+            self._modified()
+
+    def save(self, lines: Dict[str, CartLine]) -> None:
+        self.session[settings.CART_SESSION_ID] = dump_lines(lines)
+        self._modified()
+
+    def clear(self) -> None:
+        if settings.CART_SESSION_ID in self.session:
+            del self.session[settings.CART_SESSION_ID]
+        self._modified()
+
+
+# Изменение кол-ва товара, находящегося в корзине: поле кол-ва изменяется, только если у позиции есть цена;
+# позиция с нулевым кол-вом удаляется. KEYS[1] - ключ корзины, ARGV - id предложения, изменение кол-ва, TTL
+INCR_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], ARGV[1] .. ':p') == 0 then
+    return 0
+end
+local quantity = redis.call('HINCRBY', KEYS[1], ARGV[1] .. ':q', ARGV[2])
+if quantity <= 0 then
+    redis.call('HDEL', KEYS[1], ARGV[1] .. ':q', ARGV[1] .. ':p')
+end
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return quantity
+"""
+
+# Добавление позиций другой корзины: цена сохраняется, если позиции еще нет, кол-во суммируется;
+# позиции с нулевым кол-вом удаляются. KEYS[1] - ключ корзины, ARGV - TTL и тройки (id предложения, кол-во, цена)
+MERGE_SCRIPT = """
+for index = 2, #ARGV, 3 do
+    local offer_id = ARGV[index]
+    redis.call('HSETNX', KEYS[1], offer_id .. ':p', ARGV[index + 2])
+    if redis.call('HINCRBY', KEYS[1], offer_id .. ':q', ARGV[index + 1]) <= 0 then
+        redis.call('HDEL', KEYS[1], offer_id .. ':q', offer_id .. ':p')
+    end
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+"""
+
+
+class RedisCartStorage(BaseCartStorage):
+    """
+    Корзина в хеше Redis: поля '<id предложения>:q' (кол-во) и '<id предложения>:p' (цена в копейках).
+    Изменение кол-ва - одна атомарная команда HINCRBY (или скрипт Lua, если нужна проверка позиции),
+    сессия при этом не перезаписывается.
+    Корзина пользователя хранится по его id, анонимного пользователя - по id корзины в сессии.
+    """
+
+    def __init__(self, request, client=None, key: Optional[str] = None):
+        """
+        :param request: запрос
+        :param client: клиент Redis, по умолчанию соединение django_redis CART_REDIS_ALIAS
+        :param key: ключ корзины, по умолчанию корзина текущего пользователя
+        """
+        super().__init__(request)
+        if client is None:
+            from django_redis import get_redis_connection
+
+            client = get_redis_connection(settings.CART_REDIS_ALIAS)
+        self.client = client
+        self.key = key or self.cart_key(request)
+
+    @staticmethod
+    def anonymous_key(cart_id: str) -> str:
+        return f'cart:anonymous:{cart_id}'
+
+    @classmethod
+    def cart_key(cls, request) -> str:
+        """Возвращает ключ корзины пользователя или анонимной корзины сессии."""
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f'cart:user:{user.pk}'
+        cart_id = request.session.get(CART_ID_SESSION_KEY)
+        if cart_id is None:
+            cart_id = request.session[CART_ID_SESSION_KEY] = uuid.uuid4().hex
+        return cls.anonymous_key(cart_id)
+
+    def load(self) -> Dict[str, CartLine]:
+        fields = {}
+        for field, value in self.client.hgetall(self.key).items():
+            offer_id, kind = field.decode().rsplit(':', 1)
+            fields.setdefault(offer_id, {})[kind] = int(value)
+        # позиция без цены или кол-ва неполная и в корзину не попадает
+        return {offer_id: CartLine(offer_id, values['q'], values['p'])
+                for offer_id, values in fields.items() if 'p' in values and values.get('q', 0) > 0}
+
+    def _touch(self, pipe) -> None:
+        pipe.expire(self.key, settings.CART_REDIS_TTL)
+
+    def add(self, offer_id: str, price_cents: int, quantity: int, update_quantity: bool = False) -> int:
+        with self.client.pipeline() as pipe:
+            pipe.hsetnx(self.key, f'{offer_id}:p', price_cents)
+            if update_quantity:
+                pipe.hset(self.key, f'{offer_id}:q', quantity)
+            else:
+                pipe.hincrby(self.key, f'{offer_id}:q', quantity)
+            self._touch(pipe)
+            result = pipe.execute()
+        quantity = quantity if update_quantity else int(result[1])
+        if quantity <= 0:
+            self.remove(offer_id)
+        return quantity
+
+    def incr(self, offer_id: str, delta: int) -> int:
+        quantity = self.client.register_script(INCR_SCRIPT)(
+            keys=[self.key], args=[offer_id, delta, settings.CART_REDIS_TTL])
+        return int(quantity)
+
+    def remove(self, offer_id: str) -> None:
+        self.client.hdel(self.key, f'{offer_id}:q', f'{offer_id}:p')
+
+    def save(self, lines: Dict[str, CartLine]) -> None:
+        with self.client.pipeline() as pipe:
+            pipe.delete(self.key)
+            mapping = {}
+            for offer_id, line in lines.items():
+                mapping[f'{offer_id}:q'] = line.quantity
+                mapping[f'{offer_id}:p'] = line.price_cents
+            if mapping:
+                pipe.hset(self.key, mapping=mapping)
+                self._touch(pipe)
+            pipe.execute()
+
+    def clear(self) -> None:
+        self.client.delete(self.key)
+
+    def merge(self, lines: Dict[str, CartLine]) -> None:
+        args = [settings.CART_REDIS_TTL]
+        for offer_id, line in lines.items():
+            args.extend((offer_id, line.quantity, line.price_cents))
+        self.client.register_script(MERGE_SCRIPT)(keys=[self.key], args=args)
+
+    def login(self) -> None:
+        """Переносит анонимную корзину сессии в корзину пользователя и удаляет ее."""
+        cart_id = self.request.session.pop(CART_ID_SESSION_KEY, None)
+        if cart_id is None:
+            return
+        anonymous = RedisCartStorage(self.request, self.client, key=self.anonymous_key(cart_id))
+        lines = anonymous.load()
+        if lines:
+            self.merge(lines)
+        anonymous.clear()
+
+
+def get_cart_storage(request) -> BaseCartStorage:
+    """
+    Возвращает хранилище корзины, заданное в CART_STORAGE_BACKEND.
+    :param request: запрос
+    :return: хранилище корзины
+    """
+    return import_string(settings.CART_STORAGE_BACKEND)(request)
@@ -0,0 +1,92 @@
+import json
+import pickle
+from decimal import Decimal
+
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, tag, override_settings, RequestFactory
+
+from cart.lines import CartLine, dump_lines, load_lines, to_cents
+from cart.service import Cart
+from product.models import Offer
+from .test_discount import create_category, create_sellers, create_products, create_offers
+
+
+@tag('cart')
+class CartLinesTest(SimpleTestCase):
+
+    def test_line(self):
+        """Проверка цены и стоимости позиции."""
+        line = CartLine('7', 3, to_cents('10.10'))
+        self.assertEqual(line.price_cents, 1010)
+        self.assertEqual(line.price, Decimal('10.10'))
+        self.assertEqual(line.total_price, Decimal('30.30'))
+        with self.assertRaises(AttributeError):
+            line.product = object()
+
+    def test_round_trip(self):
+        """Проверка, что сериализованная корзина восстанавливается без изменений."""
+        lines = {'1': CartLine('1', 2, 1010), '25': CartLine('25', 1, 99999)}
+        payload = dump_lines(lines)
+        self.assertEqual(payload, {'1': [2, 1010], '25': [1, 99999]})
+        self.assertEqual(load_lines(json.loads(json.dumps(payload))), lines)
+
+    def test_legacy_payload(self):
+        """Проверка чтения корзины в прежнем формате сессии."""
+        payload = {'1': {'quantity': 2, 'price': '10.10'}, '2': {'quantity': 0, 'price': '5'}}
+        self.assertEqual(load_lines(payload), {'1': CartLine('1', 2, 1010)})
+        self.assertEqual(load_lines([]), {})
+
+    def test_payload_is_smaller(self):
+        """Проверка, что компактная корзина занимает в сессии меньше места."""
+        legacy = {str(offer_id): {'quantity': 2, 'price': '1234.50'} for offer_id in range(100)}
+        compact = dump_lines(load_lines(legacy))
+        self.assertLess(len(json.dumps(compact)), len(json.dumps(legacy)) / 2)
+        self.assertLess(len(pickle.dumps(compact)), len(pickle.dumps(legacy)))
+
+
+@tag('cart')
+@override_settings(CACHES=settings.TEST_CACHES)
+class CartSessionPayloadTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_category()
+        create_sellers()
+        create_products()
+        create_offers()
+
+    def setUp(self) -> None:
+        self.request = RequestFactory().get('/')
+        self.request.session = self.client.session
+
+    def test_iteration_does_not_change_session(self):
+        """Проверка, что перебор корзины не записывает предложения в сессию."""
+        cart = Cart(self.request)
+        for offer in Offer.objects.order_by('id'):
+            cart.add(offer, quantity=2)
+        payload = dict(self.request.session[settings.CART_SESSION_ID])
+
+        with self.assertNumQueries(1):
+            items = list(cart)
+        self.assertEqual({item['product'].id for item in items}, set(Offer.objects.values_list('id', flat=True)))
+        self.assertEqual(sum(item['total_price'] for item in items), cart.get_total_price())
+        self.assertEqual(self.request.session[settings.CART_SESSION_ID], payload)
+        json.dumps(self.request.session[settings.CART_SESSION_ID])
+
+    def test_legacy_session_is_converted(self):
+        """Проверка, что корзина в прежнем формате читается и при изменении сохраняется в компактном виде."""
+        apple, pear = Offer.objects.order_by('id')[:2]
+        self.request.session[settings.CART_SESSION_ID] = {str(apple.id): {'quantity': 2, 'price': str(apple.price)}}
+        cart = Cart(self.request)
+        self.assertEqual(cart.get_total_quantity(), 2)
+        cart.add(pear)
+        self.assertEqual(self.request.session[settings.CART_SESSION_ID], {
+            str(apple.id): [2, to_cents(apple.price)], str(pear.id): [1, to_cents(pear.price)]})
+
+    def test_deleted_offer_is_skipped(self):
+        """Проверка, что позиции удаленных предложений не выводятся."""
+        cart = Cart(self.request)
+        offer = Offer.objects.order_by('id').first()
+        cart.add(offer)
+        Offer.objects.filter(id=offer.id).delete()
+        self.assertEqual(list(Cart(self.request)), [])
@@ -0,0 +1,150 @@
+import os
+from decimal import Decimal
+
+import redis
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.auth.signals import user_logged_in
+from django.test import TestCase, tag, override_settings, RequestFactory
+
+from cart.lines import CartLine, to_cents
+from cart.service import Cart
+from cart.storage import CART_ID_SESSION_KEY, RedisCartStorage, SessionCartStorage, get_cart_storage
+from product.models import Offer
+from users.models import CustomUser
+from .test_discount import create_category, create_sellers, create_products, create_offers
+
+
+def redis_client():
+    """Возвращает клиент Redis, если сервер доступен."""
+    client = redis.Redis.from_url(os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0'), socket_connect_timeout=1)
+    try:
+        client.ping()
+    except redis.RedisError:
+        return None
+    return client
+
+
+REDIS = redis_client()
+
+
+class CartStorageMixin:
+
+    @classmethod
+    def setUpTestData(cls):
+        create_category()
+        create_sellers()
+        create_products()
+        create_offers()
+        cls.user = CustomUser.objects.create_user(email='cart@test.ru', password='12345')
+        cls.apple = Offer.objects.get(product__name='apple')
+        cls.pear = Offer.objects.get(product__name='pear')
+
+    def make_request(self, user=None):
+        request = RequestFactory().get('/')
+        request.session = self.client.session
+        request.user = user or AnonymousUser()
+        return request
+
+
+@tag('cart')
+@override_settings(CACHES=settings.TEST_CACHES)
+class SessionCartStorageTest(CartStorageMixin, TestCase):
+
+    def test_default_backend(self):
+        """Проверка, что по умолчанию корзина хранится в сессии."""
+        self.assertIsInstance(get_cart_storage(self.make_request()), SessionCartStorage)
+
+    def test_cart_operations(self):
+        """Проверка изменения корзины в сессии."""
+        request = self.make_request()
+        cart = Cart(request)
+        cart.add(self.apple, quantity=2)
+        cart.add(self.apple)
+        cart.add(self.pear, quantity=5, update_quantity=True)
+        cart.add_quantity(self.pear)
+        cart.remove_quantity(self.apple)
+        self.assertEqual(request.session[settings.CART_SESSION_ID], {
+            str(self.apple.id): [2, to_cents(self.apple.price)], str(self.pear.id): [6, to_cents(self.pear.price)]})
+
+        cart.remove(self.pear)
+        self.assertEqual(Cart(request).get_total_quantity(), 2)
+        cart.clear()
+        self.assertEqual(Cart(request).cart, {})
+
+
+@tag('cart')
+@override_settings(CART_STORAGE_BACKEND='cart.storage.RedisCartStorage')
+class RedisCartStorageTest(CartStorageMixin, TestCase):
+
+    def setUp(self) -> None:
+        if REDIS is None:
+            self.skipTest('Redis недоступен')
+        self.keys = []
+        self.addCleanup(lambda: self.keys and REDIS.delete(*self.keys))
+
+    def storage(self, request):
+        storage = RedisCartStorage(request, REDIS)
+        self.keys.append(storage.key)
+        return storage
+
+    def test_cart_operations(self):
+        """Проверка изменения корзины в хеше Redis без записи позиций в сессию."""
+        request = self.make_request()
+        storage = self.storage(request)
+        self.assertEqual(storage.add(str(self.apple.id), 10000, 2), 2)
+        self.assertEqual(storage.add(str(self.apple.id), 15000, 1), 3)
+        self.assertEqual(storage.incr(str(self.apple.id), 1), 4)
+        self.assertEqual(storage.add(str(self.pear.id), 20000, 5, update_quantity=True), 5)
+        self.assertEqual(storage.load(), {str(self.apple.id): CartLine(self.apple.id, 4, 10000),
+                                          str(self.pear.id): CartLine(self.pear.id, 5, 20000)})
+        self.assertNotIn(settings.CART_SESSION_ID, request.session)
+        self.assertGreater(REDIS.ttl(storage.key), 0)
+
+        self.assertEqual(storage.incr(str(self.pear.id), -5), 0)
+        self.assertEqual(list(storage.load()), [str(self.apple.id)])
+        storage.clear()
+        self.assertEqual(storage.load(), {})
+
+    def test_concurrent_increments(self):
+        """Проверка, что изменения из разных запросов не теряются."""
+        request = self.make_request()
+        first, second = self.storage(request), self.storage(request)
+        first.add(str(self.apple.id), 10000, 1)
+        second.incr(str(self.apple.id), 2)
+        first.incr(str(self.apple.id), 3)
+        self.assertEqual(second.load()[str(self.apple.id)]['quantity'], 6)
+
+    def test_incr_missing_line(self):
+        """Проверка, что изменение кол-ва товара, которого нет в корзине, не создает позицию без цены."""
+        storage = self.storage(self.make_request())
+        storage.add(str(self.apple.id), 10000, 1)
+        self.assertEqual(storage.incr(str(self.pear.id), 2), 0)
+        self.assertFalse(REDIS.hexists(storage.key, f'{self.pear.id}:q'))
+        self.assertEqual(list(storage.load()), [str(self.apple.id)])
+
+    def test_merge_on_login(self):
+        """Проверка объединения анонимной корзины с корзиной пользователя при входе."""
+        request = self.make_request()
+        anonymous = self.storage(request)
+        anonymous.add(str(self.apple.id), 10000, 2)
+        anonymous.add(str(self.pear.id), 20000, 1)
+        request.user = self.user
+        user_cart = self.storage(request)
+        user_cart.add(str(self.apple.id), 9000, 1)
+
+        user_cart.login()
+
+        self.assertEqual(user_cart.load(), {str(self.apple.id): CartLine(self.apple.id, 3, 9000),
+                                            str(self.pear.id): CartLine(self.pear.id, 1, 20000)})
+        self.assertFalse(REDIS.exists(anonymous.key))
+        self.assertNotIn(CART_ID_SESSION_KEY, request.session)
+
+    def test_login_signal(self):
+        """Проверка, что корзина объединяется после входа пользователя."""
+        request = self.make_request()
+        self.storage(request).add(str(self.apple.id), 10000, 2)
+        request.user = self.user
+        self.keys.append(RedisCartStorage.cart_key(request))
+        user_logged_in.send(sender=CustomUser, request=request, user=self.user)
+        self.assertEqual(Cart(request).get_total_price(), Decimal(200))
@@ -3,7 +3,7 @@ from typing import Optional
 
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ObjectDoesNotExist
-from django.test import TestCase, tag, RequestFactory
+from django.test import TestCase, tag, override_settings, RequestFactory
 from django.conf import settings
 from django.utils import timezone
 
@@ -15,6 +15,7 @@ from cart.service import Cart
 
 
 @tag('discount')
+@override_settings(CACHES=settings.TEST_CACHES)
 class DiscountInCartTest(TestCase):
 
     @classmethod
@@ -81,7 +82,7 @@ class DiscountInCartTest(TestCase):
                 discount = self.cart.total_discount()
                 due = self.cart.due()
                 for_due = self.cart.get_total_price() - discount
-                qty = self.cart.cart[str(offer.id)]["quantity"]
+                qty = self.cart.cart[str(offer.id)].quantity
                 promo_discount = offer.price * promo.discount / 100 * qty
                 self.assertEqual(discount, promo_discount)
                 self.assertEqual(due, for_due)
@@ -118,7 +119,7 @@ class DiscountInCartTest(TestCase):
                 # вычисляем скидку и сумму к оплате
                 discount = self.cart.total_discount()
                 due = self.cart.due()
-                qty = self.cart.cart[str(offer.id)]["quantity"]
+                qty = self.cart.cart[str(offer.id)].quantity
                 promo_discount = (qty // (promo.quantity + 1)) * offer.price
                 for_due = self.cart.get_total_price() - discount
                 self.assertEqual(discount, promo_discount)
@@ -139,7 +140,7 @@ class DiscountInCartTest(TestCase):
                 # вычисляем скидку и сумму к оплате
                 discount = self.cart.total_discount()
                 due = self.cart.due()
-                qty = self.cart.cart[str(offer.id)]["quantity"]
+                qty = self.cart.cart[str(offer.id)].quantity
                 promo_discount = (qty // (promo.quantity + 1)) * offer.price
                 for_due = self.cart.get_total_price() - discount
                 self.assertEqual(discount, promo_discount)
@@ -158,7 +159,7 @@ class DiscountInCartTest(TestCase):
                 # вычисляем скидку и сумму к оплате
                 discount = self.cart.total_discount()
                 due = self.cart.due()
-                qty = self.cart.cart[str(offer.id)]["quantity"]
+                qty = self.cart.cart[str(offer.id)].quantity
                 if qty >= promo.quantity:
                     promo_discount = qty * promo.discount * offer.price / 100
                 else:
@@ -180,7 +181,7 @@ class DiscountInCartTest(TestCase):
                 # вычисляем скидку и сумму к оплате
                 discount = self.cart.total_discount()
                 due = self.cart.due()
-                qty = self.cart.cart[str(offer.id)]["quantity"]
+                qty = self.cart.cart[str(offer.id)].quantity
                 if qty >= promo.quantity:
                     promo_discount = promo.fix_discount
                 else:
@@ -209,7 +210,7 @@ class DiscountInCartTest(TestCase):
                     promo_discount = promo_1.fix_discount
                 elif i > 2:
                     self.cart.add(offer, quantity=1)
-                    qty = self.cart.cart[str(offer.id)]["quantity"]
+                    qty = self.cart.cart[str(offer.id)].quantity
                     promo_discount = qty * promo_2.discount * offer.price / 100
                 # вычисляем скидку и сумму к оплате
                 discount = self.cart.total_discount()
@@ -234,7 +235,7 @@ class DiscountInCartTest(TestCase):
             with self.subTest(i=i):
                 # добавляем товары в корзину
                 self.cart.add(offer, quantity=1)
-                qty = self.cart.cart[str(offer.id)]["quantity"]
+                qty = self.cart.cart[str(offer.id)].quantity
                 if qty < promo_2.quantity:
                     promo_discount = qty * promo_1.discount * offer.price / 100
                 else:
@@ -290,6 +291,36 @@ class DiscountInCartTest(TestCase):
                 self.assertEqual(discount, promo_discount, promo_discount)
                 self.assertEqual(due, for_due)
 
+    def test_discount_queries_do_not_depend_on_cart_size(self):
+        """Проверка, что кол-во запросов при расчете скидки не зависит от кол-ва позиций в корзине."""
+        for name in ('product discount', 'promo 1+1', 'amount discount', 'cart'):
+            promo_activate(name=name)
+        offers = list(Offer.objects.order_by('id'))
+        self.cart.add(offers[0], quantity=3)
+        with self.assertNumQueries(3):
+            self.cart.total_discount()
+
+        for offer in offers[1:]:
+            self.cart.add(offer, quantity=3)
+        with self.assertNumQueries(3):
+            discount = self.cart.total_discount()
+        # для дыни приоритетна акция 1+1, для остальных товаров - скидка на корзину
+        melon = Offer.objects.get(product__name='melon')
+        expected = sum(offer.price * 3 * 15 / 100 for offer in offers if offer != melon) + melon.price
+        self.assertEqual(discount, expected)
+
+    def test_discount_is_memoized_per_revision(self):
+        """Проверка, что скидка пересчитывается только после изменения корзины."""
+        promo_activate(name='product fix discount')
+        offer = Offer.objects.get(product__name='apple')
+        self.cart.add(offer, quantity=1)
+        self.assertEqual(self.cart.total_discount(), Decimal(10))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cart.due(), Decimal(40))
+
+        self.cart.add(offer, quantity=1)
+        self.assertEqual(self.cart.total_discount(), Decimal(20))
+
 
 def create_category():
     """Создаются категории"""
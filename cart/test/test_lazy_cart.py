@@ -0,0 +1,71 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.test import TestCase, tag, override_settings, RequestFactory
+
+from cart.contex_processor import cart as cart_context
+from cart.service import Cart, LazyCart, get_cart
+from product.models import Offer
+from .test_discount import create_category, create_sellers, create_products, create_offers, create_promotions, \
+    promo_activate
+
+
+@tag('cart')
+@override_settings(CACHES=settings.TEST_CACHES)
+class LazyCartTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_category()
+        create_sellers()
+        create_products()
+        create_offers()
+        create_promotions()
+
+    def setUp(self) -> None:
+        self.request = RequestFactory().get('/')
+        self.request.session = self.client.session
+        cart = Cart(self.request)
+        for offer in Offer.objects.order_by('id'):
+            cart.add(offer, quantity=2)
+
+    def test_summary_without_queries(self):
+        """Проверка, что кол-во и стоимость товаров вычисляются без запросов к БД."""
+        with self.assertNumQueries(0):
+            lazy_cart = cart_context(self.request)['cart']
+            self.assertEqual(lazy_cart.get_total_quantity(), 10)
+            self.assertEqual(len(lazy_cart), 10)
+            self.assertEqual(lazy_cart.get_total_price(), Decimal(1300))
+
+    def test_items_are_cached_per_request(self):
+        """Проверка, что предложения загружаются один раз за запрос."""
+        lazy_cart = cart_context(self.request)['cart']
+        self.assertIs(lazy_cart, cart_context(self.request)['cart'])
+        with self.assertNumQueries(1):
+            items = list(lazy_cart)
+            self.assertEqual(list(lazy_cart), items)
+        self.assertEqual({item['product'].product.name for item in items},
+                         {'apple', 'pear', 'banana', 'melon', 'orange'})
+
+        get_cart(self.request).add(items[0]['product'])
+        with self.assertNumQueries(1):
+            self.assertEqual(len(list(lazy_cart)), 5)
+
+    def test_discount_is_shared_with_request_cart(self):
+        """Проверка, что скидка вычисляется один раз за запрос."""
+        promo_activate(name='promo 1+1')
+        lazy_cart = LazyCart(self.request)
+        with self.assertNumQueries(3):
+            self.assertEqual(lazy_cart.total_discount(), Decimal(300))
+            self.assertEqual(get_cart(self.request).due(), Decimal(1000))
+            self.assertEqual(lazy_cart.due(), Decimal(1000))
+
+    def test_empty_session(self):
+        """Проверка корзины без данных в сессии."""
+        request = RequestFactory().get('/')
+        request.session = self.client.session
+        request.session.pop(settings.CART_SESSION_ID, None)
+        with self.assertNumQueries(0):
+            lazy_cart = LazyCart(request)
+            self.assertEqual(lazy_cart.get_total_quantity(), 0)
+            self.assertEqual(lazy_cart.get_total_price(), 0)
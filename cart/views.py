@@ -1,9 +1,8 @@
 from django.shortcuts import redirect, get_object_or_404, render
 from django.views import View
 from product.models import Offer
-from .service import Cart
+from .service import Cart, get_cart, get_lazy_cart
 from .forms import CartAddProductForm
-from django.conf import settings
 from product.services import get_category
 
 
@@ -33,8 +32,7 @@ class CartRemove(View):
 class CartDelete(View):
 
     def post(self, request):
-        if request.session.get(settings.CART_SESSION_ID):
-            del request.session[settings.CART_SESSION_ID]
+        get_cart(request).clear()
         return redirect('/')
 
 
@@ -57,7 +55,7 @@ class RemoveQuantity(View):
 class CartView(View):
 
     def get(self, request):
-        cart = Cart(request)
+        cart = get_lazy_cart(request)
 
         categories = get_category()
         context = {
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 import dj_database_url
 import os
 from pathlib import Path
+from celery.schedules import crontab
 from django.conf import settings
 from config.settings_local import CACHE_STORAGE_TIME
 
@@ -63,6 +64,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'shop.memo.RequestMemoMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
@@ -179,6 +181,11 @@ SESSION_COOKIE_AGE = 30 * 24 * 60 * 60
 MPTT_ADMIN_LEVEL_INDENT = 10
 
 CART_SESSION_ID = 'cart'
+# Хранилище корзины: 'cart.storage.SessionCartStorage' (в сессии) или 'cart.storage.RedisCartStorage' (хеш Redis);
+# для Redis - алиас кеша django_redis и время хранения корзины в секундах
+CART_STORAGE_BACKEND = 'cart.storage.SessionCartStorage'
+CART_REDIS_ALIAS = 'default'
+CART_REDIS_TTL = 60 * 60 * 24 * 30
 
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
@@ -208,6 +215,38 @@ CACHES = {
 
 CELERY_BROKER_URL = os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0')
 CELERY_TASK_TRACK_STARTED = True
+CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+
+# Планировщик акций: за сколько минут до начала дня готовить индекс акций и цены товаров,
+# время хранения цен товаров с учетом акций
+PROMO_PREWARM_MINUTES = 15
+PROMO_PRICE_CACHE_TIME = 60 * 60 * 24
+
+CELERY_BEAT_SCHEDULE = {
+    # активация и завершение акций по датам; повторный запуск в течение дня ничего не меняет
+    'promotions-schedule': {
+        'task': 'promotions.tasks.apply_promo_schedule',
+        'schedule': crontab(minute=0),
+    },
+    'promotions-prewarm': {
+        'task': 'promotions.tasks.prewarm_promo_caches',
+        'schedule': crontab(minute=60 - PROMO_PREWARM_MINUTES, hour=23),
+    },
+    # снятие истекших резервов товаров
+    'stock-release-reservations': {
+        'task': 'product.tasks.release_stock_reservations',
+        'schedule': crontab(),
+    },
+    # оплата заказов, не обработанных сразу после создания
+    'orders-process-payments': {
+        'task': 'orders.tasks.process_payments',
+        'schedule': crontab(),
+    },
+}
+
+# Время резерва товаров при оформлении заказа, в секундах
+STOCK_RESERVATION_TTL = 60 * 15
 
 # Количество акция, отображаемых на странице
 PROMO_PER_PAGE = 4
@@ -219,6 +258,34 @@ CATALOG_PRODUCT_PER_PAGE = 6
 
 CACHE_STORAGE_TIME = 60 * 60 * 24
 
+# Время хранения версий тегов кеша (в секундах). Должно быть больше времени хранения любой записи с тегами:
+# записи хранятся не дольше этого времени, иначе после истечения версии тега снова стала бы актуальной
+# запись, сохраненная до сброса тега
+CACHE_TAG_TIMEOUT = CACHE_STORAGE_TIME * 7
+
+# Локальный кеш процесса перед общим кешем для небольших часто читаемых данных (категории, продавцы, акции):
+# время хранения записи, интервал проверки версий записи в общем кеше (в секундах) и кол-во записей
+CACHE_LOCAL_TIMEOUT = 60
+CACHE_LOCAL_CHECK_INTERVAL = 2
+CACHE_LOCAL_MAX_ENTRIES = 512
+
+# Писать в журнал shop.memo отчет о повторных обращениях, исключенных запоминанием в пределах запроса
+REQUEST_MEMO_REPORT = False
+
+# Кеш блоков главной страницы: время актуальности каждого блока в секундах; сколько еще секунд
+# устаревший блок отдается, пока обновляется в фоне; время блокировки пересчета блока
+# и сколько секунд ждать блок, который пересчитывает другой процесс
+HOME_BLOCKS_TTL = {
+    'banners': 60 * 15,
+    'favorite': 60 * 60 * 24,
+    'popular': 60 * 60,
+    'limited': 60 * 60,
+    'day_offer': 60 * 60 * 24,
+}
+HOME_BLOCK_STALE_TIME = 60 * 60
+HOME_BLOCK_LOCK_TIMEOUT = 60
+HOME_BLOCK_LOCK_WAIT = 2
+
 ADMIN_SETTINGS_ID = 'admin_settings'
 
 DELIVERY_PRICE = 2000
@@ -226,3 +293,67 @@ DELIVERY_PRICE = 2000
 DELIVERY_STOCK = 200
 
 DELIVERY_EXPRESS = 500
+
+# Время хранения данных оформления заказа после последнего шага, в секундах
+CHECKOUT_STATE_TTL = 60 * 60 * 2
+
+# Оплата заказов: платежный шлюз, время ответа имитации шлюза в секундах, кол-во заказов в пакете,
+# кол-во одновременных запросов к шлюзу, через сколько секунд повторить необработанный платеж
+PAYMENT_GATEWAY = 'orders.payment.SimulatedPaymentGateway'
+PAYMENT_SIMULATED_DELAY = 1
+PAYMENT_BATCH_SIZE = 100
+PAYMENT_CONCURRENCY = 20
+PAYMENT_CLAIM_TIMEOUT = 60 * 5
+
+# Режим постраничного вывода каталога и товаров акции: 'offset' (по номеру страницы) или 'cursor' (по курсору).
+# Режим по курсору также включается передачей параметра cursor в query-string
+CATALOG_PAGINATION_MODE = 'offset'
+PROMO_PRODUCTS_PAGINATION_MODE = 'offset'
+
+# Предел точного подсчета товаров при постраничном выводе по курсору
+PAGINATION_APPROXIMATE_COUNT_LIMIT = 1000
+
+# Кеширование страниц каталога: время хранения, максимальный номер кешируемой страницы
+# и максимальное кол-во сохраненных страниц
+CATALOG_CACHE_TIME = 60 * 15
+CATALOG_CACHE_MAX_PAGE = 10
+CATALOG_CACHE_MAX_ENTRIES = 2000
+
+# Границы диапазонов цен для подсчета товаров в фильтре каталога
+CATALOG_PRICE_BUCKETS = [0, 1000, 5000, 10000, 50000, 100000]
+
+# Полнотекстовый поиск товаров: хранилище индекса, кол-во подсказок автодополнения,
+# кол-во товаров, упорядочиваемых по релевантности, и размер пакета при загрузке индекса
+PRODUCT_SEARCH_BACKEND = 'product.search.backends.InMemorySearchBackend'
+PRODUCT_SEARCH_SUGGEST_LIMIT = 10
+PRODUCT_SEARCH_RANKED_RESULTS = 100
+PRODUCT_SEARCH_CHUNK_SIZE = 2000
+# Журнал изменений поискового индекса: время хранения записи журнала и наибольшее кол-во пропущенных версий,
+# которые процесс применяет к индексу, а не перестраивает его целиком
+PRODUCT_SEARCH_CHANGES_TTL = 60 * 60 * 24
+PRODUCT_SEARCH_MAX_CHANGES = 1000
+
+# Импорт товаров из файла: кол-во записей в пакете (одна транзакция)
+IMPORT_BATCH_SIZE = 500
+# Разбор файла импорта: 'stream' - потоково по одному товару, 'document' - целиком; размер порции чтения, байт
+IMPORT_PARSER_MODE = 'stream'
+IMPORT_STREAM_CHUNK_SIZE = 64 * 1024
+# Наибольший размер одного значения (товара) при потоковом разборе, символов: файл с записью больше
+# или с ошибкой разметки не дочитывается до конца
+IMPORT_STREAM_MAX_RECORD_SIZE = 1024 * 1024
+# Импорт загруженного файла в фоне (Celery) и кол-во ошибок импорта на странице состояния
+IMPORT_ASYNC = True
+IMPORT_JOB_ERRORS_SHOWN = 100
+# Время без контрольной точки, после которого выполняемое задание импорта считается прерванным, секунд
+IMPORT_JOB_HEARTBEAT_TIMEOUT = 15 * 60
+
+# Загрузка изображений товаров при импорте: кол-во потоков, одновременных запросов к одному хосту,
+# таймауты (соединение, чтение) в секундах, кол-во повторов и множитель паузы между ними,
+# максимальный размер изображения и размер порции записи в байтах
+IMAGE_FETCH_WORKERS = 8
+IMAGE_FETCH_PER_HOST = 4
+IMAGE_FETCH_TIMEOUT = (3, 10)
+IMAGE_FETCH_RETRIES = 3
+IMAGE_FETCH_BACKOFF = 0.5
+IMAGE_FETCH_MAX_BYTES = 10 * 1024 * 1024
+IMAGE_FETCH_CHUNK_SIZE = 64 * 1024
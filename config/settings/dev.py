@@ -22,8 +22,16 @@ LOGGING = {
             'filters': ['require_debug_true'],
         },
     },
+    'loggers': {
+        'shop.memo': {
+            'handlers': ['debug-console'],
+            'level': 'DEBUG',
+        },
+    },
 }
 
+REQUEST_MEMO_REPORT = True
+
 try:
     INTERNAL_IPS.append('127.0.0.1')  # noqa: F405
 except Exception:
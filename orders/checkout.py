@@ -0,0 +1,92 @@
+# Данные оформления заказа, заполняемые по шагам, отдельно для каждой сессии
+import uuid
+from typing import Any, Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Ключ id оформления заказа в сессии
+CHECKOUT_ID_SESSION_KEY = 'checkout_id'
+
+# Поля оформления заказа
+CHECKOUT_FIELDS = ('first_name', 'last_name', 'email', 'number', 'delivery', 'city', 'address', 'payment',
+                   'total', 'status', 'comment')
+
+# Шаги оформления заказа (название url) и обязательные поля, которые они заполняют, в порядке прохождения
+CHECKOUT_STEPS = (
+    ('order_create', ('first_name', 'last_name', 'email', 'number')),
+    ('order_create_delivery', ('delivery',)),
+    ('order_type_payment', ('payment',)),
+    ('order_create_comment', ('total', 'status')),
+)
+
+
+class CheckoutState:
+    """
+    Данные оформления заказа в кеше в пространстве имен сессии: все поля хранятся
+    одной записью 'checkout:<id оформления>', поэтому истекают одновременно.
+    Запись читается из кеша один раз за запрос, изменения записываются поверх прочитанных данных
+    одним обращением к кешу; данные удаляются через CHECKOUT_STATE_TTL после последнего изменения.
+    """
+
+    def __init__(self, request):
+        checkout_id = request.session.get(CHECKOUT_ID_SESSION_KEY)
+        if checkout_id is None:
+            checkout_id = request.session[CHECKOUT_ID_SESSION_KEY] = uuid.uuid4().hex
+        self.checkout_id = checkout_id
+        self.key = f'checkout:{checkout_id}'
+        self._data: Optional[Dict[str, Any]] = None
+
+    def _load(self) -> Dict[str, Any]:
+        if self._data is None:
+            self._data = cache.get(self.key) or {}
+        return self._data
+
+    def get_many(self, fields: Iterable[str] = CHECKOUT_FIELDS) -> Dict[str, Any]:
+        """
+        Возвращает значения полей, отсутствующие поля равны None.
+        :param fields: поля
+        :return: значение по полю
+        """
+        stored = self._load()
+        return {field: stored.get(field) for field in fields}
+
+    def get(self, field: str) -> Optional[Any]:
+        return self.get_many([field])[field]
+
+    def set_many(self, values: Dict[str, Any]) -> None:
+        """
+        Сохраняет значения полей; срок хранения всех полей отсчитывается заново.
+        :param values: значение по полю
+        """
+        stored = self._load()
+        stored.update(values)
+        cache.set(self.key, dict(stored), settings.CHECKOUT_STATE_TTL)
+
+    def clear(self) -> None:
+        """Удаляет данные оформления заказа."""
+        cache.delete(self.key)
+        self._data = {}
+
+
+def get_checkout_state(request) -> CheckoutState:
+    """
+    Возвращает данные оформления заказа текущей сессии.
+    :param request: запрос
+    :return: данные оформления заказа
+    """
+    if not hasattr(request, '_checkout_state'):
+        request._checkout_state = CheckoutState(request)
+    return request._checkout_state
+
+
+def first_incomplete_step(data: Dict[str, Any]) -> Optional[str]:
+    """
+    Возвращает первый шаг оформления заказа, обязательные поля которого не заполнены.
+    :param data: данные оформления заказа
+    :return: название url шага или None, если все шаги пройдены
+    """
+    for step, fields in CHECKOUT_STEPS:
+        if any(data.get(field) in (None, '') for field in fields):
+            return step
+    return None
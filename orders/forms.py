@@ -30,6 +30,8 @@ class OrderPaymentCreateForm(forms.Form):
 
 class OrderCardForm(forms.Form):
     card_number = forms.CharField(min_length=8, max_length=9, required=True, label='Номер карты',)
+    # Ключ формы: повторная отправка той же формы не создает новый заказ
+    idempotency_key = forms.CharField(max_length=64, required=False, widget=forms.HiddenInput)
 
 
 class OrderCommentForm(forms.Form):
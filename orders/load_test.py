@@ -0,0 +1,86 @@
+# Нагрузочная проверка оформления заказов: параллельные покупатели не должны купить больше остатка
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, connection
+
+from cart.lines import CartLine, to_cents
+from product.inventory import reserve_stock
+from product.models import Offer
+from .services import place_order
+
+# Данные заказов нагрузочной проверки
+LOAD_TEST_ORDER = {'first_name': 'load', 'last_name': 'test', 'email': 'load-test@megano.test', 'number': 1000000,
+                   'delivery': 'D', 'payment': 'C', 'card_number': 12345678, 'status': 'load test'}
+
+
+def run_checkout_load(offer_id: int, buyers: int, quantity: int = 1, workers: Optional[int] = None,
+                      retries: int = 20) -> Dict:
+    """
+    Имитирует одновременное оформление заказов: каждый покупатель в своем потоке и соединении с БД
+    резервирует товар и создает заказ. При ошибке БД (блокировка, конфликт сериализации)
+    покупатель повторяет попытку, как повторил бы запрос клиент.
+    :param offer_id: id предложения с учитываемым остатком
+    :param buyers: кол-во покупателей
+    :param quantity: кол-во единиц товара в заказе
+    :param workers: кол-во потоков, по умолчанию по потоку на покупателя
+    :param retries: кол-во повторов при ошибке БД
+    :return: итоги: остаток до и после, кол-во проданных единиц, отказов, ошибок БД, id заказов
+             и признак перепродажи
+    """
+    offer = Offer.objects.get(id=offer_id)
+    initial = offer.stock
+    lines = {str(offer.id): CartLine(offer.id, quantity, to_cents(offer.price))}
+    workers = workers or buyers
+    start = threading.Barrier(min(workers, buyers))
+    results = Counter()
+    order_ids = []
+    lock = threading.Lock()
+
+    def attempt(key):
+        reserve_stock({offer.id: quantity}, key)
+        return place_order(lines, LOAD_TEST_ORDER, reservation_key=key)[0]
+
+    def checkout(buyer):
+        key = uuid.uuid4().hex
+        order, result = None, 'errors'
+        # первая волна покупателей стартует одновременно
+        if buyer < start.parties:
+            start.wait(timeout=10)
+        try:
+            for retry in range(retries + 1):
+                try:
+                    order, result = attempt(key), 'sold'
+                    break
+                except ValidationError:
+                    result = 'out_of_stock'
+                    break
+                except DatabaseError:
+                    time.sleep(0.005 * (retry + 1))
+        finally:
+            connection.close()
+        with lock:
+            results[result] += 1
+            if result == 'sold':
+                order_ids.append(order.pk)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(checkout, range(buyers)))
+
+    offer.refresh_from_db()
+    sold = results['sold'] * quantity
+    return {
+        'stock': initial,
+        'remaining': offer.stock,
+        'reserved': offer.reserved,
+        'sold': sold,
+        'out_of_stock': results['out_of_stock'],
+        'errors': results['errors'],
+        'order_ids': order_ids,
+        'oversold': sold > initial or offer.stock != initial - sold,
+    }
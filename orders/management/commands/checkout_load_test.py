@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from orders.load_test import run_checkout_load
+from orders.models import Order, OrderItem
+from product.models import Offer
+
+
+class Command(BaseCommand):
+
+    help = 'Нагрузочная проверка оформления заказов: параллельные покупатели не покупают больше остатка'
+
+    def add_arguments(self, parser):
+        parser.add_argument('offer_id', type=int, help='id предложения')
+        parser.add_argument('--stock', type=int, default=10, help='остаток на время проверки')
+        parser.add_argument('--buyers', type=int, default=50, help='кол-во покупателей')
+        parser.add_argument('--quantity', type=int, default=1, help='кол-во единиц в заказе')
+        parser.add_argument('--workers', type=int, default=None, help='кол-во потоков')
+        parser.add_argument('--keep', action='store_true', help='не удалять созданные заказы и не возвращать остаток')
+
+    def handle(self, *args, **options):
+        offer = Offer.objects.filter(id=options['offer_id']).first()
+        if offer is None:
+            raise CommandError(f'Предложение {options["offer_id"]} не найдено')
+        stock, reserved = offer.stock, offer.reserved
+        Offer.objects.filter(id=offer.id).update(stock=options['stock'], reserved=0)
+
+        result = run_checkout_load(offer.id, options['buyers'], options['quantity'], options['workers'])
+
+        if not options['keep']:
+            with transaction.atomic():
+                OrderItem.objects.filter(order_id__in=result['order_ids']).delete()
+                Order.objects.filter(id__in=result['order_ids']).delete()
+                Offer.objects.filter(id=offer.id).update(stock=stock, reserved=reserved)
+
+        self.stdout.write(f'Остаток: {result["stock"]}, продано: {result["sold"]}, '
+                          f'осталось: {result["remaining"]}, в резерве: {result["reserved"]}')
+        self.stdout.write(f'Отказов (нет остатка): {result["out_of_stock"]}, ошибок БД: {result["errors"]}')
+        if result['oversold']:
+            raise CommandError('Обнаружена перепродажа')
+        self.stdout.write(self.style.SUCCESS('Перепродаж нет'))
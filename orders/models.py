@@ -43,6 +43,8 @@ class Order(models.Model):
     payment_code = models.IntegerField(default=0, verbose_name=_('код оплаты'))
     total = models.IntegerField(default=0, verbose_name=_('общая стоимость'))
     comment = models.CharField(max_length=500, blank=True, null=True, verbose_name=_("адрес"))
+    idempotency_key = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False,
+                                       verbose_name=_('ключ идемпотентности'))
 
     class Meta:
         ordering = ('-created',)
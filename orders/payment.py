@@ -0,0 +1,145 @@
+# Обработка оплаты заказов: пакетная отправка платежей в платежный шлюз
+import asyncio
+import datetime
+import logging
+import random
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Order
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_SUCCESS = 'Оплата прошла успешно'
+# Статус заказа, платеж которого отправлен в шлюз
+PAYMENT_PROCESSING = 'Обработка платежа'
+PAYMENT_ERRORS = [
+    'Ошибка сервера',
+    'Банк отклонил платеж',
+    'Неправильный номер счета',
+    'Недостаточно средств',
+    'Счет заблокирован'
+]
+
+
+class PaymentResult(NamedTuple):
+    """Результат платежа: успешен ли платеж и статус для покупателя."""
+    success: bool
+    message: str
+
+
+class BasePaymentGateway:
+    """
+    Интерфейс платежного шлюза. Платежи пакета отправляются одновременно,
+    поэтому ожидание ответа шлюза не должно блокировать поток.
+    """
+
+    async def charge(self, order_id: int, card_number: Optional[int], amount: int) -> PaymentResult:
+        """
+        Списывает оплату заказа.
+        :param order_id: id заказа
+        :param card_number: номер карты
+        :param amount: сумма
+        :return: результат платежа
+        """
+        raise NotImplementedError
+
+
+class SimulatedPaymentGateway(BasePaymentGateway):
+    """
+    Локальная имитация платежного шлюза: отвечает через PAYMENT_SIMULATED_DELAY секунд,
+    отклоняет платежи с нечетных карт и карт, номер которых оканчивается на 0.
+    """
+
+    def __init__(self, delay: Optional[float] = None):
+        self.delay = settings.PAYMENT_SIMULATED_DELAY if delay is None else delay
+
+    async def charge(self, order_id: int, card_number: Optional[int], amount: int) -> PaymentResult:
+        await asyncio.sleep(self.delay)
+        if card_number is None or int(card_number) % 2 or str(card_number)[-1] == '0':
+            return PaymentResult(False, random.choice(PAYMENT_ERRORS))
+        return PaymentResult(True, PAYMENT_SUCCESS)
+
+
+def get_payment_gateway() -> BasePaymentGateway:
+    """Возвращает платежный шлюз, заданный в PAYMENT_GATEWAY."""
+    return import_string(settings.PAYMENT_GATEWAY)()
+
+
+def claim_pending_orders(batch_size: int, order_ids: Optional[Iterable[int]] = None) -> List[Order]:
+    """
+    Выбирает заказы, ожидающие оплаты, и отмечает их как обрабатываемые, чтобы параллельные
+    обработчики не отправили платеж повторно. Заказы, обработка которых не завершилась
+    за PAYMENT_CLAIM_TIMEOUT секунд (обработчик упал), выбираются снова.
+    :param batch_size: кол-во заказов
+    :param order_ids: id заказов, если нужно обработать только их
+    :return: заказы
+    """
+    stale = timezone.now() - datetime.timedelta(seconds=settings.PAYMENT_CLAIM_TIMEOUT)
+    pending = Q(status_payment__isnull=True) | Q(status_payment=PAYMENT_PROCESSING, updated__lt=stale)
+    with transaction.atomic():
+        orders = Order.objects.select_for_update(skip_locked=True).filter(pending, payment_code=0)
+        if order_ids is not None:
+            orders = orders.filter(id__in=list(order_ids))
+        orders = list(orders.order_by('created').only('id', 'card_number', 'total', 'created')[:batch_size])
+        Order.objects.filter(id__in=[order.id for order in orders]).update(
+            status_payment=PAYMENT_PROCESSING, updated=timezone.now())
+    return orders
+
+
+async def charge_orders(gateway: BasePaymentGateway, orders: List[Order], concurrency: int) -> List[tuple]:
+    """
+    Отправляет платежи заказов в шлюз одновременно, не более concurrency запросов сразу.
+    :param gateway: платежный шлюз
+    :param orders: заказы
+    :param concurrency: максимальное кол-во одновременных запросов
+    :return: кортежи (заказ, результат, время ответа шлюза в секундах)
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def charge(order):
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                result = await gateway.charge(order.id, order.card_number, order.total)
+            except Exception:
+                logger.exception('Ошибка платежного шлюза, заказ %s', order.id)
+                result = PaymentResult(False, PAYMENT_ERRORS[0])
+            return order, result, time.monotonic() - started
+
+    return await asyncio.gather(*(charge(order) for order in orders))
+
+
+def process_pending_payments(batch_size: Optional[int] = None, order_ids: Optional[Iterable[int]] = None,
+                             gateway: Optional[BasePaymentGateway] = None) -> List[Dict]:
+    """
+    Обрабатывает пакет заказов, ожидающих оплаты, и сохраняет результаты одним запросом.
+    :param batch_size: кол-во заказов, по умолчанию PAYMENT_BATCH_SIZE
+    :param order_ids: id заказов, если нужно обработать только их
+    :param gateway: платежный шлюз, по умолчанию PAYMENT_GATEWAY
+    :return: метрики заказов: id, успех, время ответа шлюза и время от создания заказа до оплаты в секундах
+    """
+    orders = claim_pending_orders(batch_size or settings.PAYMENT_BATCH_SIZE, order_ids)
+    if not orders:
+        return []
+    results = asyncio.run(charge_orders(gateway or get_payment_gateway(), orders, settings.PAYMENT_CONCURRENCY))
+
+    now = timezone.now()
+    metrics = []
+    for order, result, gateway_time in results:
+        order.status_payment = result.message
+        order.payment_code = 1
+        order.updated = now
+        metrics.append({'order': order.id, 'success': result.success, 'gateway_time': round(gateway_time, 3),
+                        'latency': round((now - order.created).total_seconds(), 3)})
+        logger.info('Оплата заказа %s: %s, ответ шлюза %.3f с, от создания заказа %.3f с',
+                    order.id, result.message, gateway_time, metrics[-1]['latency'])
+    Order.objects.bulk_update([order for order, _result, _time in results],
+                              ['status_payment', 'payment_code', 'updated'])
+    return metrics
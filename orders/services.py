@@ -0,0 +1,65 @@
+# Оформление заказа
+from typing import Dict, Optional, Tuple
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.utils.translation import gettext_lazy as _
+
+from cart.lines import CartLine
+from product.inventory import commit_stock
+from product.models import Offer
+from product.signals import update_catalog
+from .models import Order, OrderItem
+
+
+def place_order(lines: Dict[str, CartLine], order_data: dict, idempotency_key: Optional[str] = None,
+                reservation_key: Optional[str] = None) -> Tuple[Order, bool]:
+    """
+    Создает заказ с товарами корзины в одной транзакции: предложения проверяются одним запросом,
+    остатки списываются, товары заказа создаются одним bulk_create. При ошибке заказ не создается целиком.
+    Повторный вызов с тем же ключом идемпотентности возвращает ранее созданный заказ.
+    :param lines: позиции корзины по id предложения
+    :param order_data: данные заказа (поля модели Order)
+    :param idempotency_key: ключ идемпотентности, например ключ формы оплаты
+    :param reservation_key: ключ оформления заказа, резервы которого списываются
+    :return: кортеж (заказ, создан ли заказ этим вызовом)
+    :raises ValidationError: данные заказа некорректны, предложения нет или остатка недостаточно
+    """
+    if idempotency_key:
+        order = Order.objects.filter(idempotency_key=idempotency_key).first()
+        if order is not None:
+            return order, False
+
+    order = Order(idempotency_key=idempotency_key or None, **order_data)
+    # обязательные поля проверяются до обращения к базе данных, а не ограничениями таблицы
+    order.clean_fields(exclude=['idempotency_key'])
+
+    quantities = {int(offer_id): line.quantity for offer_id, line in lines.items()}
+    try:
+        with transaction.atomic():
+            offers = list(Offer.objects.filter(id__in=list(quantities)).values_list('id', 'product_id', 'stock'))
+            if {offer_id for offer_id, _product_id, _stock in offers} != set(quantities):
+                raise ValidationError(_('Некоторые товары корзины больше не продаются'), code='missing_offers')
+            order.save(force_insert=True)
+            commit_stock(quantities, reservation_key,
+                         tracked=[offer_id for offer_id, _product_id, stock in offers if stock is not None])
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, offer_id=int(offer_id), price=line.price, quantity=line.quantity)
+                for offer_id, line in lines.items()
+            ])
+            # bulk_create не отправляет сигналы: кол-во продаж и наличие обновляются в каталоге явно
+            update_catalog({product_id for _offer_id, product_id, _stock in offers})
+    except IntegrityError as error:
+        if not idempotency_key or not _is_idempotency_conflict(error):
+            raise ValidationError(_('Не удалось оформить заказ'), code='integrity') from error
+        # заказ с тем же ключом создан параллельным запросом
+        order = Order.objects.filter(idempotency_key=idempotency_key).first()
+        if order is None:
+            raise
+        return order, False
+    return order, True
+
+
+def _is_idempotency_conflict(error: IntegrityError) -> bool:
+    """Проверяет, что ошибка вызвана нарушением уникальности ключа идемпотентности заказа."""
+    return 'idempotency_key' in str(error)
@@ -1,29 +1,21 @@
-import random
-import time
 from celery import shared_task
-from django.shortcuts import get_object_or_404
-from .models import Order
+
+from .payment import process_pending_payments
 
 
 @shared_task
 def payment(pk):
-    time.sleep(15)
-    card = get_object_or_404(Order, pk=pk)
-    card_number = card.card_number
-    errors_list = [
-        'Ошибка сервера',
-        'Банк отклонил платеж',
-        'Неправильный номер счета',
-        'Недостаточно средств',
-        'Счет заблокирован'
-    ]
+    """
+    Оплата созданного заказа. Вместе с заказом обрабатываются другие заказы, ожидающие оплаты,
+    поэтому при большом кол-ве заказов платежи отправляются пакетами, а лишние задачи завершаются сразу.
+    """
+    metrics = process_pending_payments()
+    if not any(item['order'] == pk for item in metrics):
+        metrics += process_pending_payments(order_ids=[pk])
+    return metrics
+
 
-    if int(card_number) % 2 or str(card_number)[-1] == '0':
-        status = random.choice(errors_list)
-        card.status_payment = status
-        card.payment_code = 1
-        card.save()
-        return
-    card.status_payment = 'Оплата прошла успешно'
-    card.payment_code = 1
-    card.save()
+@shared_task
+def process_payments():
+    """Обрабатывает заказы, ожидающие оплаты, например после сбоя обработчика."""
+    return process_pending_payments()
@@ -0,0 +1,79 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, tag, override_settings, RequestFactory
+
+from orders.checkout import CHECKOUT_FIELDS, CheckoutState, first_incomplete_step, get_checkout_state
+
+LOCAL_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'checkout-tests',
+    }
+}
+
+
+@tag('orders')
+@override_settings(CACHES=LOCAL_CACHES, CHECKOUT_STATE_TTL=60)
+class CheckoutStateTest(TestCase):
+
+    def make_request(self):
+        request = RequestFactory().get('/')
+        request.session = self.client.session
+        return request
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_sessions_are_isolated(self):
+        """Проверка, что данные оформления заказа разных сессий не пересекаются."""
+        first, second = self.make_request(), self.make_request()
+        second.session = type(first.session)()
+        get_checkout_state(first).set_many({'first_name': 'first', 'delivery': 'A'})
+        get_checkout_state(second).set_many({'first_name': 'second'})
+
+        self.assertEqual(CheckoutState(first).get_many(['first_name', 'delivery']),
+                         {'first_name': 'first', 'delivery': 'A'})
+        self.assertEqual(CheckoutState(second).get_many(['first_name', 'delivery']),
+                         {'first_name': 'second', 'delivery': None})
+
+    def test_single_round_trip(self):
+        """Проверка, что шаг читает данные одним обращением к кешу и записывает все поля одним обращением."""
+        state = get_checkout_state(self.make_request())
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set, \
+                mock.patch.object(cache, 'get', wraps=cache.get) as cache_get:
+            state.get_many()
+            state.set_many({'delivery': 'D', 'city': 'city', 'address': 'address'})
+            data = state.get_many()
+        cache_set.assert_called_once()
+        self.assertEqual(cache_set.call_args[0][2], 60)
+        cache_get.assert_called_once()
+        self.assertEqual(set(data), set(CHECKOUT_FIELDS))
+        self.assertEqual(data['city'], 'city')
+
+    def test_fields_expire_together(self):
+        """Проверка, что запись любого шага продлевает срок хранения всех полей."""
+        state = get_checkout_state(self.make_request())
+        state.set_many({'first_name': 'first', 'number': 1234567})
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            state.set_many({'payment': 'C'})
+        self.assertEqual(cache_set.call_args[0][1], {'first_name': 'first', 'number': 1234567, 'payment': 'C'})
+        self.assertEqual(state.get_many(['first_name', 'payment']), {'first_name': 'first', 'payment': 'C'})
+
+    def test_first_incomplete_step(self):
+        """Проверка определения первого незаполненного шага оформления заказа."""
+        data = {'first_name': 'first', 'last_name': 'last', 'email': 'test@test.ru', 'number': 1234567,
+                'delivery': 'D', 'payment': None, 'total': 100, 'status': 'W'}
+        self.assertEqual(first_incomplete_step({}), 'order_create')
+        self.assertEqual(first_incomplete_step(data), 'order_type_payment')
+        data['payment'] = 'C'
+        self.assertIsNone(first_incomplete_step(data))
+
+    def test_clear(self):
+        """Проверка удаления данных после оформления заказа."""
+        request = self.make_request()
+        state = get_checkout_state(request)
+        self.assertIs(state, get_checkout_state(request))
+        state.set_many({'payment': 'C', 'total': 100})
+        state.clear()
+        self.assertEqual(state.get_many(['payment', 'total']), {'payment': None, 'total': None})
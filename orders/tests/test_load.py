@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+import datetime
+
+from django.conf import settings
+from django.test import TransactionTestCase, tag, override_settings
+from django.utils import timezone
+
+from orders.load_test import run_checkout_load
+from orders.models import Order
+from product.inventory import release_expired_reservations
+from product.models import Offer, Product, StockReservation
+from shop.models import Seller
+
+
+@tag('orders', 'inventory')
+@override_settings(CACHES=settings.TEST_CACHES)
+class CheckoutLoadTest(TransactionTestCase):
+
+    def test_no_overselling(self):
+        """Проверка, что при одновременном оформлении заказов не продается больше остатка."""
+        user = get_user_model().objects.create_user(email='seller@test.ru', password='12345')
+        seller = Seller.objects.create(user=user, name='test', description='test', address='test', number=1234567)
+        product = Product.objects.create(name='flash sale', description='test')
+        offer = Offer.objects.create(product=product, seller=seller, price=100, stock=5)
+
+        result = run_checkout_load(offer.id, buyers=20, workers=8)
+
+        self.assertFalse(result['oversold'], result)
+        self.assertLessEqual(result['sold'], 5)
+        self.assertEqual(result['sold'] + result['out_of_stock'] + result['errors'], 20)
+        self.assertEqual(Order.objects.count(), result['sold'])
+        # резервы покупателей, заказ которых не создан из-за ошибки БД, снимает уборщик
+        self.assertEqual(result['reserved'], sum(StockReservation.objects.values_list('quantity', flat=True)))
+        release_expired_reservations(timezone.now() + datetime.timedelta(seconds=settings.STOCK_RESERVATION_TTL))
+        self.assertEqual(Offer.objects.get(id=offer.id).reserved, 0)
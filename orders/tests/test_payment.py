@@ -0,0 +1,85 @@
+import asyncio
+import time
+
+from django.test import TestCase, tag, override_settings
+
+from orders.models import Order
+from orders.payment import PAYMENT_ERRORS, PAYMENT_PROCESSING, PAYMENT_SUCCESS, BasePaymentGateway, \
+    PaymentResult, SimulatedPaymentGateway, process_pending_payments
+from orders.tasks import payment
+
+
+class FailingGateway(BasePaymentGateway):
+
+    async def charge(self, order_id, card_number, amount):
+        raise ConnectionError
+
+
+@tag('orders', 'payment')
+@override_settings(PAYMENT_SIMULATED_DELAY=0, PAYMENT_CONCURRENCY=50)
+class PaymentTest(TestCase):
+
+    def create_orders(self, card_numbers):
+        return [Order.objects.create(first_name='test', last_name='test', email='test@test.ru', number=7654321,
+                                     card_number=card_number, total=100)
+                for card_number in card_numbers]
+
+    def test_simulated_gateway_rules(self):
+        """Проверка правил имитации шлюза: нечетные карты и карты на 0 отклоняются."""
+        gateway = SimulatedPaymentGateway(delay=0)
+        self.assertEqual(asyncio.run(gateway.charge(1, 12345678, 100)), PaymentResult(True, PAYMENT_SUCCESS))
+        for card_number in (12345677, 12345670, None):
+            result = asyncio.run(gateway.charge(1, card_number, 100))
+            self.assertFalse(result.success)
+            self.assertIn(result.message, PAYMENT_ERRORS)
+
+    def test_batch(self):
+        """Проверка, что пакет заказов обрабатывается одним вызовом с метриками по каждому заказу."""
+        orders = self.create_orders([12345678, 12345677, 22222222])
+        metrics = process_pending_payments()
+        self.assertEqual({item['order']: item['success'] for item in metrics},
+                         {orders[0].id: True, orders[1].id: False, orders[2].id: True})
+        for item in metrics:
+            self.assertGreaterEqual(item['latency'], 0)
+            self.assertGreaterEqual(item['gateway_time'], 0)
+        self.assertEqual(Order.objects.get(id=orders[0].id).status_payment, PAYMENT_SUCCESS)
+        self.assertFalse(Order.objects.filter(payment_code=0).exists())
+        self.assertEqual(process_pending_payments(), [])
+
+    def test_payments_do_not_wait_for_each_other(self):
+        """Проверка, что ожидание ответа шлюза по заказам пакета не суммируется."""
+        self.create_orders([12345678] * 20)
+        started = time.monotonic()
+        metrics = process_pending_payments(gateway=SimulatedPaymentGateway(delay=0.2))
+        self.assertEqual(len(metrics), 20)
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_batch_size(self):
+        """Проверка ограничения размера пакета."""
+        self.create_orders([12345678] * 3)
+        self.assertEqual(len(process_pending_payments(batch_size=2)), 2)
+        self.assertEqual(len(process_pending_payments(batch_size=2)), 1)
+
+    def test_gateway_error(self):
+        """Проверка, что ошибка шлюза не прерывает обработку пакета."""
+        order, = self.create_orders([12345678])
+        metrics = process_pending_payments(gateway=FailingGateway())
+        self.assertFalse(metrics[0]['success'])
+        order.refresh_from_db()
+        self.assertEqual((order.payment_code, order.status_payment), (1, PAYMENT_ERRORS[0]))
+
+    def test_claimed_orders_are_skipped(self):
+        """Проверка, что заказ, платеж которого уже отправлен, не обрабатывается повторно."""
+        order, = self.create_orders([12345678])
+        Order.objects.filter(id=order.id).update(status_payment=PAYMENT_PROCESSING)
+        self.assertEqual(process_pending_payments(), [])
+        with override_settings(PAYMENT_CLAIM_TIMEOUT=-1):
+            self.assertEqual(len(process_pending_payments()), 1)
+
+    def test_task(self):
+        """Проверка задачи оплаты заказа."""
+        order, = self.create_orders([12345678])
+        metrics = payment(order.id)
+        self.assertEqual([item['order'] for item in metrics], [order.id])
+        order.refresh_from_db()
+        self.assertEqual(order.status_payment, PAYMENT_SUCCESS)
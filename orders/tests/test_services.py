@@ -0,0 +1,97 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection
+from django.test import TestCase, tag
+from django.test.utils import CaptureQueriesContext
+
+from cart.lines import CartLine
+from orders.models import Order, OrderItem
+from orders.services import place_order
+from product.models import Product, Offer
+from shop.models import Seller
+
+
+@tag('orders')
+class PlaceOrderTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(email='seller@test.ru', password='12345', phone='2222222222')
+        seller = Seller.objects.create(user=user, name='test', description='test', address='test', number=1234567)
+        cls.offers = [Offer.objects.create(product=Product.objects.create(name=f'test {i}', description='test'),
+                                           seller=seller, price=Decimal(10 * (i + 1)))
+                      for i in range(5)]
+        cls.order_data = {'first_name': 'test', 'last_name': 'test', 'email': 'test@test.ru', 'number': 7654321,
+                          'delivery': 'D', 'payment': 'C', 'card_number': 12345678, 'total': 150}
+
+    def lines(self, offers):
+        return {str(offer.id): CartLine(offer.id, 2, int(offer.price * 100)) for offer in offers}
+
+    def test_place_order(self):
+        """Проверка, что заказ создается фиксированным числом запросов независимо от кол-ва товаров."""
+        with CaptureQueriesContext(connection) as queries:
+            place_order(self.lines(self.offers[:2]), self.order_data)
+        with self.assertNumQueries(len(queries)):
+            order, created = place_order(self.lines(self.offers), self.order_data)
+        self.assertTrue(created)
+        self.assertEqual(order.items.count(), len(self.offers))
+        self.assertEqual(order.get_total_cost(), sum(offer.price * 2 for offer in self.offers))
+
+    def test_idempotency_key(self):
+        """Проверка, что повторная отправка с тем же ключом не создает второй заказ."""
+        order, created = place_order(self.lines(self.offers[:2]), self.order_data, idempotency_key='key')
+        again, created_again = place_order(self.lines(self.offers[:2]), self.order_data, idempotency_key='key')
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(again, order)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(OrderItem.objects.count(), 2)
+        self.assertEqual(self.offers[0].product.catalog_entry.sales_count, 1)
+
+    def test_concurrent_duplicate(self):
+        """Проверка, что при создании заказа с тем же ключом параллельным запросом возвращается этот заказ."""
+        order, _ = place_order(self.lines(self.offers[:1]), self.order_data, idempotency_key='key')
+        with mock.patch('orders.services.Order.objects.filter') as orders:
+            orders.return_value.first.side_effect = [None, order]
+            again, created = place_order(self.lines(self.offers[:1]), self.order_data, idempotency_key='key')
+        self.assertFalse(created)
+        self.assertEqual(again, order)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_other_integrity_error(self):
+        """Проверка, что ошибка целостности, не связанная с ключом, не считается повторной отправкой."""
+        order, _ = place_order(self.lines(self.offers[:1]), self.order_data, idempotency_key='key')
+        with mock.patch('orders.services.commit_stock', side_effect=IntegrityError('NOT NULL constraint failed')), \
+                mock.patch('orders.services.Order.objects.filter') as orders:
+            orders.return_value.first.side_effect = [None, order]
+            with self.assertRaises(ValidationError):
+                place_order(self.lines(self.offers[:1]), self.order_data, idempotency_key='other')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_invalid_order_data(self):
+        """Проверка, что при незаполненных полях заказа возникает ValidationError, а не ошибка базы данных."""
+        order_data = dict(self.order_data, first_name=None)
+        with self.assertRaises(ValidationError) as error:
+            place_order(self.lines(self.offers), order_data, idempotency_key='key')
+        self.assertIn('first_name', error.exception.message_dict)
+        self.assertFalse(Order.objects.exists())
+
+    def test_missing_offer(self):
+        """Проверка, что при отсутствии предложения заказ не создается."""
+        lines = self.lines(self.offers)
+        lines['999999'] = CartLine('999999', 1, 100)
+        with self.assertRaises(ValidationError):
+            place_order(lines, self.order_data)
+        self.assertFalse(Order.objects.exists())
+
+    def test_rollback(self):
+        """Проверка, что при ошибке создания товаров заказ не сохраняется."""
+        with mock.patch('orders.services.OrderItem.objects.bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                place_order(self.lines(self.offers), self.order_data, idempotency_key='key')
+        self.assertFalse(Order.objects.exists())
+        order, created = place_order(self.lines(self.offers), self.order_data, idempotency_key='key')
+        self.assertTrue(created)
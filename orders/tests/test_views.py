@@ -1,11 +1,18 @@
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse
 from orders.models import Order, OrderItem
 from product.models import Product, Offer
 from shop.models import Seller
 from cart.service import Cart
 
+LOCAL_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'order-views-tests',
+    }
+}
+
 
 class HistoryTest(TestCase):
 
@@ -62,24 +69,63 @@ class HistoryTest(TestCase):
         response = self.client.post(url, data=data, follow=True)
         self.assertEqual(response.status_code, 200)
 
-    def test_order_create_payment(self):
+    def fill_checkout(self, email):
+        """Проходит шаги оформления заказа до оплаты с тремя единицами предложения в корзине."""
         offer = Offer.objects.get(price=10.10)
-        url = reverse('order_create_payment')
-        response = self.client.get(url)
-        request = response.wsgi_request
+        self.client.post(reverse('order_create'), data={'first_name': 'test', 'last_name': 'test',
+                                                        'email': email, 'number': 7654321,
+                                                        'password1': 'test12345', 'password2': 'test12345'})
+        self.client.post(reverse('order_create_delivery'), data={'delivery': 'D', 'city': 'test', 'address': 'test'})
+        self.client.post(reverse('order_type_payment'), data={'payment': 'C'})
+        request = RequestFactory().get('/')
+        request.session = self.client.session
         cart = Cart(request)
         cart.add(offer, quantity=3)
         cart.save()
-        print(cart.cart)
-        data = {'card_number': '12345678'}
+        request.session.save()
+        self.client.post(reverse('order_create_comment'), data={'comment': 'test'})
+
+    @override_settings(CACHES=LOCAL_CACHES)
+    def test_order_create_payment(self):
+        self.fill_checkout('payment@test.ru')
+        url = reverse('order_create_payment')
         orders_before = Order.objects.all().count()
-        print(OrderItem.objects.first().quantity)
-        response = self.client.post(url, data=data, follow=True)
-        print(OrderItem.objects.first().quantity)
+        response = self.client.post(url, data={'card_number': '12345678'}, follow=True)
         orders_after = Order.objects.all().count()
         self.assertEqual(orders_after - orders_before, 1)
         self.assertEqual(response.status_code, 200)
 
+    @override_settings(CACHES=LOCAL_CACHES)
+    def test_order_create_payment_incomplete(self):
+        """Проверка, что при незаполненных шагах оформление продолжается с первого незаполненного шага."""
+        self.client.post(reverse('order_create_delivery'), data={'delivery': 'D', 'city': 'test', 'address': 'test'})
+        orders_before = Order.objects.all().count()
+        response = self.client.post(reverse('order_create_payment'), data={'card_number': '12345678'})
+        self.assertRedirects(response, reverse('order_create'))
+        self.assertEqual(Order.objects.all().count(), orders_before)
+
+    @override_settings(CACHES=LOCAL_CACHES)
+    def test_order_create_payment_replay(self):
+        """Проверка, что повторная отправка формы оплаты ведет к созданному заказу, а не к началу оформления."""
+        self.fill_checkout('replay@test.ru')
+        url = reverse('order_create_payment')
+        data = {'card_number': '12345678', 'idempotency_key': 'replay'}
+        self.client.post(url, data=data)
+        order = Order.objects.get(idempotency_key='replay')
+        orders_before = Order.objects.all().count()
+        response = self.client.post(url, data=data)
+        self.assertRedirects(response, reverse('wait-payment', kwargs={'pk': order.pk}))
+        self.assertEqual(Order.objects.all().count(), orders_before)
+
+    @override_settings(CACHES=LOCAL_CACHES)
+    def test_order_create_payment_out_of_stock(self):
+        """Проверка, что при недостаточном остатке страница оплаты показывает ошибку резерва."""
+        self.fill_checkout('stock@test.ru')
+        Offer.objects.filter(price=10.10).update(stock=1)
+        response = self.client.get(reverse('order_create_payment'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Недостаточно товара на складе')
+
     @classmethod
     def tearDownClass(cls):
         order_item = OrderItem.objects.get(price=10.10)
@@ -1,12 +1,16 @@
 from django.shortcuts import render, redirect
 from django.views import generic
 from django.shortcuts import get_object_or_404
+from django.core.exceptions import ValidationError
 from django.forms.utils import ErrorList
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth import get_user_model
 from django.contrib.auth import authenticate, login
-from product.models import Offer, ProductImage
+from product.inventory import reserve_stock
+from product.models import ProductImage
 from .models import OrderItem, Order
+from .checkout import first_incomplete_step, get_checkout_state
+from .services import place_order
 from users.models import CustomUser
 from product.services import get_category
 from .forms import (
@@ -18,9 +22,9 @@ from .forms import (
 )
 from cart.service import Cart
 from . import tasks
-from django.core.cache import cache
 from django.conf import settings
 from random import randint
+import uuid
 
 
 class HistoryOrderView(generic.ListView):
@@ -42,11 +46,20 @@ class HistoryOrderDetailView(generic.DetailView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['categories'] = get_category()
-        context['drawing'] = ProductImage.objects.all()
-        context['offers'] = OrderItem.objects.filter(order=kwargs['object'])
+        context['drawing'] = ProductImage.objects.filter(
+            product__offers__order_items__order=self.object).select_related('product').distinct()
+        context['offers'] = OrderItem.objects.filter(order=self.object).select_related('offer__product')
         return context
 
 
+def save_customer(request, form) -> None:
+    """Сохраняет данные покупателя в данных оформления заказа."""
+    get_checkout_state(request).set_many({'first_name': form.cleaned_data.get('first_name'),
+                                          'last_name': form.cleaned_data.get('last_name'),
+                                          'email': request.user.email,
+                                          'number': form.cleaned_data.get('number')})
+
+
 def order_create_post(request):
     if 'password' in request.POST:
         user = authenticate(email=request.POST.get('email'), password=request.POST.get('password'))
@@ -56,10 +69,7 @@ def order_create_post(request):
     form = OrderUserCreateForm(request.POST)
     if form.is_valid():
         if not request.user.is_anonymous:
-            cache.set('first_name', form.cleaned_data.get('first_name'))
-            cache.set('last_name', form.cleaned_data.get('last_name'))
-            cache.set('email', request.user.email)
-            cache.set('number', form.cleaned_data.get('number'))
+            save_customer(request, form)
         else:
             # Если пользователь не авторизован, но существует
             if CustomUser.objects.filter(email=form.cleaned_data['email']).exists():
@@ -89,10 +99,7 @@ def order_create_post(request):
                     user = authenticate(email=form.cleaned_data.get('email'),
                                         password=form.cleaned_data.get('password1'))
                     login(request, user)
-                    cache.set('first_name', form.cleaned_data.get('first_name'))
-                    cache.set('last_name', form.cleaned_data.get('last_name'))
-                    cache.set('email', request.user.email)
-                    cache.set('number', form.cleaned_data.get('number'))
+                    save_customer(request, form)
                 else:
                     form._errors["password1"] = ErrorList([_(u"Пароли не совпадают")])
                     return render(request, 'orders/new-order.html',
@@ -126,9 +133,9 @@ def order_create_delivery(request):
     if request.method == 'POST':
         form = OrderDeliveryCreateForm(request.POST)
         if form.is_valid():
-            cache.set('delivery', form.cleaned_data.get('delivery'))
-            cache.set('city', form.cleaned_data.get('city'))
-            cache.set('address', form.cleaned_data.get('address'))
+            get_checkout_state(request).set_many({'delivery': form.cleaned_data.get('delivery'),
+                                                  'city': form.cleaned_data.get('city'),
+                                                  'address': form.cleaned_data.get('address')})
             return redirect('order_type_payment')
     else:
         form = OrderDeliveryCreateForm
@@ -140,7 +147,7 @@ def order_type_payment(request):
     if request.method == 'POST':
         form = OrderPaymentCreateForm(request.POST)
         if form.is_valid():
-            cache.set('payment', form.cleaned_data.get('payment'))
+            get_checkout_state(request).set_many({'payment': form.cleaned_data.get('payment')})
             return redirect('order_create_comment')
     else:
         form = OrderPaymentCreateForm
@@ -157,72 +164,85 @@ def delivery_const(elem, elem_value, setting_value):
 def order_create_comment(request):
     cart = Cart(request)
     total = cart.get_total_price()
-    seller = []
     elem = request.session.get(settings.ADMIN_SETTINGS_ID)
     delivery_price = delivery_const(elem, 'DELIVERY_PRICE', settings.DELIVERY_PRICE)
     delivery_stock = delivery_const(elem, 'DELIVERY_STOCK', settings.DELIVERY_STOCK)
     delivery_express = delivery_const(elem, 'DELIVERY_EXPRESS', settings.DELIVERY_EXPRESS)
-    if cache.get('delivery') == 'A':
+    state = get_checkout_state(request)
+    data = state.get_many()
+    if data['delivery'] == 'A':
         total += delivery_express
     else:
-        for item in cart:
-            seller.append(Offer.objects.get(id=item['product'].id).seller)
-            seller = set(seller)
-        if total < delivery_price or len(seller) > 1:
+        sellers = {item['product'].seller_id for item in cart}
+        if total < delivery_price or len(sellers) > 1:
             total += delivery_stock
     status = 'Ожидание ответа от продавца'
-    cache.set('total', total)
-    cache.set('status', status)
-    data = {'first_name': cache.get('first_name'), 'last_name': cache.get('last_name'), 'email': cache.get('email'),
-            'number': cache.get('number'), 'delivery': cache.get('delivery'), 'city': cache.get('city'),
-            'address': cache.get('address'), 'payment': cache.get('payment'), 'total': total, 'status': status
-            }
+    data.update({'total': total, 'status': status})
     if request.method == 'POST':
         form = OrderCommentForm(request.POST)
         if form.is_valid():
-            cache.set('comment', form.cleaned_data.get('comment'))
+            state.set_many({'total': total, 'status': status, 'comment': form.cleaned_data.get('comment')})
             return redirect('order_create_payment')
     else:
         form = OrderCommentForm
+    state.set_many({'total': total, 'status': status})
     return render(request, 'orders/order-comment.html',
                   {'form': form, 'categories': get_category(), 'data': data})
 
 
+def replayed_order(request):
+    """Возвращает заказ, уже созданный с ключом идемпотентности отправленной формы оплаты, или None."""
+    key = request.POST.get('idempotency_key') if request.method == 'POST' else None
+    return Order.objects.filter(idempotency_key=key).first() if key else None
+
+
+def payment_page(request, cart, state, payment):
+    """Показывает форму оплаты с новым ключом идемпотентности и резервирует товары на время оплаты."""
+    key = uuid.uuid4().hex
+    if payment == 'F':
+        form = OrderCardForm({'card_number': randint(10000000, 99999999), 'idempotency_key': key})
+        context = {'form': form, 'categories': get_category(), 'rand': True}
+    else:
+        form = OrderCardForm(initial={'idempotency_key': key})
+        context = {'form': form, 'categories': get_category()}
+    try:
+        reserve_stock({offer_id: line.quantity for offer_id, line in cart.cart.items()}, state.checkout_id)
+    except ValidationError as error:
+        # форма еще не заполнена, поэтому ошибка резерва передается в шаблон отдельно
+        context['stock_errors'] = error.messages
+    return render(request, 'orders/order.html', context)
+
+
 def order_create_payment(request):
+    # повторная отправка формы оплаты ведет к созданному заказу, данные оформления которого уже удалены
+    order = replayed_order(request)
+    if order is not None:
+        return redirect('wait-payment', pk=order.pk)
     cart = Cart(request)
+    state = get_checkout_state(request)
+    order_data = state.get_many()
+    # данные оформления истекли или шаг пропущен: оформление продолжается с первого незаполненного шага
+    step = first_incomplete_step(order_data)
+    if step is not None:
+        return redirect(step)
     if request.method == 'POST':
         form = OrderCardForm(request.POST)
         if form.is_valid():
-            order = Order.objects.create(first_name=cache.get('first_name'),
-                                         last_name=cache.get('last_name'),
-                                         email=cache.get('email'),
-                                         number=cache.get('number'),
-                                         delivery=cache.get('delivery'),
-                                         status=cache.get('status'),
-                                         city=cache.get('city'),
-                                         address=cache.get('address'),
-                                         payment=cache.get('payment'),
-                                         card_number=form.cleaned_data.get('card_number'),
-                                         total=cache.get('total'),
-                                         comment=cache.get('comment'))
-            for item in cart.cart:
-                OrderItem.objects.create(order=order,
-                                         offer=Offer.objects.get(id=int(item)),
-                                         price=float(cart.cart[item]['price']),
-                                         quantity=cart.cart[item]['quantity'],
-                                         )
-            cart.clear()
-            cache.close()
-            tasks.payment.delay(order.pk)
+            order_data['card_number'] = form.cleaned_data.get('card_number')
+            try:
+                order, created = place_order(cart.cart, order_data, form.cleaned_data.get('idempotency_key'),
+                                             reservation_key=state.checkout_id)
+            except ValidationError as error:
+                form.add_error(None, error)
+                return render(request, 'orders/order.html',
+                              {'form': form, 'categories': get_category()})
+            if created:
+                cart.clear()
+                state.clear()
+                tasks.payment.delay(order.pk)
             return redirect('wait-payment', pk=order.pk)
     else:
-        if cache.get('payment') == 'F':
-            form = OrderCardForm({'card_number': randint(10000000, 99999999)})
-            return render(request, 'orders/order.html',
-                          {'form': form, 'categories': get_category(), 'rand': True})
-        else:
-            form = OrderCardForm()
-
+        return payment_page(request, cart, state, order_data['payment'])
     return render(request, 'orders/order.html',
                   {'form': form, 'categories': get_category()})
 
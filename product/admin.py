@@ -12,6 +12,7 @@ from product.models import (
     HistoryView,
     ProductImage,
     Property,
+    ImportJob,
 )
 
 
@@ -54,12 +55,13 @@ class CategoryAdmin(MPTTModelAdmin):
 
 
 class OfferAdmin(admin.ModelAdmin):
-    list_display = ['product', 'seller', 'price', 'is_free_delivery', 'is_present']
+    list_display = ['product', 'seller', 'price', 'is_free_delivery', 'is_present', 'stock', 'reserved']
 
     def get_form(self, request, obj=None, **kwargs):
         form = super().get_form(request, obj, **kwargs)
         is_superuser = request.user.is_superuser
-        disabled_fields = set()
+        # резерв изменяется только при оформлении заказов
+        disabled_fields = {'reserved'}
 
         if not is_superuser:
             disabled_fields |= {
@@ -153,6 +155,12 @@ class FeedbackAdmin(admin.ModelAdmin):
     list_display = ['offer', 'author', 'publication_date', 'rating', 'description', 'image']
 
 
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ['file_name', 'seller', 'status', 'rows_processed', 'created_at', 'finished_at']
+    list_filter = ['status']
+    readonly_fields = ['stats']
+
+
 admin.site.register(Product, ProductAdmin)
 admin.site.register(Banner, BannerAdmin)
 admin.site.register(Category, CategoryAdmin)
@@ -162,3 +170,4 @@ admin.site.register(ProductImage, ProductImageAdmin)
 admin.site.register(HistoryView, HistoryViewAdmin)
 admin.site.register(Property, PropertyAdmin)
 admin.site.register(Feedback, FeedbackAdmin)
+admin.site.register(ImportJob, ImportJobAdmin)
@@ -0,0 +1,148 @@
+# Модуль для поддержки денормализованной проекции каталога (модель CatalogProduct)
+from typing import Dict, Iterable, List, Optional
+
+from django.db.models import Avg, Count, IntegerField, Max, Min, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from orders.models import OrderItem
+from product.models import CatalogProduct, Category, Feedback, Offer, Product
+
+# Кол-во продуктов, пересчитываемых одним запросом
+REFRESH_CHUNK_SIZE = 500
+
+CATALOG_FIELDS = [
+    'category_path',
+    'min_price',
+    'max_price',
+    'avg_price',
+    'rating',
+    'last_offer_at',
+    'sales_count',
+    'in_stock',
+    'free_delivery',
+    'seller_ids',
+    'updated_at',
+]
+
+
+def build_category_paths(category_ids: Optional[Iterable[int]] = None) -> Dict[int, str]:
+    """
+    Возвращает пути категорий в виде '/<id корня>/<id потомка>/'.
+    :param category_ids: id категорий; если заданы, загружаются только эти категории и их предки
+    :return: словарь {id категории: путь}
+    """
+    categories = Category.objects.all()
+    if category_ids is not None:
+        category_ids = list(category_ids)
+        if not category_ids:
+            return {}
+        categories = Category.objects.get_queryset_ancestors(categories.filter(id__in=category_ids),
+                                                             include_self=True)
+    parents = dict(categories.values_list('id', 'parent_id'))
+    paths = {}
+
+    for category_id in parents:
+        chain = []
+        current = category_id
+        while current is not None:
+            chain.append(str(current))
+            current = parents.get(current)
+        paths[category_id] = '/' + '/'.join(reversed(chain)) + '/'
+
+    return paths
+
+
+def get_category_path(category: Category) -> str:
+    """
+    Возвращает путь категории в дереве категорий.
+    :param category: категория
+    :return: путь вида '/<id корня>/<id потомка>/'
+    """
+    ids = category.get_ancestors(include_self=True).values_list('id', flat=True)
+    return '/' + '/'.join(str(pk) for pk in ids) + '/'
+
+
+def _collect_rows(product_ids: List[int], paths: Optional[Dict[int, str]] = None) -> List[CatalogProduct]:
+    """
+    Вычисляет агрегаты для переданных продуктов и возвращает несохраненные записи каталога.
+    :param product_ids: id продуктов
+    :param paths: пути категорий; если не заданы, загружаются пути только категорий этих продуктов
+    :return: записи каталога
+    """
+    rating = Feedback.objects.filter(offer__product=OuterRef('pk')).\
+        values('offer__product').annotate(value=Avg('rating')).values('value')
+    sales = OrderItem.objects.filter(offer__product=OuterRef('pk')).\
+        values('offer__product').annotate(value=Count('id')).values('value')
+
+    rows = Product.objects.filter(id__in=product_ids).values('id', 'category_id').annotate(
+        min_price=Min('offers__price'),
+        max_price=Max('offers__price'),
+        avg_price=Avg('offers__price'),
+        last_offer_at=Max('offers__added_at'),
+        present_count=Count('offers', filter=Q(offers__is_present=True) & (
+            Q(offers__stock__isnull=True) | Q(offers__stock__gt=0))),
+        free_delivery_count=Count('offers', filter=Q(offers__is_free_delivery=True)),
+        rating=Coalesce(Subquery(rating), 0.0),
+        sales_count=Coalesce(Subquery(sales, output_field=IntegerField()), 0),
+    )
+    if paths is None:
+        rows = list(rows)
+        paths = build_category_paths({row['category_id'] for row in rows if row['category_id'] is not None})
+
+    sellers = {}
+    for product_id, seller_id in Offer.objects.filter(product_id__in=product_ids).\
+            values_list('product_id', 'seller_id').distinct():
+        sellers.setdefault(product_id, set()).add(seller_id)
+
+    entries = []
+    for row in rows:
+        seller_ids = sorted(sellers.get(row['id'], ()))
+        entries.append(CatalogProduct(
+            product_id=row['id'],
+            category_path=paths.get(row['category_id'], ''),
+            min_price=row['min_price'],
+            max_price=row['max_price'],
+            avg_price=row['avg_price'],
+            rating=row['rating'],
+            last_offer_at=row['last_offer_at'],
+            sales_count=row['sales_count'],
+            in_stock=row['present_count'] > 0,
+            free_delivery=row['free_delivery_count'] > 0,
+            seller_ids=''.join(f',{pk}' for pk in seller_ids) + ',' if seller_ids else '',
+        ))
+
+    return entries
+
+
+def refresh_catalog_products(product_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Пересчитывает записи каталога для заданных продуктов.
+    Если список не передан, пересчитывается весь каталог.
+    :param product_ids: id продуктов
+    :return: кол-во обновленных записей
+    """
+    # при полном пересчете пути загружаются для всех категорий, иначе - только для категорий продуктов
+    paths = None
+    if product_ids is None:
+        product_ids = Product.objects.values_list('id', flat=True)
+        paths = build_category_paths()
+    product_ids = sorted({pk for pk in product_ids if pk is not None})
+
+    if not product_ids:
+        return 0
+
+    updated = 0
+    for start in range(0, len(product_ids), REFRESH_CHUNK_SIZE):
+        chunk = product_ids[start:start + REFRESH_CHUNK_SIZE]
+        entries = _collect_rows(chunk, paths)
+        existing = set(CatalogProduct.objects.filter(product_id__in=chunk).values_list('product_id', flat=True))
+        now = timezone.now()
+        for entry in entries:
+            entry.updated_at = now
+        CatalogProduct.objects.bulk_update([entry for entry in entries if entry.product_id in existing],
+                                           CATALOG_FIELDS)
+        CatalogProduct.objects.bulk_create([entry for entry in entries if entry.product_id not in existing])
+        updated += len(entries)
+
+    return updated
@@ -0,0 +1,197 @@
+# Модуль кеширования результатов каталога: id товаров страницы и общее кол-во товаров
+import hashlib
+import json
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import QueryDict
+
+from product.models import CatalogProduct, Category
+from product.services import CATALOG_SORT_FIELDS
+from shop.cache import CacheNamespace, cached
+
+# Ключ версии, общей для всего каталога
+ALL_CATEGORIES = 'all'
+
+# Кеш корней деревьев категорий
+CATEGORY_ROOTS_CACHE = CacheNamespace('category-root', local=True)
+
+# Ключ множества сохраненных страниц каталога (для ограничения размера кеша)
+CATALOG_KEYS_INDEX = 'catalog:keys'
+
+
+def canonical_params(query: QueryDict) -> Tuple[Tuple[str, str], ...]:
+    """
+    Приводит параметры фильтрации и сортировки каталога к каноническому виду.
+    Неизвестные и пустые параметры отбрасываются, порядок параметров не важен.
+    :param query: query-string запроса
+    :return: упорядоченный кортеж пар (параметр, значение)
+    """
+    params = {}
+    category = query.get('category', '').strip()
+    if category:
+        params['category'] = category.lstrip('0') or '0'
+
+    price = query.get('price', '').strip()
+    if price:
+        try:
+            params['price'] = ';'.join(str(int(value)) for value in price.split(';'))
+        except ValueError:
+            params['price'] = price
+
+    seller = query.get('seller', '').strip()
+    if seller:
+        params['seller'] = seller
+
+    title = query.get('title', '').strip().lower()
+    if title:
+        params['title'] = ' '.join(title.split())
+
+    for flag in ('deliv', 'stock'):
+        if query.get(flag) == 'on':
+            params[flag] = 'on'
+
+    sort = query.get('sort')
+    if sort in CATALOG_SORT_FIELDS:
+        params['sort'] = sort
+
+    return tuple(sorted(params.items()))
+
+
+def _version_key(scope: str) -> str:
+    return f'catalog-version:{scope}'
+
+
+def get_catalog_version(params: Tuple[Tuple[str, str], ...]) -> str:
+    """
+    Возвращает версию каталога для набора параметров.
+    Для выборки по категории используется версия дерева этой категории.
+    :param params: канонические параметры
+    :return: версия
+    """
+    category = dict(params).get('category')
+    scope = ALL_CATEGORIES
+    if category:
+        root = category_root_id(category)
+        scope = str(root) if root else ALL_CATEGORIES
+    version = cache.get(_version_key(scope))
+    if version is None:
+        version = time.time_ns()
+        cache.add(_version_key(scope), version, None)
+    return str(version)
+
+
+@cached(CATEGORY_ROOTS_CACHE, tags=['category:*'])
+def category_root_id(category_id: str) -> Optional[int]:
+    """
+    Возвращает id корня дерева категории (кешируется).
+    Перемещение предка меняет корень без сохранения самой категории, поэтому запись зависит от всех категорий.
+    """
+    root = Category.objects.filter(id=category_id).values_list('tree_id', flat=True).first()
+    if root is not None:
+        root = Category.objects.filter(tree_id=root, level=0).values_list('id', flat=True).first()
+    return root
+
+
+def catalog_cache_key(params: Tuple[Tuple[str, str], ...], page: int) -> str:
+    """
+    Возвращает ключ кеша страницы каталога.
+    :param params: канонические параметры
+    :param page: номер страницы
+    :return: ключ кеша
+    """
+    digest = hashlib.sha1(json.dumps(params).encode()).hexdigest()
+    return f'catalog:{get_catalog_version(params)}:{digest}:{page}'
+
+
+def get_cached_page(key: str) -> Optional[dict]:
+    """
+    Возвращает сохраненную страницу каталога.
+    :param key: ключ кеша
+    :return: словарь {'ids': [...], 'count': n} или None
+    """
+    return cache.get(key)
+
+
+def _redis_client():
+    """Возвращает клиент Redis кеша по умолчанию или None, если кеш хранится не в Redis."""
+    try:
+        from django_redis import get_redis_connection
+
+        return get_redis_connection('default')
+    except (ImportError, NotImplementedError):
+        return None
+
+
+def _index_page_redis(client, key: str) -> List[str]:
+    """
+    Добавляет ключ страницы в упорядоченное множество сохраненных страниц и отбирает лишние
+    одной транзакцией MULTI/EXEC, поэтому параллельные запросы не теряют ключи друг друга.
+    :return: ключи страниц, вытесненных из множества
+    """
+    index = cache.make_key(CATALOG_KEYS_INDEX)
+    now = time.time()
+    overflow = -settings.CATALOG_CACHE_MAX_ENTRIES - 1
+    with client.pipeline() as pipe:
+        pipe.zadd(index, {key: now}, nx=True)
+        pipe.zremrangebyscore(index, '-inf', now - settings.CATALOG_CACHE_TIME)
+        pipe.zrange(index, 0, overflow)
+        pipe.zremrangebyrank(index, 0, overflow)
+        pipe.expire(index, settings.CATALOG_CACHE_TIME)
+        evicted = pipe.execute()[2]
+    return [member.decode() for member in evicted]
+
+
+_index_lock = threading.Lock()
+
+
+def _index_page_local(key: str) -> List[str]:
+    """
+    Добавляет ключ страницы в список сохраненных страниц кеша процесса (кеш не в Redis доступен
+    только текущему процессу, поэтому достаточно блокировки процесса).
+    :return: ключи страниц, вытесненных из списка
+    """
+    with _index_lock:
+        keys = cache.get(CATALOG_KEYS_INDEX) or []
+        if key in keys:
+            return []
+        keys.append(key)
+        overflow = max(len(keys) - settings.CATALOG_CACHE_MAX_ENTRIES, 0)
+        evicted, keys = keys[:overflow], keys[overflow:]
+        cache.set(CATALOG_KEYS_INDEX, keys, settings.CATALOG_CACHE_TIME)
+    return evicted
+
+
+def set_cached_page(key: str, ids: List[int], count: int) -> None:
+    """
+    Сохраняет страницу каталога и ограничивает общее кол-во сохраненных страниц.
+    При превышении CATALOG_CACHE_MAX_ENTRIES удаляются самые старые страницы.
+    :param key: ключ кеша
+    :param ids: id товаров страницы
+    :param count: общее кол-во товаров выборки
+    """
+    cache.set(key, {'ids': list(ids), 'count': count}, settings.CATALOG_CACHE_TIME)
+
+    client = _redis_client()
+    evicted = _index_page_redis(client, key) if client is not None else _index_page_local(key)
+    if evicted:
+        cache.delete_many(evicted)
+
+
+def invalidate_catalog_cache(product_ids: Iterable[int]) -> None:
+    """
+    Обновляет версии каталога для деревьев категорий заданных товаров.
+    Сохраненные страницы с прежней версией становятся недоступны.
+    :param product_ids: id товаров
+    """
+    paths = CatalogProduct.objects.filter(product_id__in=[pk for pk in product_ids if pk is not None]).\
+        values_list('category_path', flat=True)
+    scopes = {ALL_CATEGORIES}
+    scopes.update(path.strip('/').split('/')[0] for path in paths if path)
+
+    version = time.time_ns()
+    versions: Dict[str, int] = {_version_key(scope): version for scope in scopes}
+    cache.set_many(versions, None)
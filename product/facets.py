@@ -0,0 +1,152 @@
+# Модуль подсчета кол-ва товаров для фильтров каталога (фасетов)
+import hashlib
+import json
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Count, Q
+from django.http import HttpRequest
+
+from product.catalog import get_category_path
+from product.catalog_cache import canonical_params, get_catalog_version
+from product.models import CatalogProduct, Category, Offer
+from product.search import search_products
+from shop.cache import CacheNamespace, cached, model_instances, model_rows
+from shop.models import Seller
+
+
+# Кеш списков продавцов
+SELLERS_CACHE = CacheNamespace('sellers', local=True)
+
+# Кеш фасетов; ключ включает версию каталога категории
+FACETS_CACHE = CacheNamespace('facets')
+
+
+@cached(SELLERS_CACHE, tags=['seller:*'])
+def _seller_rows() -> List[tuple]:
+    return model_rows(Seller.objects.order_by('name'))
+
+
+def get_seller_list() -> List[Seller]:
+    """Возвращает кешированный список продавцов; объекты восстанавливаются без запросов к базе данных."""
+    return model_instances(Seller, _seller_rows())
+
+
+def get_sellers() -> List[Tuple[int, str]]:
+    """Возвращает кешированный список продавцов (id, имя)."""
+    return [(seller.pk, seller.name) for seller in get_seller_list()]
+
+
+def get_price_buckets() -> List[Tuple[int, Optional[int]]]:
+    """
+    Возвращает диапазоны цен [от, до) по границам CATALOG_PRICE_BUCKETS.
+    Последний диапазон не ограничен сверху.
+    """
+    bounds = settings.CATALOG_PRICE_BUCKETS
+    return list(zip(bounds, list(bounds[1:]) + [None]))
+
+
+def _category_filter(category_id: str) -> Q:
+    """Условие отбора товаров категории по пути в дереве категорий."""
+    category = Category.objects.filter(id=category_id).first()
+    if category is None:
+        return Q(pk__in=[])
+    path = get_category_path(category)
+    if not category.level:
+        return Q(category_path__startswith=path)
+    return Q(category_path=path)
+
+
+def _facet_filters(params: Dict[str, str], sellers: List[Tuple[int, str]]) -> Dict[str, Q]:
+    """Возвращает условия активных фильтров каталога, по одному на фасет."""
+    filters = {}
+
+    price = params.get('price')
+    if price:
+        price_from, price_to = map(int, price.split(';'))
+        filters['price'] = Q(avg_price__gte=price_from, avg_price__lte=price_to)
+
+    seller = params.get('seller')
+    if seller:
+        seller_ids = [pk for pk, name in sellers if name == seller]
+        condition = Q(pk__in=[])
+        for pk in seller_ids:
+            condition |= Q(seller_ids__contains=f',{pk},')
+        filters['seller'] = condition
+
+    title = params.get('title')
+    if title:
+        filters['title'] = Q(product_id__in=search_products(title))
+
+    if params.get('deliv'):
+        filters['deliv'] = Q(free_delivery=True)
+
+    if params.get('stock'):
+        filters['stock'] = Q(in_stock=True)
+
+    return filters
+
+
+def _except(filters: Dict[str, Q], facet: str) -> Q:
+    """Объединяет условия всех активных фильтров, кроме фильтра заданного фасета."""
+    condition = Q()
+    for name, value in filters.items():
+        if name != facet:
+            condition &= value
+    return condition
+
+
+def compute_facets(params: Dict[str, str]) -> dict:
+    """
+    Подсчитывает кол-во товаров для каждого значения фильтров каталога двумя запросами:
+    агрегатом по записям каталога и группировкой предложений по продавцам.
+    Для каждого фасета учитываются все активные фильтры, кроме фильтра самого фасета.
+    :param params: канонические параметры каталога
+    :return: словарь с кол-вом товаров по продавцам, диапазонам цен, доставке и наличию
+    """
+    sellers = get_sellers()
+    buckets = get_price_buckets()
+    filters = _facet_filters(params, sellers)
+
+    queryset = CatalogProduct.objects.all()
+    if params.get('category'):
+        queryset = queryset.filter(_category_filter(params['category']))
+
+    aggregates = {'total': Count('pk', filter=_except(filters, None))}
+    for i, (price_from, price_to) in enumerate(buckets):
+        condition = Q(avg_price__gte=price_from)
+        if price_to is not None:
+            condition &= Q(avg_price__lt=price_to)
+        aggregates[f'price_{i}'] = Count('pk', filter=_except(filters, 'price') & condition)
+    aggregates['deliv'] = Count('pk', filter=_except(filters, 'deliv') & Q(free_delivery=True))
+    aggregates['stock'] = Count('pk', filter=_except(filters, 'stock') & Q(in_stock=True))
+
+    result = queryset.aggregate(**aggregates)
+    seller_counts = dict(
+        Offer.objects.filter(product_id__in=queryset.filter(_except(filters, 'seller')).values('product_id'))
+        .order_by().values('seller_id').annotate(count=Count('product_id', distinct=True))
+        .values_list('seller_id', 'count')
+    )
+
+    return {
+        'total': result['total'],
+        'sellers': [{'id': pk, 'name': name, 'count': seller_counts.get(pk, 0)} for pk, name in sellers],
+        'price': [{'from': price_from, 'to': price_to, 'count': result[f'price_{i}']}
+                  for i, (price_from, price_to) in enumerate(buckets)],
+        'deliv': result['deliv'],
+        'stock': result['stock'],
+    }
+
+
+def get_catalog_facets(request: HttpRequest) -> dict:
+    """
+    Возвращает кешированные фасеты каталога для текущей категории и набора фильтров.
+    Кеш сбрасывается вместе с версией каталога категории.
+    :param request: HTTP request, в query-string которого указаны параметры каталога
+    :return: фасеты каталога
+    """
+    params = tuple((key, value) for key, value in canonical_params(request.GET) if key != 'sort')
+    digest = hashlib.sha1(json.dumps(params).encode()).hexdigest()
+
+    return FACETS_CACHE.get_or_load([get_catalog_version(params), digest], lambda: compute_facets(dict(params)),
+                                    settings.CATALOG_CACHE_TIME, tags=['seller:*', 'category:*'])
@@ -0,0 +1,177 @@
+# Кеш блоков главной страницы: у каждого блока свое время актуальности, устаревший блок
+# отдается сразу и обновляется в фоне, пересчитывает блок только один процесс
+import datetime
+import time
+from random import choice, sample
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, Min, OuterRef, Subquery
+from django.utils import timezone
+
+from product.models import Product, ProductImage
+from product.services import get_banners, get_category
+from shop.cache import CacheNamespace
+
+# Кеш блоков главной страницы; время хранения записи задается при сохранении блока
+HOME_BLOCKS_CACHE = CacheNamespace('home-block')
+HOME_BLOCK_LOCK_KEY = 'home-block-lock:{}'
+
+# Интервал ожидания блока, который пересчитывает другой процесс, в секундах
+LOCK_POLL_INTERVAL = 0.05
+
+
+def load_favorite_categories(qty: int = 3) -> List[dict]:
+    """Выбирает qty случайных категорий нижнего уровня с минимальной ценой товара в категории."""
+    categories = [category for category in get_category() if category.is_leaf_node()]
+    categories = sample(categories, min(qty, len(categories)))
+    min_prices = dict(Product.objects.filter(category_id__in=[category.id for category in categories]).
+                      values('category_id').annotate(min_price=Min('offers__price')).
+                      values_list('category_id', 'min_price'))
+    return [{'id': category.id, 'name': category.name, 'min_price': min_prices.get(category.id)}
+            for category in categories]
+
+
+def load_popular_products(qty: int = 8) -> List[dict]:
+    """Выбирает qty товаров с наибольшим кол-вом продаж."""
+    first_image = ProductImage.objects.filter(product=OuterRef('pk')).order_by('id').values('image')[:1]
+    return list(Product.objects.annotate(count=Count('offers__order_items__offer')).
+                annotate(avg_price=Avg('offers__price'), image=Subquery(first_image)).order_by('-count').
+                values('id', 'name', 'category__name', 'avg_price', 'image')[:qty])
+
+
+def load_limited_products() -> List[dict]:
+    """Выбирает товары ограниченного тиража."""
+    return list(Product.objects.filter(is_limited=True).values('id', 'name', 'images__image', 'category__name').
+                annotate(avg_price=Avg('offers__price')))
+
+
+def load_day_offer() -> Optional[dict]:
+    """Выбирает предложение дня из товаров ограниченного тиража."""
+    limited = get_home_block('limited')
+    return choice(limited) if len(limited) >= 2 else None
+
+
+# Блоки главной страницы: имя -> функция расчета
+HOME_BLOCKS: Dict[str, Callable[[], Any]] = {
+    'banners': get_banners,
+    'favorite': load_favorite_categories,
+    'popular': load_popular_products,
+    'limited': load_limited_products,
+    'day_offer': load_day_offer,
+}
+
+
+# Теги блоков: блок пересчитывается при изменении объектов, от которых зависит
+HOME_BLOCK_TAGS: Dict[str, List[str]] = {
+    'banners': ['banner:*'],
+    'favorite': ['category:*', 'offer:*'],
+    'popular': ['product:*', 'offer:*'],
+    'limited': ['product:*', 'offer:*'],
+    'day_offer': ['product:*'],
+}
+
+
+def block_key(name: str) -> List[str]:
+    """Части ключа блока; предложение дня выбирается на каждый день."""
+    if name == 'day_offer':
+        return [name, timezone.localdate().isoformat()]
+    return [name]
+
+
+def refresh_home_block(name: str) -> Any:
+    """
+    Пересчитывает блок и сохраняет его в кеш. Блок хранится в кеше HOME_BLOCK_STALE_TIME
+    после окончания актуальности, чтобы его можно было отдавать во время обновления.
+    :param name: имя блока
+    :return: данные блока
+    """
+    ttl = settings.HOME_BLOCKS_TTL[name]
+    value = HOME_BLOCKS[name]()
+    HOME_BLOCKS_CACHE.set(block_key(name), {'value': value, 'fresh_until': time.time() + ttl},
+                          ttl + settings.HOME_BLOCK_STALE_TIME, HOME_BLOCK_TAGS[name])
+    return value
+
+
+def _acquire(name: str) -> bool:
+    return cache.add(HOME_BLOCK_LOCK_KEY.format(name), 1, settings.HOME_BLOCK_LOCK_TIMEOUT)
+
+
+def release_lock(name: str) -> None:
+    cache.delete(HOME_BLOCK_LOCK_KEY.format(name))
+
+
+def _schedule_refresh(name: str) -> None:
+    """Запускает фоновое обновление устаревшего блока, если его еще никто не обновляет."""
+    if not _acquire(name):
+        return
+    from product.tasks import refresh_home_block_task
+
+    try:
+        refresh_home_block_task.delay(name)
+    except Exception:
+        # без брокера блок обновится при следующем запросе после истечения блокировки
+        release_lock(name)
+
+
+def _wait_for_block(name: str) -> Optional[dict]:
+    """Ожидает блок, который пересчитывает другой процесс, не дольше HOME_BLOCK_LOCK_WAIT секунд."""
+    deadline = time.monotonic() + settings.HOME_BLOCK_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = HOME_BLOCKS_CACHE.get(block_key(name), tags=HOME_BLOCK_TAGS[name])
+        if entry is not None:
+            return entry
+    return None
+
+
+def get_home_block(name: str) -> Any:
+    """
+    Возвращает блок главной страницы.
+    Актуальный блок берется из кеша. Устаревший блок возвращается сразу, а пересчитывается в задаче Celery.
+    Если блока нет в кеше, его пересчитывает процесс, получивший блокировку; остальные ждут результат.
+    :param name: имя блока
+    :return: данные блока
+    """
+    entry = HOME_BLOCKS_CACHE.get(block_key(name), tags=HOME_BLOCK_TAGS[name])
+    if entry is not None:
+        if entry['fresh_until'] < time.time():
+            _schedule_refresh(name)
+        return entry['value']
+
+    if _acquire(name):
+        try:
+            return refresh_home_block(name)
+        finally:
+            release_lock(name)
+    entry = _wait_for_block(name)
+    if entry is not None:
+        return entry['value']
+    # блокировка не освобождена вовремя: блок рассчитывается без сохранения в кеш
+    return HOME_BLOCKS[name]()
+
+
+def get_limited_edition() -> Tuple[Optional[dict], Optional[List[dict]]]:
+    """
+    Возвращает предложение дня и список остальных товаров ограниченного тиража.
+    :return: кортеж (предложение дня, товары) или (None, None), если товаров ограниченного тиража меньше двух
+    """
+    day_offer = get_home_block('day_offer')
+    if day_offer is None:
+        return None, None
+    return day_offer, [item for item in get_home_block('limited') if item != day_offer]
+
+
+def get_home_context() -> Dict[str, Any]:
+    """Возвращает блоки главной страницы для контекста шаблона."""
+    day_offer, limited = get_limited_edition()
+    next_day = timezone.localdate() + datetime.timedelta(days=1)
+    return {
+        'banners': get_home_block('banners'),
+        'favorite': get_home_block('favorite'),
+        'popular': get_home_block('popular'),
+        'day_offer': day_offer,
+        'limited': limited,
+        'next_day': next_day.strftime('%d.%m.%Y'),
+    }
@@ -0,0 +1,151 @@
+# Параллельная загрузка изображений товаров при импорте
+import hashlib
+import mimetypes
+import os
+import tempfile
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Union
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Расширения файлов для типов содержимого, которые не определяются модулем mimetypes однозначно
+IMAGE_EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/jpg': '.jpg',
+    'image/png': '.png',
+    'image/webp': '.webp',
+    'image/gif': '.gif',
+}
+
+
+class ImageTooLarge(ValueError):
+    """Размер изображения превышает IMAGE_FETCH_MAX_BYTES."""
+
+
+class ImageFetcher:
+    """
+    Загрузка изображений пулом потоков через общую сессию с пулом соединений.
+    Кол-во одновременных запросов к одному хосту ограничено, неудачные запросы повторяются.
+    Изображение пишется в MEDIA_ROOT по частям и сохраняется под именем, равным хешу содержимого,
+    поэтому один и тот же адрес или одинаковые данные хранятся в одном файле.
+    """
+
+    def __init__(self, max_workers: int = None, per_host: int = None, timeout: tuple = None,
+                 retries: int = None, backoff: float = None):
+        """
+        :param max_workers: кол-во потоков загрузки, по умолчанию IMAGE_FETCH_WORKERS
+        :param per_host: кол-во одновременных запросов к хосту, по умолчанию IMAGE_FETCH_PER_HOST
+        :param timeout: таймауты (соединение, чтение) в секундах, по умолчанию IMAGE_FETCH_TIMEOUT
+        :param retries: кол-во повторов запроса, по умолчанию IMAGE_FETCH_RETRIES
+        :param backoff: множитель паузы между повторами, по умолчанию IMAGE_FETCH_BACKOFF
+        """
+        self.max_workers = max_workers or settings.IMAGE_FETCH_WORKERS
+        self.per_host = per_host or settings.IMAGE_FETCH_PER_HOST
+        self.timeout = timeout or settings.IMAGE_FETCH_TIMEOUT
+        retries = settings.IMAGE_FETCH_RETRIES if retries is None else retries
+        backoff = settings.IMAGE_FETCH_BACKOFF if backoff is None else backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=self.max_workers, max_retries=Retry(
+            total=retries, backoff_factor=backoff, status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=('GET', ), raise_on_status=False))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='image-fetcher')
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, threading.BoundedSemaphore] = defaultdict(
+            lambda: threading.BoundedSemaphore(self.per_host))
+        self._fetched: Dict[str, str] = {}
+        self.directory = os.path.join(settings.MEDIA_ROOT, settings.MEDIA_IMAGE_URL)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        """Завершает потоки загрузки и закрывает соединения."""
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+    def _host_limit(self, url: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            return self._hosts[urlsplit(url).netloc]
+
+    @staticmethod
+    def _extension(url: str, content_type: str) -> str:
+        """Определяет расширение файла по типу содержимого или по адресу."""
+        content_type = content_type.split(';')[0].strip().lower()
+        if content_type in IMAGE_EXTENSIONS:
+            return IMAGE_EXTENSIONS[content_type]
+        extension = os.path.splitext(urlsplit(url).path)[1].lower()
+        if extension and mimetypes.guess_type(f'image{extension}')[0]:
+            return extension
+        return '.jpg'
+
+    def _download(self, url: str) -> str:
+        """Загружает изображение во временный файл, подсчитывая хеш, и переносит его под именем хеша."""
+        os.makedirs(self.directory, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        with self._host_limit(url):
+            with self.session.get(url, timeout=self.timeout, stream=True) as response:
+                response.raise_for_status()
+                extension = self._extension(url, response.headers.get('Content-Type', ''))
+                with tempfile.NamedTemporaryFile(dir=self.directory, suffix='.part', delete=False) as temp:
+                    try:
+                        for chunk in response.iter_content(chunk_size=settings.IMAGE_FETCH_CHUNK_SIZE):
+                            size += len(chunk)
+                            if size > settings.IMAGE_FETCH_MAX_BYTES:
+                                raise ImageTooLarge(f'изображение {url} больше {settings.IMAGE_FETCH_MAX_BYTES} байт')
+                            digest.update(chunk)
+                            temp.write(chunk)
+                    except BaseException:
+                        temp.close()
+                        os.unlink(temp.name)
+                        raise
+
+        file_name = f'{digest.hexdigest()}{extension}'
+        path = os.path.join(self.directory, file_name)
+        if os.path.exists(path):
+            os.unlink(temp.name)
+        else:
+            os.replace(temp.name, path)
+        return f'{settings.MEDIA_IMAGE_URL}{file_name}'
+
+    def fetch(self, url: str) -> str:
+        """
+        Загружает изображение, повторно запрошенный адрес не загружается.
+        :param url: адрес изображения
+        :return: путь к изображению относительно MEDIA_ROOT
+        """
+        with self._lock:
+            if url in self._fetched:
+                return self._fetched[url]
+        path = self._download(url)
+        with self._lock:
+            self._fetched[url] = path
+        return path
+
+    def fetch_many(self, urls: Iterable[str]) -> Dict[str, Union[str, Exception]]:
+        """
+        Загружает изображения параллельно.
+        :param urls: адреса изображений
+        :return: путь к изображению или ошибка загрузки для каждого адреса
+        """
+        futures = {url: self._executor.submit(self.fetch, url) for url in dict.fromkeys(urls)}
+        results = {}
+        for url, future in futures.items():
+            try:
+                results[url] = future.result()
+            except (ValueError, OSError, requests.RequestException) as ex:
+                results[url] = ex
+        return results
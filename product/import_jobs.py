@@ -0,0 +1,144 @@
+# Фоновые задания импорта файлов товаров: создание, выполнение с контрольными точками, статус
+import datetime
+from itertools import islice
+
+from django.conf import settings
+from django.core.files.base import File
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from product.import_stream import iter_stream_records
+from product.importer import ImportStats, ProductImporter
+from product.models import ImportJob, LoggingImportFileModel
+from shop.models import Seller
+
+# Каталог файлов заданий импорта относительно MEDIA_ROOT
+QUEUED_FILES_DIR = 'import_files/queued_files/'
+
+
+class ImportJobBusy(Exception):
+    """Задание импорта выполняет другой воркер."""
+
+
+def create_import_job(seller: Seller, file: File, file_name: str) -> ImportJob:
+    """
+    Сохраняет загруженный файл и создает задание импорта.
+    :param seller: продавец
+    :param file: загруженный файл
+    :param file_name: имя файла
+    :return: задание импорта
+    """
+    job = ImportJob(seller=seller, file_name=file_name, total_bytes=file.size or 0)
+    job.file.save(file_name, file, save=False)
+    job.save()
+    return job
+
+
+def create_import_job_for_path(seller: Seller, name: str) -> ImportJob:
+    """
+    Создает задание импорта для файла, уже размещенного в каталоге QUEUED_FILES_DIR.
+    :param seller: продавец
+    :param name: имя файла в каталоге
+    :return: задание импорта
+    """
+    job = ImportJob(seller=seller, file_name=name)
+    job.file.name = f'{QUEUED_FILES_DIR}{name}'
+    job.total_bytes = job.file.size
+    job.save()
+    return job
+
+
+def enqueue_import_job(job: ImportJob) -> None:
+    """Ставит задание импорта в очередь Celery после фиксации транзакции."""
+    from product.tasks import import_product_file
+
+    transaction.on_commit(lambda: import_product_file.delay(job.pk))
+
+
+def _save_checkpoint(job: ImportJob, stream, stats: ImportStats) -> None:
+    """Сохраняет контрольную точку в транзакции импортированного пакета."""
+    ImportJob.objects.filter(pk=job.pk).update(rows_processed=stats.rows, processed_bytes=stream.tell(),
+                                               stats=stats.as_dict(), heartbeat_at=timezone.now())
+
+
+def _claim(job_id: int) -> bool:
+    """
+    Атомарно отмечает задание как выполняемое текущим воркером. Задание можно взять, если оно в очереди,
+    завершилось ошибкой или выполняется, но контрольная точка не сохранялась IMPORT_JOB_HEARTBEAT_TIMEOUT.
+    :param job_id: id задания
+    :return: взято ли задание
+    """
+    now = timezone.now()
+    stale = now - datetime.timedelta(seconds=settings.IMPORT_JOB_HEARTBEAT_TIMEOUT)
+    claimable = Q(status__in=[ImportJob.STATUS_QUEUED, ImportJob.STATUS_FAILED]) | \
+        (Q(status=ImportJob.STATUS_RUNNING) & (Q(heartbeat_at__isnull=True) | Q(heartbeat_at__lt=stale)))
+    return ImportJob.objects.filter(claimable, pk=job_id).update(
+        status=ImportJob.STATUS_RUNNING, started_at=Coalesce('started_at', now), heartbeat_at=now, message='') == 1
+
+
+def _finish(job: ImportJob, status: str, **fields) -> ImportJob:
+    """Фиксирует завершение задания."""
+    job.refresh_from_db()
+    job.status = status
+    job.finished_at = timezone.now()
+    for name, value in fields.items():
+        setattr(job, name, value)
+    job.save()
+    return job
+
+
+def run_import_job(job_id: int) -> ImportJob:
+    """
+    Выполняет задание импорта. Прерванное задание продолжается с последнего зафиксированного пакета:
+    первые rows_processed записей файла пропускаются без повторного импорта.
+    Задание, которое выполняет другой воркер, не запускается повторно.
+    :param job_id: id задания
+    :return: задание импорта
+    :raises ImportJobBusy: задание выполняется другим воркером
+    """
+    if not _claim(job_id):
+        job = ImportJob.objects.get(pk=job_id)
+        if job.status == ImportJob.STATUS_DONE:
+            return job
+        raise ImportJobBusy(job_id)
+
+    job = ImportJob.objects.select_related('seller').get(pk=job_id)
+    resumed = job.rows_processed
+
+    try:
+        with job.file.open('rb') as stream:
+            importer = ProductImporter(job.seller, job.file_name,
+                                       stats=ImportStats.from_dict(job.stats) if resumed else None,
+                                       on_batch=lambda stats: _save_checkpoint(job, stream, stats))
+            stats = importer.run(islice(iter_stream_records(stream), resumed, None))
+    except (TypeError, ValueError, OSError) as ex:
+        LoggingImportFileModel.objects.create(file_name=job.file_name, seller=job.seller,
+                                              message=f'Ошибка парсинга файла: {ex} | {type(ex)}'[:255])
+        return _finish(job, ImportJob.STATUS_FAILED, message=str(ex))
+    except Exception as ex:
+        _finish(job, ImportJob.STATUS_FAILED, message=str(ex))
+        raise
+
+    return _finish(job, ImportJob.STATUS_DONE, processed_bytes=job.total_bytes, rows_processed=stats.rows,
+                   stats=stats.as_dict())
+
+
+def get_job_status(job: ImportJob) -> dict:
+    """
+    Возвращает состояние задания импорта для опроса клиентом.
+    :param job: задание импорта
+    :return: словарь состояния
+    """
+    return {
+        'id': job.pk,
+        'file_name': job.file_name,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'progress': job.progress,
+        'rows_processed': job.rows_processed,
+        'stats': job.stats,
+        'message': job.message,
+        'finished': job.status in (ImportJob.STATUS_DONE, ImportJob.STATUS_FAILED),
+    }
@@ -0,0 +1,181 @@
+# Потоковый разбор JSON-файла импорта товаров без загрузки всего файла в память
+import codecs
+import json
+from typing import Any, Iterator, Tuple
+
+from django.conf import settings
+
+# Событие разбора: ('start_category', имя), ('product', товар) или ('end_category', имя)
+ImportEvent = Tuple[str, Any]
+
+WHITESPACE = ' \t\r\n'
+
+_decoder = json.JSONDecoder()
+
+
+class JsonStreamReader:
+    """
+    Чтение JSON из файла порциями.
+    В памяти хранится только непрочитанный остаток текущей порции и разбираемое значение,
+    поэтому расход памяти ограничен размером порции и наибольшим значением, а не размером файла.
+    Значение больше IMPORT_STREAM_MAX_RECORD_SIZE символов считается ошибкой.
+    """
+
+    def __init__(self, stream, chunk_size: int = None):
+        """
+        :param stream: файл, открытый в двоичном или текстовом режиме, или загруженный файл
+        :param chunk_size: размер порции чтения в байтах, по умолчанию IMPORT_STREAM_CHUNK_SIZE
+        """
+        self._stream = stream
+        self._chunk_size = chunk_size or settings.IMPORT_STREAM_CHUNK_SIZE
+        self._text_decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        self.bytes_read = 0
+
+    @property
+    def buffer_size(self) -> int:
+        """Размер непрочитанного остатка в памяти."""
+        return len(self._buffer) - self._pos
+
+    def _fill(self) -> bool:
+        """Дочитывает порцию файла, прочитанная часть буфера отбрасывается. Возвращает False в конце файла."""
+        if self._eof:
+            return False
+        chunk = self._stream.read(self._chunk_size)
+        if isinstance(chunk, bytes):
+            self.bytes_read += len(chunk)
+            text = self._text_decoder.decode(chunk, final=not chunk)
+        else:
+            self.bytes_read += len(chunk.encode())
+            text = chunk
+        self._eof = not chunk
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        return not self._eof
+
+    def peek(self) -> str:
+        """Возвращает следующий значимый символ без его чтения, пустую строку в конце файла."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char: str) -> None:
+        """Читает ожидаемый символ разметки."""
+        found = self.peek()
+        if found != char:
+            raise ValueError(f'Ожидается «{char}», найдено «{found}» (байт {self.bytes_read})')
+        self._pos += 1
+
+    def separator(self, closing: str) -> bool:
+        """Читает разделитель элементов. Возвращает False, если прочитана закрывающая скобка."""
+        if self.peek() == closing:
+            self._pos += 1
+            return False
+        self.expect(',')
+        return True
+
+    def value(self) -> Any:
+        """
+        Читает и разбирает очередное JSON-значение целиком.
+        Незавершенное значение дочитывается порциями, но не больше IMPORT_STREAM_MAX_RECORD_SIZE символов.
+        :raises ValueError: значение содержит ошибку, не завершено или слишком велико
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError as error:
+                if self.buffer_size > settings.IMPORT_STREAM_MAX_RECORD_SIZE:
+                    raise ValueError(f'Значение длиннее {settings.IMPORT_STREAM_MAX_RECORD_SIZE} символов '
+                                     f'или содержит ошибку (байт {self.bytes_read})') from error
+                if self._fill():
+                    continue
+                raise
+            # число в конце порции может продолжаться в следующей порции
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def key(self) -> str:
+        """Читает ключ объекта вместе с двоеточием."""
+        if self.peek() != '"':
+            raise ValueError(f'Ожидается ключ объекта (байт {self.bytes_read})')
+        key = self.value()
+        self.expect(':')
+        return key
+
+
+def _iter_categories(reader: JsonStreamReader) -> Iterator[ImportEvent]:
+    """События разбора словаря категорий {"Категория": [товар, ...]}."""
+    reader.expect('{')
+    if reader.peek() == '}':
+        reader.expect('}')
+        return
+    while True:
+        category_name = reader.key()
+        if reader.peek() != '[':
+            raise TypeError(f'список товаров категории {category_name} должен быть массивом')
+        reader.expect('[')
+        yield 'start_category', category_name
+        if reader.peek() == ']':
+            reader.expect(']')
+        else:
+            while True:
+                yield 'product', reader.value()
+                if not reader.separator(']'):
+                    break
+        yield 'end_category', category_name
+        if not reader.separator('}'):
+            return
+
+
+def iter_events(stream, chunk_size: int = None) -> Iterator[ImportEvent]:
+    """
+    Разбирает файл импорта вида {"category": {"Категория": [товар, ...]}} по одному товару.
+    Прочие ключи верхнего уровня пропускаются.
+    :param stream: файл или загруженный файл
+    :param chunk_size: размер порции чтения в байтах
+    :return: итератор событий разбора
+    """
+    reader = JsonStreamReader(stream, chunk_size)
+    reader.expect('{')
+    found = False
+    if reader.peek() == '}':
+        reader.expect('}')
+    else:
+        while True:
+            key = reader.key()
+            if key == 'category' and reader.peek() == '{':
+                found = True
+                yield from _iter_categories(reader)
+            else:
+                reader.value()
+            if not reader.separator('}'):
+                break
+    if reader.peek():
+        raise ValueError(f'Лишние данные после JSON (байт {reader.bytes_read})')
+    if not found:
+        raise ValueError('в файле отсутствует словарь category')
+
+
+def iter_stream_records(stream, chunk_size: int = None) -> Iterator[Tuple[str, dict]]:
+    """
+    Перебирает товары файла импорта без загрузки всего файла в память.
+    Возвращает те же записи (категория, товар), что и product.importer.iter_records.
+    :param stream: файл или загруженный файл
+    :param chunk_size: размер порции чтения в байтах
+    :return: итератор записей (категория, товар)
+    """
+    category_name = None
+    for event, value in iter_events(stream, chunk_size):
+        if event == 'start_category':
+            category_name = value
+        elif event == 'product':
+            yield category_name, value
@@ -0,0 +1,378 @@
+# Пакетный импорт товаров продавца из JSON-файла
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from django.conf import settings
+from django.db import transaction
+
+from product.image_fetcher import ImageFetcher
+from product.models import (
+    Category,
+    Product,
+    Property,
+    ProductProperty,
+    ProductImage,
+    Offer,
+    LoggingImportFileModel,
+)
+from product.signals import update_catalog, update_search_index
+from promotions.signals import update_promo_prices
+from shop.models import Seller
+
+logger = logging.getLogger(__name__)
+
+# Запись импорта: (наименование категории, описание товара из файла)
+ImportRecord = Tuple[str, dict]
+
+# Этапы импорта пакета в порядке выполнения
+IMPORT_STAGES = ('validation', 'categories', 'properties', 'products', 'offers', 'images', 'catalog', 'log')
+
+
+class ImportStats:
+    """Статистика импорта: кол-во обработанных записей, созданных объектов, ошибок и время этапов."""
+    COUNTERS = ('rows', 'batches', 'products_created', 'offers_created', 'offers_updated', 'images_created', 'errors')
+
+    def __init__(self):
+        self.rows = 0
+        self.batches = 0
+        self.products_created = 0
+        self.offers_created = 0
+        self.offers_updated = 0
+        self.images_created = 0
+        self.errors = 0
+        self.timings: Dict[str, float] = defaultdict(float)
+        self.elapsed = 0.0
+        self._started = time.monotonic()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Замеряет время выполнения этапа импорта."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.monotonic() - started
+
+    @classmethod
+    def from_dict(cls, values: dict) -> 'ImportStats':
+        """Восстанавливает статистику, сохраненную методом as_dict, для продолжения импорта."""
+        stats = cls()
+        for name in cls.COUNTERS:
+            setattr(stats, name, values.get(name, 0))
+        stats.timings.update(values.get('timings', {}))
+        stats._started -= values.get('elapsed', 0.0)
+        return stats
+
+    def finish(self) -> None:
+        """Фиксирует общее время импорта."""
+        self.elapsed = time.monotonic() - self._started
+
+    @property
+    def duration(self) -> float:
+        """Время импорта: общее после завершения или текущее во время импорта."""
+        return self.elapsed or time.monotonic() - self._started
+
+    @property
+    def rows_per_second(self) -> float:
+        """Кол-во обработанных записей в секунду."""
+        return self.rows / self.duration if self.duration else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            **{name: getattr(self, name) for name in self.COUNTERS},
+            'elapsed': round(self.duration, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+            'timings': {name: round(self.timings[name], 3) for name in IMPORT_STAGES if name in self.timings},
+        }
+
+    def __str__(self):
+        return (f'Записей: {self.rows}, пакетов: {self.batches}, создано товаров: {self.products_created}, '
+                f'создано предложений: {self.offers_created}, обновлено предложений: {self.offers_updated}, '
+                f'ошибок: {self.errors}, {self.rows_per_second:.1f} записей/с')
+
+
+def iter_records(data: dict) -> Iterator[ImportRecord]:
+    """
+    Перебирает товары разобранного JSON-файла вида {"category": {"Категория": [товар, ...]}}.
+    :param data: содержимое файла
+    :return: итератор записей (категория, товар)
+    """
+    categories = data.get('category') if isinstance(data, dict) else None
+    if not isinstance(categories, dict):
+        raise ValueError('в файле отсутствует словарь category')
+    for category_name, products in categories.items():
+        if not isinstance(products, list):
+            raise TypeError(f'список товаров категории {category_name} должен быть массивом')
+        for item in products:
+            yield category_name, item
+
+
+def chunked(records: Iterable, size: int) -> Iterator[list]:
+    """Разбивает последовательность на списки не длиннее size элементов."""
+    iterator = iter(records)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ProductImporter:
+    """
+    Импорт товаров пакетами: каждый пакет записей обрабатывается в отдельной транзакции
+    фиксированным числом запросов (bulk_create/bulk_update), независимо от размера пакета.
+    Существующие категории, свойства и товары ищутся по наименованию, предложение продавца
+    на существующий товар обновляется. Ошибки записей сохраняются в LoggingImportFileModel.
+    """
+
+    def __init__(self, seller: Seller, file_name: str, batch_size: Optional[int] = None,
+                 stats: Optional[ImportStats] = None, on_batch: Optional[Callable[[ImportStats], None]] = None):
+        """
+        :param seller: продавец
+        :param file_name: имя файла для журнала ошибок
+        :param batch_size: кол-во записей в пакете, по умолчанию IMPORT_BATCH_SIZE
+        :param stats: статистика прерванного импорта, который продолжается
+        :param on_batch: функция, вызываемая в транзакции пакета после его импорта (сохранение контрольной точки)
+        """
+        self.seller = seller
+        self.file_name = file_name
+        self.batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+        self.stats = stats or ImportStats()
+        self.on_batch = on_batch
+        self._categories: Dict[str, Category] = {}
+        self._properties: Dict[str, Property] = {}
+        self._errors: List[LoggingImportFileModel] = []
+        self._image_fetcher: Optional[ImageFetcher] = None
+
+    def run(self, records: Iterable[ImportRecord]) -> ImportStats:
+        """
+        Импортирует записи пакетами.
+        :param records: записи (категория, товар)
+        :return: статистика импорта
+        """
+        try:
+            for batch in chunked(records, self.batch_size):
+                self.import_batch(batch)
+        finally:
+            if self._image_fetcher is not None:
+                self._image_fetcher.close()
+                self._image_fetcher = None
+        self.stats.finish()
+        logger.info('Импорт файла %s: %s', self.file_name, self.stats)
+        return self.stats
+
+    def log_error(self, message: str) -> None:
+        """Добавляет ошибку в журнал импорта, журнал сохраняется после каждого пакета."""
+        field = LoggingImportFileModel._meta.get_field('message')
+        self._errors.append(LoggingImportFileModel(file_name=self.file_name, seller=self.seller,
+                                                   message=message[:field.max_length]))
+        self.stats.errors += 1
+
+    def flush_errors(self) -> None:
+        """Сохраняет накопленные ошибки одним запросом."""
+        with self.stats.stage('log'):
+            if self._errors:
+                LoggingImportFileModel.objects.bulk_create(self._errors, batch_size=self.batch_size)
+                self._errors = []
+
+    def import_batch(self, batch: List[ImportRecord]) -> None:
+        """
+        Импортирует пакет записей в одной транзакции. Изображения загружаются до начала транзакции,
+        чтобы она и блокировки строк не удерживались на время ответа внешних хостов.
+        :param batch: записи (категория, товар)
+        """
+        with self.stats.stage('validation'):
+            records = self._validate(batch)
+        with self.stats.stage('images'):
+            fetched = self._fetch_images(records)
+        with transaction.atomic():
+            with self.stats.stage('validation'):
+                existing = self._load_products({item['name'] for _, item in records})
+                new_records = self._new_product_records(records, existing)
+            with self.stats.stage('categories'):
+                self._load_categories({category_name for category_name, _ in new_records})
+            with self.stats.stage('properties'):
+                self._load_properties({item['property']['name'] for _, item in new_records})
+            with self.stats.stage('products'):
+                products = self._create_products(new_records)
+            existing.update(products)
+            with self.stats.stage('offers'):
+                self._save_offers(records, existing)
+            with self.stats.stage('images'):
+                self._create_images(new_records, products, fetched)
+            with self.stats.stage('catalog'):
+                product_ids = {product.pk for product in existing.values()}
+                update_catalog(product_ids)
+                update_search_index(product_ids)
+                update_promo_prices(product_ids)
+            self.flush_errors()
+            self.stats.rows += len(batch)
+            self.stats.batches += 1
+            if self.on_batch is not None:
+                self.on_batch(self.stats)
+
+    def _validate(self, batch: List[ImportRecord]) -> List[ImportRecord]:
+        """Отбирает записи с корректным наименованием товара."""
+        max_length = Product._meta.get_field('name').max_length
+        records = []
+        for category_name, item in batch:
+            name = item.get('name') if isinstance(item, dict) else None
+            if not isinstance(name, str) or not name or len(name) > max_length:
+                self.log_error(f'Ошибка создании Product {name}: некорректное наименование | {type(name)}')
+                continue
+            records.append((category_name, item))
+        return records
+
+    @staticmethod
+    def _load_products(names: set) -> Dict[str, Product]:
+        """Загружает существующие товары по наименованиям."""
+        products = {}
+        for product in Product.objects.filter(name__in=names).order_by('-id'):
+            products[product.name] = product
+        return products
+
+    def _new_product_records(self, records: List[ImportRecord], existing: Dict[str, Product]) -> List[ImportRecord]:
+        """Отбирает записи новых товаров с полным описанием, дубликаты наименований в пакете пропускаются."""
+        new_records = {}
+        for category_name, item in records:
+            name = item['name']
+            if name in existing or name in new_records:
+                continue
+            try:
+                if not isinstance(item['description'], str) or not isinstance(item['property']['name'], str):
+                    raise TypeError('ожидается строка')
+                str(item['property']['value'])
+            except (KeyError, TypeError) as ex:
+                self.log_error(f'Ошибка создании Product {name}: {ex} | {type(ex)}')
+                continue
+            new_records[name] = (category_name, item)
+        return list(new_records.values())
+
+    def _load_categories(self, names: set) -> None:
+        """Загружает или создает категории. Категории MPTT создаются по одной: их немного на файл."""
+        missing = names - self._categories.keys()
+        for category in Category.objects.filter(name__in=missing).order_by('-id'):
+            self._categories[category.name] = category
+        for name in missing - self._categories.keys():
+            self._categories[name] = Category.objects.create(name=name)
+
+    def _load_properties(self, names: set) -> None:
+        """Загружает существующие и создает недостающие свойства."""
+        missing = names - self._properties.keys()
+        for prop in Property.objects.filter(name__in=missing).order_by('-id'):
+            self._properties[prop.name] = prop
+        new = [Property(name=name) for name in missing - self._properties.keys()]
+        Property.objects.bulk_create(new, batch_size=self.batch_size)
+        if any(prop.pk is None for prop in new):
+            new = Property.objects.filter(name__in=[prop.name for prop in new])
+        for prop in new:
+            self._properties[prop.name] = prop
+
+    def _create_products(self, records: List[ImportRecord]) -> Dict[str, Product]:
+        """Создает товары и значения их свойств."""
+        products = [Product(name=item['name'], description=item['description'],
+                            category=self._categories[category_name])
+                    for category_name, item in records]
+        Product.objects.bulk_create(products, batch_size=self.batch_size)
+        if any(product.pk is None for product in products):
+            products = Product.objects.filter(name__in=[product.name for product in products])
+        products = {product.name: product for product in products}
+
+        ProductProperty.objects.bulk_create(
+            [ProductProperty(product=products[item['name']],
+                             property=self._properties[item['property']['name']],
+                             value=str(item['property']['value']))
+             for _, item in records],
+            batch_size=self.batch_size,
+        )
+        self.stats.products_created += len(products)
+        return products
+
+    def _offer_prices(self, records: List[ImportRecord], products: Dict[str, Product]) -> Dict[int, Decimal]:
+        """Возвращает цены предложений продавца по id товаров."""
+        prices = {}
+        for _, item in records:
+            if not item.get('offer') or item['name'] not in products:
+                continue
+            try:
+                prices[products[item['name']].pk] = Decimal(str(item['offer']['price']))
+            except (KeyError, TypeError, InvalidOperation) as ex:
+                self.log_error(f'Ошибка создании Offer {item["name"]}: {ex} | {type(ex)}')
+        return prices
+
+    def _save_offers(self, records: List[ImportRecord], products: Dict[str, Product]) -> None:
+        """Создает предложения продавца, цены существующих предложений обновляются."""
+        prices = self._offer_prices(records, products)
+        offers = {offer.product_id: offer
+                  for offer in Offer.objects.filter(seller=self.seller, product_id__in=prices.keys())}
+
+        updated = []
+        for product_id, offer in offers.items():
+            offer.price = prices[product_id]
+            updated.append(offer)
+        Offer.objects.bulk_update(updated, ['price'], batch_size=self.batch_size)
+
+        created = [Offer(product_id=product_id, seller=self.seller, price=price)
+                   for product_id, price in prices.items() if product_id not in offers]
+        Offer.objects.bulk_create(created, batch_size=self.batch_size)
+
+        self.stats.offers_updated += len(updated)
+        self.stats.offers_created += len(created)
+
+    @staticmethod
+    def _image_urls(item: dict) -> Optional[List[str]]:
+        """Возвращает адреса изображений товара или None, если список изображений некорректен."""
+        images = item.get('image') or []
+        if not isinstance(images, list) or not all(isinstance(url, str) for url in images):
+            return None
+        return images
+
+    def _fetch_images(self, records: List[ImportRecord]) -> Dict[str, Union[str, Exception]]:
+        """
+        Загружает параллельно изображения товаров, которых еще нет в базе данных.
+        :param records: записи (категория, товар)
+        :return: путь к файлу или ошибка загрузки по адресу изображения
+        """
+        images = {item['name']: self._image_urls(item) for _, item in records}
+        images = {name: urls for name, urls in images.items() if urls}
+        if not images:
+            return {}
+        existing = set(Product.objects.filter(name__in=images.keys()).values_list('name', flat=True))
+        urls = [url for name, product_urls in images.items() if name not in existing for url in product_urls]
+        if not urls:
+            return {}
+        if self._image_fetcher is None:
+            self._image_fetcher = ImageFetcher()
+        return self._image_fetcher.fetch_many(urls)
+
+    def _create_images(self, records: List[ImportRecord], products: Dict[str, Product],
+                       fetched: Dict[str, Union[str, Exception]]) -> None:
+        """
+        Создает изображения новых товаров из загруженных файлов, одинаковые изображения товара сохраняются один раз.
+        :param records: записи новых товаров
+        :param products: новые товары по наименованию
+        :param fetched: путь к файлу или ошибка загрузки по адресу изображения
+        """
+        images = []
+        for _, item in records:
+            product = products[item['name']]
+            product_urls = self._image_urls(item)
+            if product_urls is None:
+                self.log_error(f'Ошибка создании ProductImage {product}: некорректный список изображений')
+                continue
+            paths = {}
+            for url in product_urls:
+                # набор новых товаров изменился параллельно после загрузки изображений
+                result = fetched.get(url, LookupError(f'изображение {url} не загружено'))
+                if isinstance(result, Exception):
+                    self.log_error(f'Ошибка создании ProductImage {product}: {result} | {type(result)}')
+                else:
+                    paths.setdefault(result, ProductImage(product=product, image=result))
+            images.extend(paths.values())
+        ProductImage.objects.bulk_create(images, batch_size=self.batch_size)
+        self.stats.images_created += len(images)
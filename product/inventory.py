@@ -0,0 +1,147 @@
+# Учет остатков предложений: резервирование на время оформления заказа и списание при создании заказа.
+# Остатки изменяются условными UPDATE с F()-выражениями без предварительного чтения,
+# поэтому параллельные заказы не могут списать больше, чем есть на складе.
+import datetime
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from product.models import Offer, StockReservation
+
+# Кол-во резервов, снимаемых уборщиком в одной транзакции
+REAP_BATCH_SIZE = 500
+
+
+def out_of_stock(offer_ids: Iterable[int]) -> ValidationError:
+    return ValidationError(_('Недостаточно товара на складе'), code='out_of_stock',
+                           params={'offers': sorted(offer_ids)})
+
+
+def tracked_offers(offer_ids: Iterable[int]) -> List[int]:
+    """
+    Возвращает предложения, остаток которых учитывается.
+    :param offer_ids: id предложений
+    :return: отсортированные id предложений
+    """
+    return sorted(Offer.objects.filter(id__in=list(offer_ids), stock__isnull=False).values_list('id', flat=True))
+
+
+def _release(reservations: List[Tuple[int, int, int]]) -> Dict[int, int]:
+    """
+    Удаляет резервы и возвращает зарезервированные единицы в доступный остаток.
+    :param reservations: кортежи (id резерва, id предложения, кол-во)
+    :return: снятое кол-во по id предложения
+    """
+    released = defaultdict(int)
+    for _id, offer_id, quantity in reservations:
+        released[offer_id] += quantity
+    if not reservations:
+        return released
+    StockReservation.objects.filter(id__in=[reservation[0] for reservation in reservations]).delete()
+    # предложения обновляются в одном порядке, чтобы параллельные транзакции не блокировали друг друга
+    for offer_id in sorted(released):
+        Offer.objects.filter(id=offer_id).update(reserved=F('reserved') - released[offer_id])
+    return released
+
+
+def _locked_reservations(key: str) -> List[Tuple[int, int, int]]:
+    return list(StockReservation.objects.select_for_update().filter(key=key).
+                values_list('id', 'offer_id', 'quantity'))
+
+
+def release_reservations(key: str) -> Dict[int, int]:
+    """
+    Снимает резервы оформления заказа.
+    :param key: ключ оформления заказа
+    :return: снятое кол-во по id предложения
+    """
+    with transaction.atomic():
+        return _release(_locked_reservations(key))
+
+
+def reserve_stock(quantities: Dict[int, int], key: str, ttl: Optional[int] = None) -> Optional[datetime.datetime]:
+    """
+    Резервирует единицы предложений на время оформления заказа. Прежние резервы оформления заменяются.
+    Резерв создается, только если доступного остатка хватает на все предложения.
+    :param quantities: кол-во по id предложения
+    :param key: ключ оформления заказа
+    :param ttl: время действия резерва в секундах, по умолчанию STOCK_RESERVATION_TTL
+    :return: время окончания резерва или None, если остатки предложений не учитываются
+    :raises ValidationError: остатка недостаточно
+    """
+    quantities = {int(offer_id): quantity for offer_id, quantity in quantities.items() if quantity > 0}
+    expires_at = timezone.now() + datetime.timedelta(seconds=ttl or settings.STOCK_RESERVATION_TTL)
+    with transaction.atomic():
+        _release(_locked_reservations(key))
+        tracked = tracked_offers(quantities)
+        short = [offer_id for offer_id in tracked
+                 if not Offer.objects.filter(id=offer_id, stock__gte=F('reserved') + quantities[offer_id]).
+                 update(reserved=F('reserved') + quantities[offer_id])]
+        if short:
+            raise out_of_stock(short)
+        StockReservation.objects.bulk_create([
+            StockReservation(offer_id=offer_id, key=key, quantity=quantities[offer_id], expires_at=expires_at)
+            for offer_id in tracked
+        ])
+    return expires_at if tracked else None
+
+
+def commit_stock(quantities: Dict[int, int], key: Optional[str] = None,
+                 tracked: Optional[Iterable[int]] = None) -> None:
+    """
+    Списывает остатки предложений при создании заказа, резервы оформления заказа снимаются.
+    Вызывается в транзакции создания заказа: при нехватке остатка транзакция откатывается целиком.
+    Списание возможно и без резерва (резерв истек), если доступного остатка хватает.
+    :param quantities: кол-во по id предложения
+    :param key: ключ оформления заказа
+    :param tracked: id предложений с учитываемым остатком, если уже известны
+    :raises ValidationError: остатка недостаточно
+    """
+    quantities = {int(offer_id): quantity for offer_id, quantity in quantities.items()}
+    reserved = defaultdict(int)
+    reservations = _locked_reservations(key) if key else []
+    if reservations:
+        StockReservation.objects.filter(id__in=[reservation[0] for reservation in reservations]).delete()
+        for _id, offer_id, quantity in reservations:
+            reserved[offer_id] += quantity
+
+    tracked = sorted(tracked) if tracked is not None else tracked_offers(quantities)
+    short = []
+    for offer_id in tracked:
+        own, quantity = reserved.pop(offer_id, 0), quantities[offer_id]
+        updated = Offer.objects.filter(id=offer_id, stock__gte=F('reserved') - own + quantity).\
+            update(stock=F('stock') - quantity, reserved=F('reserved') - own)
+        if not updated:
+            short.append(offer_id)
+    if short:
+        raise out_of_stock(short)
+    # резервы товаров, удаленных из корзины после резервирования
+    for offer_id in sorted(reserved):
+        Offer.objects.filter(id=offer_id).update(reserved=F('reserved') - reserved[offer_id])
+
+
+def release_expired_reservations(now: Optional[datetime.datetime] = None, batch_size: int = REAP_BATCH_SIZE) -> int:
+    """
+    Снимает истекшие резервы. Резервы, заблокированные создаваемым заказом, пропускаются (SKIP LOCKED),
+    поэтому несколько уборщиков и оформление заказов не мешают друг другу.
+    :param now: текущее время, по умолчанию сейчас
+    :param batch_size: кол-во резервов в одной транзакции
+    :return: кол-во снятых резервов
+    """
+    now = now or timezone.now()
+    total = 0
+    while True:
+        with transaction.atomic():
+            reservations = list(StockReservation.objects.select_for_update(skip_locked=True).
+                                filter(expires_at__lte=now).order_by('id').
+                                values_list('id', 'offer_id', 'quantity')[:batch_size])
+            _release(reservations)
+        total += len(reservations)
+        if len(reservations) < batch_size:
+            return total
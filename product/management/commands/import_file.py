@@ -1,20 +1,48 @@
 import os
-from django.core.management.base import BaseCommand
-from product.import_file_test import parsing_json_file
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from product.import_jobs import QUEUED_FILES_DIR, create_import_job_for_path, enqueue_import_job, run_import_job
+from product.models import ImportJob
+from shop.models import Seller
 
 
 class Command(BaseCommand):
 
-    help = 'Команда для добавление файла'
+    help = 'Команда для импорта файла товаров из каталога media/import_files/queued_files/'
 
     def add_arguments(self, parser):
-        parser.add_argument('name_file', type=str, help=u'Имя файла')
+        parser.add_argument('name_file', type=str, nargs='?', help=u'Имя файла')
+        parser.add_argument('--seller', type=int, help=u'id продавца')
+        parser.add_argument('--resume', type=int, help=u'id прерванного задания импорта')
+        parser.add_argument('--queue', action='store_true', help=u'Выполнить импорт в Celery')
 
     def handle(self, *args, **kwargs):
-        name = kwargs['name_file']
-        path = os.path.abspath(os.path.join(f'media/import_files/queued_files/{name}'))
-
-        if os.path.isfile(path):
-            parsing_json_file(path)
+        if kwargs['resume']:
+            job = ImportJob.objects.filter(pk=kwargs['resume']).first()
+            if job is None:
+                raise CommandError(f'Задания импорта {kwargs["resume"]} не существует')
         else:
-            print(f'Файла {name} не существует в директории !')
+            job = self._create_job(kwargs['name_file'], kwargs['seller'])
+
+        if kwargs['queue']:
+            enqueue_import_job(job)
+            self.stdout.write(f'Задание импорта {job.pk} поставлено в очередь')
+            return
+
+        job = run_import_job(job.pk)
+        self.stdout.write(f'Задание импорта {job.pk}: {job.get_status_display()} {job.message}')
+        self.stdout.write(str(job.stats))
+
+    @staticmethod
+    def _create_job(name: str, seller_id: int) -> ImportJob:
+        if not name or not seller_id:
+            raise CommandError('Укажите имя файла и --seller или --resume')
+        path = os.path.join(settings.MEDIA_ROOT, QUEUED_FILES_DIR, name)
+        if not os.path.isfile(path):
+            raise CommandError(f'Файла {name} не существует в директории !')
+        seller = Seller.objects.filter(pk=seller_id).first()
+        if seller is None:
+            raise CommandError(f'Продавца {seller_id} не существует')
+        return create_import_job_for_path(seller, name)
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from product.catalog import refresh_catalog_products
+
+
+class Command(BaseCommand):
+
+    help = 'Команда для полного пересчета проекции каталога'
+
+    def handle(self, *args, **kwargs):
+        updated = refresh_catalog_products()
+        self.stdout.write(f'Пересчитано записей каталога: {updated}')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from product.search import get_search_backend
+
+
+class Command(BaseCommand):
+
+    help = 'Команда для полного перестроения поискового индекса товаров'
+
+    def handle(self, *args, **kwargs):
+        backend = get_search_backend()
+        backend.rebuild()
+        self.stdout.write(f'Проиндексировано товаров: {len(getattr(backend, "index", []))}')
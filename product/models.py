@@ -119,15 +119,41 @@ class Offer(models.Model):
     added_at = models.DateTimeField(auto_created=True, auto_now=True, verbose_name=_('время добавления'))
     is_free_delivery = models.BooleanField(default=True, verbose_name=_('бесплатная доставка'))
     is_present = models.BooleanField(default=True, verbose_name=_('в наличии'))
+    # Остаток не учитывается, если не задан; зарезервированные единицы входят в остаток до создания заказа
+    stock = models.PositiveIntegerField(blank=True, null=True, verbose_name=_('остаток'))
+    reserved = models.PositiveIntegerField(default=0, verbose_name=_('в резерве'))
 
     def __str__(self):
         return self.product.name
 
+    @property
+    def available(self):
+        """Кол-во единиц, доступных для заказа, или None, если остаток не учитывается."""
+        if self.stock is None:
+            return None
+        return max(self.stock - self.reserved, 0)
+
     class Meta:
         verbose_name = _("товар")
         verbose_name_plural = _("товары")
 
 
+class StockReservation(models.Model):
+    """Резерв единиц предложения на время оформления заказа"""
+    offer = models.ForeignKey(Offer, on_delete=models.CASCADE, related_name='reservations',
+                              verbose_name=_('предложение'))
+    key = models.CharField(max_length=64, db_index=True, verbose_name=_('ключ оформления заказа'))
+    quantity = models.PositiveIntegerField(verbose_name=_('количество'))
+    expires_at = models.DateTimeField(db_index=True, verbose_name=_('действует до'))
+
+    class Meta:
+        verbose_name = _('резерв товара')
+        verbose_name_plural = _('резервы товаров')
+
+    def __str__(self):
+        return f'{self.offer_id}: {self.quantity}'
+
+
 class ProductImage(models.Model):
     """Фотографии продукта"""
     product = models.ForeignKey(Product, verbose_name=_('продукт'), on_delete=models.CASCADE, related_name='images')
@@ -197,3 +223,81 @@ class LoggingImportFileModel(models.Model):
 
     def __str__(self):
         return self.file_name
+
+
+class ImportJob(models.Model):
+    """Задание импорта файла товаров продавца, выполняемое в фоне.
+    rows_processed - контрольная точка: кол-во записей файла в зафиксированных пакетах."""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, _('в очереди')),
+        (STATUS_RUNNING, _('выполняется')),
+        (STATUS_DONE, _('завершено')),
+        (STATUS_FAILED, _('ошибка')),
+    ]
+
+    seller = models.ForeignKey("shop.Seller", on_delete=models.CASCADE, related_name='import_jobs',
+                               verbose_name=_('продавец'))
+    file = models.FileField(upload_to='import_files/queued_files/', verbose_name=_('файл'))
+    file_name = models.CharField(max_length=255, verbose_name=_('имя файла'))
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True,
+                              verbose_name=_('статус'))
+    total_bytes = models.PositiveBigIntegerField(default=0, verbose_name=_('размер файла'))
+    processed_bytes = models.PositiveBigIntegerField(default=0, verbose_name=_('обработано байт'))
+    rows_processed = models.PositiveIntegerField(default=0, verbose_name=_('обработано записей'))
+    stats = models.JSONField(default=dict, blank=True, verbose_name=_('статистика'))
+    message = models.TextField(blank=True, verbose_name=_('сообщение'))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('создано'))
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name=_('начато'))
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name=_('последняя контрольная точка'))
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name=_('завершено'))
+
+    class Meta:
+        verbose_name = _('задание импорта')
+        verbose_name_plural = _('задания импорта')
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f'{self.file_name} ({self.get_status_display()})'
+
+    @property
+    def progress(self) -> int:
+        """Процент обработанной части файла."""
+        if self.status == self.STATUS_DONE:
+            return 100
+        if not self.total_bytes:
+            return 0
+        return min(int(self.processed_bytes * 100 / self.total_bytes), 99)
+
+
+class CatalogProduct(models.Model):
+    """Денормализованная запись каталога: одна строка на продукт.
+    Поддерживается сервисом product.catalog при изменении предложений, отзывов и заказов."""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='catalog_entry', verbose_name=_("продукт"))
+    category_path = models.CharField(max_length=64, blank=True, db_index=True,
+                                     verbose_name=_("путь категории"))
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, db_index=True,
+                                    verbose_name=_("минимальная цена"))
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True,
+                                    verbose_name=_("максимальная цена"))
+    avg_price = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True, db_index=True,
+                                    verbose_name=_("средняя цена"))
+    rating = models.FloatField(default=0, db_index=True, verbose_name=_("рейтинг"))
+    last_offer_at = models.DateTimeField(blank=True, null=True, db_index=True,
+                                         verbose_name=_("дата последнего предложения"))
+    sales_count = models.PositiveIntegerField(default=0, db_index=True, verbose_name=_("количество продаж"))
+    in_stock = models.BooleanField(default=False, db_index=True, verbose_name=_("в наличии"))
+    free_delivery = models.BooleanField(default=False, db_index=True, verbose_name=_("бесплатная доставка"))
+    seller_ids = models.CharField(max_length=1024, blank=True, verbose_name=_("продавцы"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("дата обновления"))
+
+    class Meta:
+        verbose_name = _("запись каталога")
+        verbose_name_plural = _("записи каталога")
+
+    def __str__(self):
+        return str(self.product_id)
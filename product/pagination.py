@@ -0,0 +1,290 @@
+# Модуль постраничного вывода по курсору (keyset pagination)
+import base64
+import binascii
+import datetime
+import json
+from decimal import Decimal
+from typing import Any, List, Optional, Tuple
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import F, Q, QuerySet
+from django.http import HttpRequest
+from django.utils.functional import cached_property
+
+# Название параметра query-string с курсором
+CURSOR_PARAM = 'cursor'
+
+# Наибольший id в курсоре (64-битное целое)
+MAX_CURSOR_ID = 2 ** 63 - 1
+
+
+def encode_cursor(payload: dict) -> str:
+    """
+    Кодирует состояние курсора в непрозрачную строку для query-string.
+    :param payload: состояние курсора
+    :return: строка курсора
+    """
+    data = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def _to_int(value: Any) -> Optional[int]:
+    """Приводит значение курсора к целому числу, некорректное значение - к None."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
+
+
+def decode_cursor(token: Optional[str]) -> Optional[dict]:
+    """
+    Декодирует строку курсора. Курсор приходит от клиента, поэтому все поля проверяются и приводятся
+    к ожидаемым типам; некорректный курсор считается отсутствующим.
+    :param token: строка курсора
+    :return: состояние курсора или None
+    """
+    if not token:
+        return None
+    try:
+        data = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(data)
+    except (binascii.Error, ValueError):
+        return None
+    if not isinstance(payload, dict) or not isinstance(payload.get('k'), list) or len(payload['k']) != 2:
+        return None
+    value, pk = payload['k']
+    pk, number = _to_int(pk), _to_int(payload.get('n', 1))
+    if pk is None or pk > MAX_CURSOR_ID or number is None or number < 1 or payload.get('d', 'n') not in ('n', 'p') \
+            or not isinstance(payload.get('s', ''), str) or isinstance(value, (list, dict)):
+        return None
+    return {'k': [value, pk], 'd': payload.get('d', 'n'), 'n': number, 's': payload.get('s', '')}
+
+
+def is_cursor_mode(request: HttpRequest, mode: str) -> bool:
+    """
+    Проверяет, нужно ли выводить выборку по курсору.
+    :param request: HTTP request
+    :param mode: режим, заданный в настройках ('offset' или 'cursor')
+    :return:
+    """
+    return mode == 'cursor' or CURSOR_PARAM in request.GET
+
+
+def _to_json_value(value: Any) -> Any:
+    """Приводит значение ключа сортировки к виду, пригодному для JSON."""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def approximate_count(queryset: QuerySet, limit: int) -> Tuple[int, bool]:
+    """
+    Возвращает приблизительное кол-во элементов выборки.
+    Подсчет ограничен limit элементами; для PostgreSQL при превышении
+    предела используется оценка планировщика.
+    :param queryset: выборка
+    :param limit: предел точного подсчета
+    :return: кортеж (кол-во, является ли кол-во точным)
+    """
+    queryset = queryset.order_by()
+    count = queryset[:limit + 1].count()
+    if count <= limit:
+        return count, True
+
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return max(int(plan[0]['Plan']['Plan Rows']), limit), False
+
+    return limit, False
+
+
+class CachedPagePaginator(Paginator):
+    """
+    Постраничный вывод уже выбранной страницы с заранее известным общим кол-вом элементов.
+    Используется для страниц каталога, восстановленных из кеша.
+    """
+
+    def __init__(self, page_objects: List, per_page: int, count: int, **kwargs):
+        super().__init__(page_objects, per_page, **kwargs)
+        self.__dict__['count'] = count
+
+    def page(self, number):
+        number = self.validate_number(number)
+        return self._get_page(self.object_list, number, self)
+
+
+class CursorPage:
+    """Страница выборки, полученная по курсору."""
+    is_cursor = True
+
+    def __init__(self, object_list: List, paginator: 'CursorPaginator', number: int,
+                 next_cursor: Optional[str], previous_cursor: Optional[str]):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.number = number
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+    def has_other_pages(self) -> bool:
+        return self.has_next() or self.has_previous()
+
+    def next_page_number(self) -> int:
+        return self.number + 1
+
+    def previous_page_number(self) -> int:
+        return self.number - 1
+
+
+class CursorPaginator:
+    """
+    Постраничный вывод по ключу сортировки и id вместо OFFSET.
+    Выборка упорядочивается по (sort_field, id); значения NULL идут в конце.
+    """
+
+    def __init__(self, queryset: QuerySet, per_page: int, sort_field: Optional[str] = None,
+                 approximate_total: bool = True, count_limit: int = 1000):
+        """
+        :param queryset: выборка
+        :param per_page: кол-во элементов на странице
+        :param sort_field: поле сортировки, например '-catalog_entry__avg_price'
+        :param approximate_total: подсчитывать приблизительное кол-во вместо точного
+        :param count_limit: предел точного подсчета для приблизительного кол-ва
+        """
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.sort_field = sort_field or ''
+        self.approximate_total = approximate_total
+        self.count_limit = count_limit
+
+        self.descending = self.sort_field.startswith('-')
+        self.field = self.sort_field.lstrip('-') or None
+
+    @cached_property
+    def total(self) -> Tuple[int, bool]:
+        """Кол-во элементов выборки и признак точного значения."""
+        if self.approximate_total:
+            return approximate_count(self.queryset, self.count_limit)
+        return self.queryset.count(), True
+
+    @property
+    def count(self) -> int:
+        return self.total[0]
+
+    def _ordering(self, backward: bool) -> list:
+        """Возвращает сортировку выборки для прямого или обратного прохода."""
+        if self.field is None:
+            return ['-id' if backward else 'id']
+        descending = self.descending != backward
+        expression = F(self.field).desc(nulls_last=not backward, nulls_first=backward) if descending else \
+            F(self.field).asc(nulls_last=not backward, nulls_first=backward)
+        return [expression, '-id' if backward else 'id']
+
+    def _after(self, value: Any, pk: int) -> Q:
+        """Условие для элементов, следующих за ключом (value, pk)."""
+        if self.field is None:
+            return Q(id__gt=pk)
+        if value is None:
+            return Q(**{f'{self.field}__isnull': True, 'id__gt': pk})
+        lookup = 'lt' if self.descending else 'gt'
+        return Q(**{f'{self.field}__{lookup}': value}) | \
+            Q(**{self.field: value, 'id__gt': pk}) | \
+            Q(**{f'{self.field}__isnull': True})
+
+    def _before(self, value: Any, pk: int) -> Q:
+        """Условие для элементов, предшествующих ключу (value, pk)."""
+        if self.field is None:
+            return Q(id__lt=pk)
+        if value is None:
+            return Q(**{f'{self.field}__isnull': False}) | Q(**{f'{self.field}__isnull': True, 'id__lt': pk})
+        lookup = 'gt' if self.descending else 'lt'
+        return Q(**{f'{self.field}__{lookup}': value}) | Q(**{self.field: value, 'id__lt': pk})
+
+    def _clean_key(self, payload: dict) -> bool:
+        """
+        Приводит значение ключа сортировки курсора к типу поля сортировки.
+        :param payload: состояние курсора, значение ключа заменяется приведенным
+        :return: можно ли использовать ключ курсора
+        """
+        value = payload['k'][0]
+        if self.field is None or value is None:
+            return True
+        output_field = F(self.field).resolve_expression(self.queryset.all().query).output_field
+        try:
+            value = output_field.to_python(value)
+            output_field.run_validators(value)
+        except (ValidationError, TypeError, ValueError):
+            return False
+        payload['k'][0] = value
+        return True
+
+    def _key(self, obj) -> list:
+        """Ключ курсора для элемента выборки."""
+        value = getattr(obj, '_cursor_value', None) if self.field else None
+        return [_to_json_value(value), obj.pk]
+
+    def _cursor(self, obj, direction: str, number: int) -> str:
+        return encode_cursor({'k': self._key(obj), 'd': direction, 'n': number, 's': self.sort_field})
+
+    def page(self, token: Optional[str] = None) -> CursorPage:
+        """
+        Возвращает страницу выборки для переданного курсора.
+        :param token: строка курсора из query-string
+        :return: страница
+        """
+        payload = decode_cursor(token)
+        if payload is not None and (payload['s'] != self.sort_field or not self._clean_key(payload)):
+            payload = None
+
+        backward = payload is not None and payload['d'] == 'p'
+        number = payload['n'] if payload else 1
+
+        queryset = self.queryset
+        if self.field:
+            queryset = queryset.annotate(_cursor_value=F(self.field))
+        if payload is not None:
+            value, pk = payload['k']
+            queryset = queryset.filter(self._before(value, pk) if backward else self._after(value, pk))
+
+        items = list(queryset.order_by(*self._ordering(backward))[:self.per_page + 1])
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if backward:
+            items.reverse()
+
+        next_cursor = previous_cursor = None
+        if items:
+            if has_more or backward:
+                next_cursor = self._cursor(items[-1], 'n', number + 1)
+            if (has_more and backward) or (payload is not None and not backward):
+                previous_cursor = self._cursor(items[0], 'p', number - 1)
+        if number <= 1:
+            previous_cursor = None
+
+        return CursorPage(items, self, number, next_cursor, previous_cursor)
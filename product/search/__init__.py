@@ -0,0 +1,33 @@
+# Полнотекстовый поиск товаров
+from functools import lru_cache
+from typing import List, Tuple
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from product.search.backends import BaseSearchBackend
+
+
+@lru_cache(maxsize=None)
+def get_search_backend() -> BaseSearchBackend:
+    """Возвращает хранилище поискового индекса, заданное в настройке PRODUCT_SEARCH_BACKEND."""
+    return import_string(settings.PRODUCT_SEARCH_BACKEND)()
+
+
+def search_products(query: str) -> List[int]:
+    """
+    Возвращает id товаров, найденных по запросу, в порядке убывания релевантности.
+    :param query: текст запроса
+    :return: список id товаров
+    """
+    return [product_id for product_id, _ in get_search_backend().search(query)]
+
+
+def suggest_products(prefix: str, limit: int = None) -> List[Tuple[int, str]]:
+    """
+    Возвращает товары для автодополнения строки поиска.
+    :param prefix: начало запроса
+    :param limit: максимальное кол-во товаров, по умолчанию PRODUCT_SEARCH_SUGGEST_LIMIT
+    :return: список (id товара, наименование)
+    """
+    return get_search_backend().suggest(prefix, limit or settings.PRODUCT_SEARCH_SUGGEST_LIMIT)
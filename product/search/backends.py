@@ -0,0 +1,201 @@
+# Хранилища поискового индекса товаров
+import threading
+from collections import defaultdict
+from typing import Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from product.models import Product, ProductProperty
+from product.search.index import InvertedIndex
+
+SEARCH_VERSION_KEY = 'search:version'
+# Префикс ключей журнала изменений индекса по версиям
+SEARCH_CHANGES_KEY = 'search:changes'
+
+# Веса полей товара при ранжировании
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'properties': 1.5,
+    'description': 1.0,
+}
+
+
+class BaseSearchBackend:
+    """Интерфейс хранилища поискового индекса товаров."""
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Ищет товары по запросу.
+        :param query: текст запроса
+        :param limit: максимальное кол-во товаров
+        :return: список (id товара, оценка), упорядоченный по убыванию оценки
+        """
+        raise NotImplementedError
+
+    def suggest(self, prefix: str, limit: int) -> List[Tuple[int, str]]:
+        """
+        Возвращает товары для автодополнения строки поиска.
+        :param prefix: начало запроса
+        :param limit: максимальное кол-во товаров
+        :return: список (id товара, наименование)
+        """
+        raise NotImplementedError
+
+    def index_products(self, product_ids: Iterable[int]) -> None:
+        """Добавляет в индекс или обновляет товары."""
+        raise NotImplementedError
+
+    def remove_products(self, product_ids: Iterable[int]) -> None:
+        """Удаляет товары из индекса."""
+        raise NotImplementedError
+
+    def rebuild(self) -> None:
+        """Полностью перестраивает индекс."""
+        raise NotImplementedError
+
+
+def load_documents(product_ids: Optional[List[int]] = None) -> List[Tuple[int, dict, str]]:
+    """
+    Загружает из БД документы поискового индекса: наименование, описание и значения свойств товаров.
+    :param product_ids: id товаров, если не заданы - все товары
+    :return: список (id товара, поля документа, наименование)
+    """
+    products = Product.objects.order_by()
+    properties = ProductProperty.objects.order_by()
+    if product_ids is not None:
+        products = products.filter(id__in=product_ids)
+        properties = properties.filter(product_id__in=product_ids)
+
+    values = defaultdict(list)
+    for product_id, value in properties.values_list('product_id', 'value').iterator(
+            chunk_size=settings.PRODUCT_SEARCH_CHUNK_SIZE):
+        values[product_id].append(value)
+
+    return [(pk, {'name': name, 'description': description, 'properties': ' '.join(values[pk])}, name)
+            for pk, name, description in products.values_list('id', 'name', 'description').iterator(
+                chunk_size=settings.PRODUCT_SEARCH_CHUNK_SIZE)]
+
+
+class InMemorySearchBackend(BaseSearchBackend):
+    """
+    Поисковый индекс в памяти процесса.
+    Индекс строится при первом запросе и обновляется по сигналам моделей.
+    Каждое изменение увеличивает версию индекса в кеше и записывает id измененных товаров
+    в журнал изменений этой версии; другие процессы сверяют версию одним обращением к кешу
+    и применяют пропущенные изменения из журнала. Индекс перестраивается целиком, только если
+    журнал пропущенных версий недоступен.
+    """
+
+    def __init__(self):
+        self.index = InvertedIndex(FIELD_WEIGHTS)
+        self._lock = threading.RLock()
+        self._built = False
+        self._version = None
+
+    @staticmethod
+    def _changes_key(version: int) -> str:
+        return f'{SEARCH_CHANGES_KEY}:{version}'
+
+    @staticmethod
+    def _bump_version(product_ids: Optional[List[int]]) -> Optional[int]:
+        """
+        Увеличивает версию индекса и записывает id измененных товаров в журнал изменений.
+        :param product_ids: id измененных товаров; None - журнал не пишется и другие процессы перестроят индекс
+        :return: новая версия или None, если кеш не хранит значения
+        """
+        cache.add(SEARCH_VERSION_KEY, 0, None)
+        try:
+            version = cache.incr(SEARCH_VERSION_KEY)
+        except ValueError:
+            return None
+        if product_ids is not None:
+            cache.set(InMemorySearchBackend._changes_key(version), product_ids, settings.PRODUCT_SEARCH_CHANGES_TTL)
+        return version
+
+    def _missed_changes(self, version: int) -> Optional[set]:
+        """
+        Возвращает id товаров, измененных после версии индекса текущего процесса.
+        :param version: текущая версия индекса в кеше
+        :return: id товаров или None, если журнал пропущенных версий недоступен
+        """
+        if not self._built or not isinstance(version, int) or not isinstance(self._version, int) \
+                or not 0 < version - self._version <= settings.PRODUCT_SEARCH_MAX_CHANGES:
+            return None
+        keys = [self._changes_key(missed) for missed in range(self._version + 1, version + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return None
+        return {product_id for product_ids in changes.values() for product_id in product_ids}
+
+    def _ensure_fresh(self) -> None:
+        """Применяет изменения, сделанные в других процессах, или строит индекс, если он не построен."""
+        version = cache.get(SEARCH_VERSION_KEY)
+        if self._built and version == self._version:
+            return
+        with self._lock:
+            if self._built and version == self._version:
+                return
+            missed = self._missed_changes(version)
+            if missed is None:
+                self.index.clear()
+                self.index.update(load_documents())
+                self._built = True
+            else:
+                self._reindex(self.index, list(missed))
+            self._version = version
+
+    @staticmethod
+    def _reindex(index: InvertedIndex, product_ids: List[int]) -> None:
+        """Обновляет в индексе товары из БД, отсутствующие в БД товары удаляются из индекса."""
+        documents = load_documents(product_ids)
+        found = {doc_id for doc_id, _, _ in documents}
+        for product_id in product_ids:
+            if product_id not in found:
+                index.remove(product_id)
+        index.update(documents)
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Tuple[int, float]]:
+        self._ensure_fresh()
+        with self._lock:
+            return self.index.search(query, limit=limit)
+
+    def suggest(self, prefix: str, limit: int) -> List[Tuple[int, str]]:
+        self._ensure_fresh()
+        with self._lock:
+            return [(doc_id, self.index.title(doc_id)) for doc_id, _ in self.index.search(prefix, limit=limit)]
+
+    def _apply(self, product_ids: List[int], remove: bool = False) -> None:
+        """
+        Применяет изменения товаров к индексу текущего процесса и сообщает о них другим процессам.
+        Если индекс в процессе еще не построен, он будет построен при первом поиске.
+        :param product_ids: id измененных товаров
+        :param remove: удалить товары из индекса, а не обновить из БД
+        """
+        version = self._bump_version(product_ids)
+        with self._lock:
+            if not self._built:
+                return
+            if version is not None and version != (self._version or 0) + 1:
+                # есть изменения других процессов: применяются вместе с этим изменением из журнала
+                self._ensure_fresh()
+                return
+            if remove:
+                for product_id in product_ids:
+                    self.index.remove(product_id)
+            else:
+                self._reindex(self.index, product_ids)
+            self._version = version
+
+    def index_products(self, product_ids: Iterable[int]) -> None:
+        self._apply(list(product_ids))
+
+    def remove_products(self, product_ids: Iterable[int]) -> None:
+        # другие процессы обновляют товары из БД, где их уже нет, и тоже удаляют их из индекса
+        self._apply(list(product_ids), remove=True)
+
+    def rebuild(self) -> None:
+        with self._lock:
+            self._bump_version(None)
+            self._built = False
+            self._ensure_fresh()
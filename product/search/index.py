@@ -0,0 +1,163 @@
+# Инвертированный индекс для полнотекстового поиска товаров
+import bisect
+import math
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from product.search.stemmers import stem, tokenize
+
+# Параметры ранжирования BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+class InvertedIndex:
+    """
+    Инвертированный индекс: основа слова -> {id документа: взвешенная частота}.
+    Поля документа индексируются с весами, документы ранжируются по BM25.
+    Последнее слово запроса ищется по префиксу, что позволяет использовать индекс для автодополнения.
+    Индекс не потокобезопасен, синхронизацию обеспечивает вызывающий код.
+    """
+
+    def __init__(self, field_weights: Dict[str, float]):
+        """
+        :param field_weights: веса полей документа, например {'name': 3, 'description': 1}
+        """
+        self.field_weights = field_weights
+        self._postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self._documents: Dict[int, Dict[str, float]] = {}
+        self._lengths: Dict[int, float] = {}
+        self._titles: Dict[int, str] = {}
+        self._total_length = 0.0
+        self._sorted_terms: Optional[List[str]] = None
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def __contains__(self, doc_id: int) -> bool:
+        return doc_id in self._documents
+
+    def clear(self) -> None:
+        """Удаляет все документы из индекса."""
+        self._postings.clear()
+        self._documents.clear()
+        self._lengths.clear()
+        self._titles.clear()
+        self._total_length = 0.0
+        self._sorted_terms = None
+
+    def add(self, doc_id: int, fields: Dict[str, str], title: str = '') -> None:
+        """
+        Добавляет документ в индекс, ранее проиндексированный документ заменяется.
+        :param doc_id: id документа
+        :param fields: текст полей документа
+        :param title: заголовок документа для автодополнения
+        """
+        self.remove(doc_id)
+
+        frequencies: Dict[str, float] = defaultdict(float)
+        for field, text in fields.items():
+            weight = self.field_weights.get(field, 1.0)
+            for word in tokenize(text):
+                frequencies[stem(word)] += weight
+
+        for term, frequency in frequencies.items():
+            if term not in self._postings:
+                self._sorted_terms = None
+            self._postings[term][doc_id] = frequency
+
+        length = sum(frequencies.values())
+        self._documents[doc_id] = dict(frequencies)
+        self._lengths[doc_id] = length
+        self._titles[doc_id] = title
+        self._total_length += length
+
+    def remove(self, doc_id: int) -> None:
+        """
+        Удаляет документ из индекса.
+        :param doc_id: id документа
+        """
+        terms = self._documents.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+                self._sorted_terms = None
+        self._total_length -= self._lengths.pop(doc_id)
+        self._titles.pop(doc_id, None)
+
+    def title(self, doc_id: int) -> str:
+        """Возвращает заголовок документа."""
+        return self._titles.get(doc_id, '')
+
+    def _prefix_terms(self, prefix: str) -> List[str]:
+        """Возвращает основы слов индекса, начинающиеся с префикса."""
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self._postings)
+        terms = []
+        position = bisect.bisect_left(self._sorted_terms, prefix)
+        while position < len(self._sorted_terms) and self._sorted_terms[position].startswith(prefix):
+            terms.append(self._sorted_terms[position])
+            position += 1
+        return terms
+
+    def _expand(self, word: str, prefix: bool) -> Set[str]:
+        """Возвращает основы слов индекса, соответствующие слову запроса."""
+        term = stem(word)
+        terms = {term} if term in self._postings else set()
+        if prefix:
+            terms.update(self._prefix_terms(word))
+        return terms
+
+    def _score_term(self, term: str) -> Dict[int, float]:
+        """Вклад основы слова в оценку BM25 каждого документа, содержащего эту основу."""
+        postings = self._postings[term]
+        count = len(self._documents)
+        idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+        average_length = self._total_length / count if count else 0.0
+        scores = {}
+        for doc_id, frequency in postings.items():
+            norm = 1 - BM25_B + BM25_B * (self._lengths[doc_id] / average_length if average_length else 0.0)
+            scores[doc_id] = idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * norm)
+        return scores
+
+    def search(self, query: str, prefix: bool = True, limit: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Ищет документы, содержащие все слова запроса.
+        :param query: текст запроса
+        :param prefix: искать последнее слово запроса по префиксу
+        :param limit: максимальное кол-во документов
+        :return: список (id документа, оценка), упорядоченный по убыванию оценки
+        """
+        words = tokenize(query)
+        if not words:
+            return []
+
+        scores: Optional[Dict[int, float]] = None
+        for i, word in enumerate(words):
+            word_scores: Dict[int, float] = {}
+            for term in self._expand(word, prefix and i == len(words) - 1):
+                for doc_id, score in self._score_term(term).items():
+                    if score > word_scores.get(doc_id, 0.0):
+                        word_scores[doc_id] = score
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = {doc_id: score + word_scores[doc_id] for doc_id, score in scores.items()
+                          if doc_id in word_scores}
+            if not scores:
+                return []
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit] if limit is not None else ranked
+
+    def update(self, documents: Iterable[Tuple[int, Dict[str, str], str]]) -> None:
+        """
+        Добавляет или заменяет несколько документов.
+        :param documents: кортежи (id документа, поля документа, заголовок)
+        """
+        for doc_id, fields, title in documents:
+            self.add(doc_id, fields, title)
@@ -0,0 +1,190 @@
+# Разбиение текста на слова и выделение основ слов для русского и английского языков
+import re
+from typing import List, Optional, Tuple
+
+TOKEN_RE = re.compile(r'[0-9a-zа-я]+')
+CYRILLIC_RE = re.compile(r'[а-я]')
+LATIN_RE = re.compile(r'[a-z]')
+
+RU_VOWELS = 'аеиоуыэюя'
+
+# Окончания алгоритма Портера (Snowball) для русского языка.
+# Окончания первой группы должны следовать за буквой «а» или «я»
+RU_PERFECTIVE_GERUND = (('вшись', 'вши', 'в'), ('ившись', 'ывшись', 'ивши', 'ывши', 'ив', 'ыв'))
+RU_REFLEXIVE = ((), ('ся', 'сь'))
+RU_ADJECTIVE = ((), ('ими', 'ыми', 'его', 'ого', 'ему', 'ому', 'ее', 'ие', 'ые', 'ое', 'ей', 'ий', 'ый', 'ой',
+                     'ем', 'им', 'ым', 'ом', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею'))
+RU_PARTICIPLE = (('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+RU_VERB = (('ете', 'йте', 'ешь', 'нно', 'ла', 'на', 'ли', 'ем', 'ло', 'но', 'ет', 'ют', 'ны', 'ть', 'й', 'л', 'н'),
+           ('уйте', 'ейте', 'ила', 'ыла', 'ена', 'ите', 'или', 'ыли', 'ило', 'ыло', 'ено', 'ует', 'уют', 'ены',
+            'ить', 'ыть', 'ишь', 'ей', 'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ят', 'ит', 'ыт', 'ую', 'ю'))
+RU_NOUN = ((), ('иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях', 'ев', 'ов', 'ие', 'ье', 'еи', 'ии', 'ей', 'ой',
+                'ий', 'ям', 'ем', 'ам', 'ом', 'ах', 'ях', 'ию', 'ью', 'ия', 'ья', 'а', 'е', 'и', 'й', 'о', 'у',
+                'ы', 'ь', 'ю', 'я'))
+RU_SUPERLATIVE = ((), ('ейше', 'ейш'))
+RU_DERIVATIONAL = ((), ('ость', 'ост'))
+
+EN_VOWELS = 'aeiouy'
+
+# Суффиксы английских слов и их замены, проверяются по порядку
+EN_SUFFIXES = (
+    ('ational', 'ate'), ('tional', 'tion'), ('ization', 'ize'), ('iveness', 'ive'), ('fulness', 'ful'),
+    ('ousness', 'ous'), ('ation', 'ate'), ('alism', 'al'), ('aliti', 'al'), ('iviti', 'ive'), ('biliti', 'ble'),
+    ('ement', ''), ('ment', ''), ('ness', ''), ('able', ''), ('ible', ''), ('ance', ''), ('ence', ''),
+    ('ator', 'ate'), ('ful', ''), ('ous', ''), ('ive', ''), ('ize', ''), ('ism', ''), ('ion', ''),
+)
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """
+    Разбивает текст на слова в нижнем регистре, буква «ё» заменяется на «е».
+    :param text: текст
+    :return: список слов
+    """
+    if not text:
+        return []
+    return TOKEN_RE.findall(text.lower().replace('ё', 'е'))
+
+
+def _strip_ending(word: str, groups: Tuple[tuple, tuple]) -> Optional[str]:
+    """
+    Удаляет самое длинное из окончаний группы.
+    Окончания первой группы удаляются только после буквы «а» или «я».
+    :return: слово без окончания или None, если окончание не найдено
+    """
+    candidates = [(ending, True) for ending in groups[0]] + [(ending, False) for ending in groups[1]]
+    for ending, after_a in sorted(candidates, key=lambda item: -len(item[0])):
+        if not word.endswith(ending):
+            continue
+        stem = word[:-len(ending)]
+        if after_a and not stem.endswith(('а', 'я')):
+            continue
+        return stem
+    return None
+
+
+def _ru_region(word: str, start: int = 0) -> int:
+    """Возвращает начало области слова после первого сочетания гласной и согласной начиная с позиции start."""
+    for i in range(start + 1, len(word)):
+        if word[i] not in RU_VOWELS and word[i - 1] in RU_VOWELS:
+            return i + 1
+    return len(word)
+
+
+def stem_russian(word: str) -> str:
+    """
+    Выделяет основу русского слова по алгоритму Портера (Snowball).
+    :param word: слово в нижнем регистре
+    :return: основа слова
+    """
+    rv_start = next((i + 1 for i, char in enumerate(word) if char in RU_VOWELS), len(word))
+    prefix, rv = word[:rv_start], word[rv_start:]
+    r2_start = max(_ru_region(word, _ru_region(word)) - rv_start, 0)
+
+    stem = _strip_ending(rv, RU_PERFECTIVE_GERUND)
+    if stem is None:
+        rv = _strip_ending(rv, RU_REFLEXIVE) or rv
+        stem = _strip_ending(rv, RU_ADJECTIVE)
+        if stem is not None:
+            stem = _strip_ending(stem, RU_PARTICIPLE) or stem
+        else:
+            stem = _strip_ending(rv, RU_VERB)
+            if stem is None:
+                stem = _strip_ending(rv, RU_NOUN)
+    rv = rv if stem is None else stem
+
+    if rv.endswith('и'):
+        rv = rv[:-1]
+
+    stem = _strip_ending(rv, RU_DERIVATIONAL)
+    if stem is not None and len(stem) >= r2_start:
+        rv = stem
+
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    else:
+        stem = _strip_ending(rv, RU_SUPERLATIVE)
+        if stem is not None:
+            rv = stem[:-1] if stem.endswith('нн') else stem
+        elif rv.endswith('ь'):
+            rv = rv[:-1]
+
+    return prefix + rv
+
+
+def _has_en_vowel(word: str) -> bool:
+    return any(char in EN_VOWELS for char in word)
+
+
+def _strip_inflection(word: str) -> str:
+    """Удаляет окончания множественного числа и форм -ed/-ing английского слова."""
+    if word.endswith('sses'):
+        word = word[:-2]
+    elif word.endswith('ies'):
+        word = word[:-3] + 'i'
+    elif word.endswith('s') and not word.endswith(('ss', 'us')):
+        word = word[:-1]
+
+    if word.endswith('eed'):
+        return word[:-1] if len(word) > 4 else word
+
+    for ending in ('ing', 'ed'):
+        if word.endswith(ending) and _has_en_vowel(word[:-len(ending)]):
+            word = word[:-len(ending)]
+            if word.endswith(('at', 'bl', 'iz')):
+                return word + 'e'
+            if len(word) > 2 and word[-1] == word[-2] and word[-1] not in 'lsz':
+                return word[:-1]
+            return word
+    return word
+
+
+def stem_english(word: str) -> str:
+    """
+    Выделяет основу английского слова: упрощенный алгоритм Портера
+    (множественное число, формы -ed/-ing, -y и распространенные суффиксы).
+    :param word: слово в нижнем регистре
+    :return: основа слова
+    """
+    if len(word) <= 3:
+        return word
+
+    word = _strip_inflection(word)
+
+    if word.endswith('y') and _has_en_vowel(word[:-1]):
+        word = word[:-1] + 'i'
+
+    for suffix, replacement in EN_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)] + replacement
+            break
+
+    if word.endswith('e') and len(word) > 4:
+        word = word[:-1]
+
+    return word
+
+
+def stem(word: str) -> str:
+    """
+    Выделяет основу слова, язык определяется по алфавиту.
+    Слова из цифр и смешанные слова не изменяются.
+    :param word: слово в нижнем регистре
+    :return: основа слова
+    """
+    has_cyrillic = CYRILLIC_RE.search(word) is not None
+    has_latin = LATIN_RE.search(word) is not None
+    if has_cyrillic and not has_latin:
+        return stem_russian(word)
+    if has_latin and not has_cyrillic and not any(char.isdigit() for char in word):
+        return stem_english(word)
+    return word
+
+
+def analyze(text: Optional[str]) -> List[str]:
+    """
+    Возвращает основы слов текста.
+    :param text: текст
+    :return: список основ слов
+    """
+    return [stem(word) for word in tokenize(text)]
@@ -0,0 +1,87 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from orders.models import OrderItem
+from product.catalog import refresh_catalog_products
+from product.catalog_cache import invalidate_catalog_cache
+from product.models import Banner, Category, Feedback, Offer, Product, ProductProperty
+from product.search import get_search_backend
+from shop.cache import invalidate_tags_on_commit
+
+
+def update_catalog(product_ids) -> None:
+    """
+    Пересчитывает проекцию каталога и после фиксации транзакции
+    сбрасывает кеш страниц каталога.
+    """
+    product_ids = list(product_ids)
+    refresh_catalog_products(product_ids)
+    transaction.on_commit(lambda: invalidate_catalog_cache(product_ids))
+
+
+def update_search_index(product_ids) -> None:
+    """Обновляет поисковый индекс продуктов после фиксации транзакции."""
+    product_ids = list(product_ids)
+    transaction.on_commit(lambda: get_search_backend().index_products(product_ids))
+
+
+@receiver(post_save, sender=Product)
+def update_catalog_on_product_save(sender, instance, **kwargs):
+    """Обновляет запись каталога и поисковый индекс при сохранении продукта."""
+    update_catalog([instance.pk])
+    update_search_index([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def update_search_index_on_product_delete(sender, instance, **kwargs):
+    """Удаляет продукт из поискового индекса."""
+    product_id = instance.pk
+    transaction.on_commit(lambda: get_search_backend().remove_products([product_id]))
+
+
+@receiver([post_save, post_delete], sender=ProductProperty)
+def update_search_index_on_property_change(sender, instance, **kwargs):
+    """Обновляет поисковый индекс при изменении значения свойства продукта."""
+    update_search_index([instance.product_id])
+
+
+@receiver([post_save, post_delete], sender=Offer)
+def update_catalog_on_offer_change(sender, instance, **kwargs):
+    """Обновляет запись каталога при изменении предложения."""
+    update_catalog([instance.product_id])
+
+
+@receiver([post_save, post_delete], sender=Feedback)
+def update_catalog_on_feedback_change(sender, instance, **kwargs):
+    """Обновляет рейтинг продукта в каталоге при изменении отзыва."""
+    if instance.offer_id:
+        product_id = Offer.objects.filter(id=instance.offer_id).values_list('product_id', flat=True).first()
+        update_catalog([product_id])
+
+
+@receiver([post_save, post_delete], sender=OrderItem)
+def update_catalog_on_order_item_change(sender, instance, **kwargs):
+    """Обновляет кол-во продаж продукта в каталоге при изменении заказа."""
+    product_id = Offer.objects.filter(id=instance.offer_id).values_list('product_id', flat=True).first()
+    update_catalog([product_id])
+
+
+@receiver(post_save, sender=Category)
+def update_catalog_on_category_save(sender, instance, created, **kwargs):
+    """Обновляет пути категорий в каталоге при перемещении категории в дереве."""
+    if created:
+        return
+    product_ids = Product.objects.filter(
+        category__in=instance.get_descendants(include_self=True)
+    ).values_list('id', flat=True)
+    update_catalog(product_ids)
+
+
+@receiver([post_save, post_delete], sender=Banner)
+@receiver([post_save, post_delete], sender=Offer)
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_cache_on_change(sender, instance, **kwargs):
+    """Сбрасывает записи кеша с тегом измененного объекта ('category:3') и всех объектов модели."""
+    invalidate_tags_on_commit([f'{sender._meta.model_name}:{instance.pk}'])
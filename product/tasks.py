@@ -0,0 +1,34 @@
+from celery import shared_task
+from django.conf import settings
+
+from product.home_blocks import refresh_home_block, release_lock
+from product.import_jobs import ImportJobBusy, run_import_job
+from product.inventory import release_expired_reservations
+
+
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True, max_retries=None)
+def import_product_file(self, job_id):
+    """
+    Импорт файла товаров. Задача подтверждается после выполнения, поэтому при падении
+    воркера она будет выполнена повторно и продолжит импорт с контрольной точки.
+    Если задание еще выполняет другой воркер, задача повторяется, когда его контрольная точка устареет.
+    """
+    try:
+        return run_import_job(job_id).status
+    except ImportJobBusy as ex:
+        raise self.retry(exc=ex, countdown=settings.IMPORT_JOB_HEARTBEAT_TIMEOUT)
+
+
+@shared_task
+def release_stock_reservations():
+    """Снимает истекшие резервы товаров, возвращая их в доступный остаток."""
+    return release_expired_reservations()
+
+
+@shared_task
+def refresh_home_block_task(name):
+    """Пересчитывает устаревший блок главной страницы и снимает блокировку пересчета."""
+    try:
+        refresh_home_block(name)
+    finally:
+        release_lock(name)
@@ -19,3 +19,25 @@ def add_query_params(request: HttpRequest, **kwargs) -> str:
         new_query[key] = value
 
     return new_query.urlencode()
+
+
+@register.simple_tag
+def page_link(request: HttpRequest, page_obj, direction: str = 'next') -> str:
+    """
+    Возвращает query часть URI соседней страницы.
+    Для постраничного вывода по курсору подставляет курсор вместо номера страницы.
+    :param request: объект HttpRequest
+    :param page_obj: текущая страница
+    :param direction: 'next' или 'previous'
+    :return: query часть URI
+
+    Usage: {% page_link request page_obj 'next' %}
+    """
+    new_query = request.GET.copy()
+    if getattr(page_obj, 'is_cursor', False):
+        new_query.pop('page', None)
+        new_query['cursor'] = page_obj.next_cursor if direction == 'next' else page_obj.previous_cursor
+    else:
+        new_query['page'] = page_obj.next_page_number() if direction == 'next' else page_obj.previous_page_number()
+
+    return new_query.urlencode()
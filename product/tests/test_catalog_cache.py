@@ -0,0 +1,80 @@
+from django.core.cache import cache
+from django.db import connection
+from django.http import QueryDict
+from django.test import TestCase, tag, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from product.catalog import refresh_catalog_products
+from product.catalog_cache import canonical_params, catalog_cache_key
+from product.models import Offer, Product
+from .test_product_catalog import create_category, create_sellers, create_products, create_offers
+
+LOCAL_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalog-cache-test',
+    }
+}
+
+
+@tag("catalog")
+@override_settings(CACHES=LOCAL_CACHES, CATALOG_CACHE_MAX_ENTRIES=3)
+class CatalogCacheTest(TestCase):
+    """ Тесты кеширования страниц каталога. """
+    @classmethod
+    def setUpTestData(cls):
+        cls.url = '/product/catalog/'
+        create_category()
+        create_sellers()
+        create_products()
+        create_offers()
+        refresh_catalog_products()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_canonical_params(self):
+        """Тест, что порядок и написание параметров не влияют на ключ кеша."""
+        first = canonical_params(QueryDict('sort=dprice&category=02&title=%20Product%20&stock=on&utm=1'))
+        second = canonical_params(QueryDict('stock=on&title=product&category=2&sort=dprice&deliv=off'))
+        self.assertEqual(first, second)
+        self.assertEqual(catalog_cache_key(first, 1), catalog_cache_key(second, 1))
+        self.assertNotEqual(catalog_cache_key(first, 1), catalog_cache_key(first, 2))
+
+    def test_cached_page_served_without_catalog_queries(self):
+        """Тест, что повторный запрос страницы не выполняет запрос каталога."""
+        response = self.client.get(self.url + '?sort=dprice')
+        expected = [item.id for item in response.context['catalog']]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url + '?sort=dprice&utm_source=bot')
+        sql = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('ORDER BY "product_catalogproduct"', sql)
+        self.assertEqual([item.id for item in response.context['catalog']], expected)
+        self.assertTrue(response.context['page_obj'].has_next())
+        self.assertEqual(response.context['paginator'].count, Product.objects.count())
+
+    def test_offer_change_invalidates_cache(self):
+        """Тест, что изменение предложения сбрасывает сохраненные страницы."""
+        response = self.client.get(self.url + '?sort=dprice')
+        first = response.context['catalog'][0]
+
+        offer = Offer.objects.filter(product__catalog_entry__avg_price__isnull=False).\
+            order_by('price').first()
+        offer.price = 100000
+        with self.captureOnCommitCallbacks(execute=True):
+            offer.save()
+
+        response = self.client.get(self.url + '?sort=dprice')
+        self.assertEqual(response.context['catalog'][0].id, offer.product_id)
+        self.assertNotEqual(first.id, offer.product_id)
+
+    def test_cache_size_is_bounded(self):
+        """Тест ограничения кол-ва сохраненных страниц."""
+        for sort in ('aprice', 'dprice', 'arate', 'drate'):
+            self.client.get(self.url + f'?sort={sort}')
+        first_key = catalog_cache_key(canonical_params(QueryDict('sort=aprice')), 1)
+        last_key = catalog_cache_key(canonical_params(QueryDict('sort=drate')), 1)
+        self.assertIsNone(cache.get(first_key))
+        self.assertIsNotNone(cache.get(last_key))
@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase, tag, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from product.catalog import refresh_catalog_products
+from product.facets import compute_facets
+from product.models import Category, Product
+from shop.models import Seller
+from .test_product_catalog import create_category, create_sellers, create_products, create_offers
+
+
+@tag("catalog")
+@override_settings(CACHES=settings.TEST_CACHES, CATALOG_PRICE_BUCKETS=[0, 1050, 1150])
+class CatalogFacetsTest(TestCase):
+    """ Тесты подсчета кол-ва товаров для фильтров каталога. """
+    @classmethod
+    def setUpTestData(cls):
+        cls.url = '/product/catalog/'
+        create_category()
+        create_sellers()
+        create_products()
+        create_offers()
+        refresh_catalog_products()
+
+    def test_facets_in_fixed_queries(self):
+        """Тест, что все фасеты вычисляются двумя запросами независимо от кол-ва продавцов."""
+        category = Category.objects.get(name='Components')
+        with CaptureQueriesContext(connection) as queries:
+            compute_facets({'category': str(category.id), 'seller': 'Shop1', 'stock': 'on'})
+        aggregates = [query['sql'] for query in queries.captured_queries if 'COUNT(' in query['sql']]
+        self.assertEqual(len(aggregates), 2)
+
+    def test_facets_for_category(self):
+        """Тест кол-ва товаров по продавцам, наличию и доставке в категории."""
+        category = Category.objects.get(name='Components')
+        facets = compute_facets({'category': str(category.id)})
+        products = Product.objects.filter(category__parent=category)
+
+        self.assertEqual(facets['total'], products.count())
+        sellers = {item['name']: item['count'] for item in facets['sellers']}
+        for seller in Seller.objects.all():
+            with self.subTest(seller=seller.name):
+                expected = products.filter(offers__seller=seller).distinct().count()
+                self.assertEqual(sellers[seller.name], expected)
+        self.assertEqual(facets['stock'], products.filter(offers__is_present=True).distinct().count())
+        self.assertEqual(facets['deliv'], products.filter(offers__is_free_delivery=True).distinct().count())
+
+    def test_facet_ignores_own_filter(self):
+        """Тест, что кол-во по продавцам не зависит от выбранного продавца, но учитывает другие фильтры."""
+        facets = compute_facets({'seller': 'Shop2'})
+        self.assertEqual(facets['total'], 3)
+        sellers = {item['name']: item['count'] for item in facets['sellers']}
+        self.assertEqual(sellers['Shop1'], Product.objects.count())
+
+        facets = compute_facets({'seller': 'Shop2', 'stock': 'on'})
+        sellers = {item['name']: item['count'] for item in facets['sellers']}
+        self.assertEqual(sellers['Shop1'], 3)
+
+    def test_price_buckets(self):
+        """Тест кол-ва товаров по диапазонам цен."""
+        facets = compute_facets({})
+        counts = [bucket['count'] for bucket in facets['price']]
+        self.assertEqual(sum(counts), Product.objects.filter(offers__isnull=False).distinct().count())
+        self.assertEqual(facets['price'][-1]['to'], None)
+
+    def test_facets_in_context(self):
+        """Тест передачи фасетов в контекст каталога."""
+        response = self.client.get(self.url + '?stock=on')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('facets', response.context)
+        self.assertEqual(response.context['facets']['total'], len(response.context['catalog']))
@@ -0,0 +1,76 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, tag
+
+from orders.models import Order, OrderItem
+from product.catalog import build_category_paths, refresh_catalog_products
+from product.models import CatalogProduct, Category, Feedback, Offer, Product
+from shop.models import Seller
+
+
+@tag("catalog")
+class CatalogProjectionTest(TestCase):
+    """ Тесты поддержки проекции каталога. """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(password='test1234', email='test1@test.ru')
+        cls.seller = Seller.objects.create(user=cls.user, name='Shop1', description='test1',
+                                           address='test', number=1234567890)
+        cls.root = Category.objects.create(name='Components', active=True)
+        cls.child = Category.objects.create(name='SSD', parent=cls.root, active=True)
+        cls.product = Product.objects.create(name='product 1', description='description', category=cls.child)
+
+    def entry(self) -> CatalogProduct:
+        return CatalogProduct.objects.get(product=self.product)
+
+    def test_entry_created_with_product(self):
+        """Тест, что запись каталога создается вместе с продуктом."""
+        entry = self.entry()
+        self.assertEqual(entry.category_path, f'/{self.root.id}/{self.child.id}/')
+        self.assertIsNone(entry.avg_price)
+        self.assertFalse(entry.in_stock)
+
+    def test_offer_updates_prices_and_flags(self):
+        """Тест пересчета цен, продавцов и флагов при изменении предложений."""
+        Offer.objects.create(product=self.product, seller=self.seller, price=100,
+                             is_present=False, is_free_delivery=False)
+        offer = Offer.objects.create(product=self.product, seller=self.seller, price=200)
+        entry = self.entry()
+        self.assertEqual(entry.min_price, Decimal(100))
+        self.assertEqual(entry.max_price, Decimal(200))
+        self.assertEqual(entry.avg_price, Decimal(150))
+        self.assertTrue(entry.in_stock)
+        self.assertTrue(entry.free_delivery)
+        self.assertEqual(entry.seller_ids, f',{self.seller.id},')
+
+        offer.delete()
+        entry = self.entry()
+        self.assertEqual(entry.avg_price, Decimal(100))
+        self.assertFalse(entry.in_stock)
+
+    def test_feedback_and_order_update_rating_and_sales(self):
+        """Тест пересчета рейтинга и кол-ва продаж."""
+        offer = Offer.objects.create(product=self.product, seller=self.seller, price=100)
+        Feedback.objects.create(offer=offer, author=self.user, rating=5, description='test')
+        Feedback.objects.create(offer=offer, author=self.user, rating=4, description='test')
+        order = Order.objects.create(first_name='test', last_name='test', email='test@test.ru', number=1234567)
+        OrderItem.objects.create(order=order, offer=offer, price=100)
+        entry = self.entry()
+        self.assertEqual(entry.rating, 4.5)
+        self.assertEqual(entry.sales_count, 1)
+
+    def test_full_rebuild(self):
+        """Тест полного пересчета после массовой вставки."""
+        Offer.objects.bulk_create([Offer(product=self.product, seller=self.seller, price=300)])
+        self.assertIsNone(self.entry().avg_price)
+        refresh_catalog_products()
+        self.assertEqual(self.entry().avg_price, Decimal(300))
+
+    def test_paths_of_affected_categories(self):
+        """Тест, что при пересчете продуктов загружаются пути только их категорий и предков."""
+        other = Category.objects.create(name='Other', active=True)
+        self.assertEqual(build_category_paths([self.child.id]),
+                         {self.root.id: f'/{self.root.id}/', self.child.id: f'/{self.root.id}/{self.child.id}/'})
+        self.assertIn(other.id, build_category_paths())
+        self.assertEqual(build_category_paths([]), {})
@@ -1,7 +1,17 @@
+from django.core.cache import cache
 from django.test import TestCase, tag, override_settings
 from django.urls import reverse
 from django.conf import settings
 from product.models import Category
+from product.services import get_category
+from shop.cache import local_cache
+
+LOCAL_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'category-tests',
+    }
+}
 
 
 @tag("category")
@@ -66,3 +76,30 @@ class CategoryServicesTest(TestCase):
         categories = response.context['favorite']
         count_in_context = len(categories)
         self.assertEqual(count_in_context, 1)
+
+
+@tag("category")
+@override_settings(CACHES=LOCAL_CACHES)
+class CategoryCacheTest(TestCase):
+    """ Тесты сброса кеша категорий при изменении категорий. """
+
+    def setUp(self) -> None:
+        cache.clear()
+        local_cache.clear()
+
+    def test_category_change_invalidates_cache(self):
+        """Тест, что изменение категории сбрасывает кешированный список категорий."""
+        with self.captureOnCommitCallbacks(execute=True):
+            category = Category.objects.create(name='category_1', active=True)
+        self.assertEqual([item.name for item in get_category()], ['category_1'])
+        with self.assertNumQueries(0):
+            get_category()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            category.name = 'category_2'
+            category.save()
+        self.assertEqual([item.name for item in get_category()], ['category_2'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            category.delete()
+        self.assertEqual(get_category(), [])
@@ -0,0 +1,101 @@
+from django.conf import settings
+from django.test import TestCase, tag, override_settings
+
+from product.catalog import refresh_catalog_products
+from product.models import Product
+from product.pagination import CursorPaginator, decode_cursor, encode_cursor
+from .test_product_catalog import (
+    create_category,
+    create_sellers,
+    create_products,
+    create_offers,
+    create_ordered_items,
+    set__feedback,
+)
+
+
+@tag("catalog")
+@override_settings(CACHES=settings.TEST_CACHES)
+class CursorPaginationTest(TestCase):
+    """ Тесты постраничного вывода каталога по курсору. """
+    @classmethod
+    def setUpTestData(cls):
+        cls.url = '/product/catalog/'
+        create_category()
+        create_sellers()
+        create_products()
+        create_offers()
+        create_ordered_items()
+        set__feedback()
+        refresh_catalog_products()
+
+    def walk(self, query: str, cursor: str = '') -> list:
+        """Обходит все страницы каталога по курсору и возвращает товары."""
+        result = []
+        while True:
+            response = self.client.get(self.url + f'?{query}&cursor={cursor}')
+            self.assertEqual(response.status_code, 200)
+            page = response.context['page_obj']
+            result.extend(item.id for item in page)
+            if not page.has_next():
+                return result
+            cursor = page.next_cursor
+
+    def test_cursor_roundtrip(self):
+        """Тест кодирования и декодирования курсора."""
+        payload = {'k': ['1000.00', 5], 'd': 'n', 'n': 2, 's': 'id'}
+        self.assertEqual(decode_cursor(encode_cursor(payload)), payload)
+        self.assertIsNone(decode_cursor('not a cursor'))
+
+    def test_walk_matches_offset_order(self):
+        """Тест, что обход по курсору возвращает все товары в порядке сортировки."""
+        for sort in ('', 'aprice', 'dprice', 'drate', 'apop', 'dnew'):
+            with self.subTest(sort=sort):
+                response = self.client.get(self.url + f'?sort={sort}')
+                expected = [item.id for item in response.context['paginator'].object_list]
+                walked = self.walk(f'sort={sort}')
+                self.assertEqual(len(walked), Product.objects.count())
+                self.assertEqual(sorted(walked), sorted(expected))
+
+    def test_walk_by_price_is_ordered(self):
+        """Тест, что товары на страницах упорядочены по цене."""
+        ids = self.walk('sort=dprice')
+        prices = [Product.objects.get(id=pk).catalog_entry.avg_price for pk in ids]
+        self.assertEqual(prices, sorted(prices, reverse=True))
+
+    def test_previous_page(self):
+        """Тест перехода на предыдущую страницу."""
+        first = self.client.get(self.url + '?sort=aprice&cursor=').context['page_obj']
+        second = self.client.get(self.url + f'?sort=aprice&cursor={first.next_cursor}').context['page_obj']
+        self.assertTrue(second.has_previous())
+        back = self.client.get(self.url + f'?sort=aprice&cursor={second.previous_cursor}').context['page_obj']
+        self.assertEqual([item.id for item in back], [item.id for item in first])
+        self.assertFalse(back.has_previous())
+
+    def test_tampered_cursor(self):
+        """Тест, что измененный клиентом курсор приводит к первой странице, а не к ошибке сервера."""
+        first = [item.id for item in self.client.get(self.url + '?sort=aprice&cursor=').context['page_obj']]
+        pk = Product.objects.first().pk
+        payloads = [
+            {'k': ['1000.00', pk], 'd': 'n', 'n': 'x', 's': 'catalog_entry__avg_price'},
+            {'k': ['1000.00', 'abc'], 'd': 'n', 'n': 2, 's': 'catalog_entry__avg_price'},
+            {'k': ['abc', pk], 'd': 'n', 'n': 2, 's': 'catalog_entry__avg_price'},
+            {'k': [[1], pk], 'd': 'n', 'n': 2, 's': 'catalog_entry__avg_price'},
+            {'k': ['1000.00', 10 ** 30], 'd': 'n', 'n': 2, 's': 'catalog_entry__avg_price'},
+            {'k': ['1000.00', pk], 'd': 'x', 'n': 2, 's': 'catalog_entry__avg_price'},
+            {'k': ['1000.00', pk], 'd': 'n', 'n': 2, 's': ['id']},
+        ]
+        for payload in payloads:
+            with self.subTest(payload=payload):
+                response = self.client.get(self.url + f'?sort=aprice&cursor={encode_cursor(payload)}')
+                self.assertEqual(response.status_code, 200)
+                page = response.context['page_obj']
+                self.assertEqual([item.id for item in page], first)
+                self.assertEqual(page.number, 1)
+
+    def test_approximate_total(self):
+        """Тест ограниченного подсчета кол-ва товаров."""
+        paginator = CursorPaginator(Product.objects.all(), 2, count_limit=3)
+        self.assertEqual(paginator.total, (3, False))
+        paginator = CursorPaginator(Product.objects.all(), 2, count_limit=100)
+        self.assertEqual(paginator.total, (Product.objects.count(), True))
@@ -0,0 +1,85 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, tag, override_settings
+
+from product.home_blocks import (HOME_BLOCK_LOCK_KEY, HOME_BLOCK_TAGS, HOME_BLOCKS_CACHE, block_key, get_home_block,
+                                 get_limited_edition, refresh_home_block)
+from product.models import Product
+
+LOCAL_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'home-block-tests',
+    }
+}
+
+
+@tag('main-page')
+@override_settings(CACHES=LOCAL_CACHES, HOME_BLOCK_LOCK_WAIT=0.2)
+class HomeBlocksTest(TestCase):
+    """ Тесты кеша блоков главной страницы. """
+    @classmethod
+    def setUpTestData(cls):
+        for index in range(3):
+            Product.objects.create(name=f'limited {index}', description='description', is_limited=True)
+        Product.objects.create(name='product', description='description')
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_fresh_block_from_cache(self):
+        """Тест, что актуальный блок берется из кеша без запросов к базе данных."""
+        limited = get_home_block('limited')
+        self.assertEqual(len(limited), 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_home_block('limited'), limited)
+
+    def test_stale_block_refreshed_in_background(self):
+        """Тест, что устаревший блок отдается сразу, а обновление ставится в очередь один раз."""
+        refresh_home_block('limited')
+        entry = HOME_BLOCKS_CACHE.get(block_key('limited'), tags=HOME_BLOCK_TAGS['limited'])
+        entry['fresh_until'] = time.time() - 1
+        HOME_BLOCKS_CACHE.set(block_key('limited'), entry, tags=HOME_BLOCK_TAGS['limited'])
+
+        with mock.patch('product.tasks.refresh_home_block_task.delay') as delay:
+            with self.assertNumQueries(0):
+                self.assertEqual(get_home_block('limited'), entry['value'])
+                get_home_block('limited')
+        delay.assert_called_once_with('limited')
+
+    def test_failed_schedule_releases_lock(self):
+        """Тест, что блокировка снимается, если задачу обновления не удалось поставить в очередь."""
+        refresh_home_block('limited')
+        entry = HOME_BLOCKS_CACHE.get(block_key('limited'), tags=HOME_BLOCK_TAGS['limited'])
+        entry['fresh_until'] = time.time() - 1
+        HOME_BLOCKS_CACHE.set(block_key('limited'), entry, tags=HOME_BLOCK_TAGS['limited'])
+
+        with mock.patch('product.tasks.refresh_home_block_task.delay', side_effect=OSError):
+            get_home_block('limited')
+        self.assertIsNone(cache.get(HOME_BLOCK_LOCK_KEY.format('limited')))
+
+    def test_missing_block_single_flight(self):
+        """Тест, что пока блок пересчитывает другой процесс, блок не пересчитывается повторно и не кешируется."""
+        cache.add(HOME_BLOCK_LOCK_KEY.format('limited'), 1)
+        with mock.patch('product.home_blocks.refresh_home_block') as refresh:
+            self.assertEqual(len(get_home_block('limited')), 3)
+        refresh.assert_not_called()
+        self.assertIsNone(HOME_BLOCKS_CACHE.get(block_key('limited'), tags=HOME_BLOCK_TAGS['limited']))
+
+    def test_refresh_task(self):
+        """Тест, что задача обновления пересчитывает блок и снимает блокировку."""
+        from product.tasks import refresh_home_block_task
+
+        cache.add(HOME_BLOCK_LOCK_KEY.format('popular'), 1)
+        refresh_home_block_task('popular')
+        self.assertIsNotNone(HOME_BLOCKS_CACHE.get(block_key('popular'), tags=HOME_BLOCK_TAGS['popular']))
+        self.assertIsNone(cache.get(HOME_BLOCK_LOCK_KEY.format('popular')))
+
+    def test_day_offer_excluded_from_limited(self):
+        """Тест, что предложение дня не повторяется в списке товаров ограниченного тиража."""
+        day_offer, limited = get_limited_edition()
+        self.assertNotIn(day_offer, limited)
+        self.assertEqual(len(limited), 2)
+        self.assertEqual(get_limited_edition(), (day_offer, limited))
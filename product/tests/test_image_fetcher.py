@@ -0,0 +1,185 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, tag, override_settings
+
+from product.image_fetcher import ImageFetcher, ImageTooLarge
+from product.importer import ProductImporter
+from product.models import LoggingImportFileModel, ProductImage
+from shop.models import Seller
+from .test_product_catalog import create_sellers
+
+IMAGE = b'\x89PNG' + b'x' * 200_000
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    """Локальный сервер изображений для тестов."""
+    server_version = 'TestImageServer'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            self._respond()
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def _respond(self):
+        server = self.server
+        if self.path.startswith('/flaky'):
+            with server.lock:
+                server.flaky += 1
+                failed = server.flaky < 3
+            if failed:
+                self.send_response(503)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+        if self.path.startswith('/missing'):
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.path.startswith('/slow'):
+            time.sleep(server.delay)
+        body = IMAGE * 100 if self.path.startswith('/large') else IMAGE
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ImageServerMixin:
+    """Запускает локальный сервер изображений и временный MEDIA_ROOT."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), ImageHandler)
+        cls.server.daemon_threads = True
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.active = 0
+        self.server.max_active = 0
+        self.server.flaky = 0
+        self.server.delay = 0.1
+        self.media_root = tempfile.mkdtemp()
+        media = self.settings(MEDIA_ROOT=self.media_root + '/')
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+    def stored_files(self):
+        directory = os.path.join(self.media_root, settings.MEDIA_IMAGE_URL)
+        return sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+
+
+@tag("import")
+@override_settings(IMAGE_FETCH_BACKOFF=0)
+class ImageFetcherTest(ImageServerMixin, SimpleTestCase):
+    """ Тесты параллельной загрузки изображений. """
+
+    def test_content_hash_dedup(self):
+        """Тест, что одинаковые адреса и одинаковое содержимое сохраняются в одном файле."""
+        urls = [f'{self.base_url}/a.png', f'{self.base_url}/a.png', f'{self.base_url}/b.png']
+        with ImageFetcher() as fetcher:
+            results = fetcher.fetch_many(urls)
+            self.assertEqual(fetcher.fetch(urls[0]), results[urls[0]])
+
+        self.assertEqual(results[urls[0]], results[urls[2]])
+        self.assertTrue(results[urls[0]].startswith(settings.MEDIA_IMAGE_URL))
+        self.assertTrue(results[urls[0]].endswith('.png'))
+        self.assertEqual(self.server.requests.count('/a.png'), 1)
+        self.assertEqual(len(self.stored_files()), 1)
+        with open(os.path.join(self.media_root, results[urls[0]]), 'rb') as file:
+            self.assertEqual(file.read(), IMAGE)
+
+    def test_per_host_limit(self):
+        """Тест ограничения кол-ва одновременных запросов к хосту."""
+        urls = [f'{self.base_url}/slow/{i}.png' for i in range(8)]
+        with ImageFetcher(max_workers=8, per_host=2) as fetcher:
+            started = time.monotonic()
+            results = fetcher.fetch_many(urls)
+            elapsed = time.monotonic() - started
+        self.assertTrue(all(isinstance(result, str) for result in results.values()))
+        self.assertEqual(self.server.max_active, 2)
+        self.assertGreaterEqual(elapsed, 0.4)
+
+    def test_parallel_fetch(self):
+        """Тест, что изображения загружаются параллельно."""
+        urls = [f'{self.base_url}/slow/{i}.png' for i in range(8)]
+        with ImageFetcher(max_workers=8, per_host=8) as fetcher:
+            started = time.monotonic()
+            fetcher.fetch_many(urls)
+            elapsed = time.monotonic() - started
+        self.assertGreater(self.server.max_active, 1)
+        self.assertLess(elapsed, 0.1 * 8)
+
+    def test_retries(self):
+        """Тест повтора запроса при ошибке сервера."""
+        with ImageFetcher(retries=3) as fetcher:
+            result = fetcher.fetch_many([f'{self.base_url}/flaky.png'])
+        self.assertIsInstance(result[f'{self.base_url}/flaky.png'], str)
+        self.assertEqual(self.server.requests.count('/flaky.png'), 3)
+
+    def test_errors(self):
+        """Тест ошибок загрузки: нет изображения, таймаут, превышение размера. Частичные файлы удаляются."""
+        self.server.delay = 1
+        urls = [f'{self.base_url}/missing.png', f'{self.base_url}/slow.png', f'{self.base_url}/large.png']
+        with self.settings(IMAGE_FETCH_MAX_BYTES=len(IMAGE) * 10), \
+                ImageFetcher(retries=0, timeout=(1, 0.2)) as fetcher:
+            results = fetcher.fetch_many(urls)
+        self.assertIsInstance(results[urls[0]], requests.HTTPError)
+        self.assertIsInstance(results[urls[1]], requests.ConnectionError)
+        self.assertIsInstance(results[urls[2]], ImageTooLarge)
+        self.assertEqual(self.stored_files(), [])
+
+
+@tag("import")
+@override_settings(CACHES=settings.TEST_CACHES, IMAGE_FETCH_BACKOFF=0, IMAGE_FETCH_RETRIES=0)
+class ImportImagesTest(ImageServerMixin, TestCase):
+    """ Тесты загрузки изображений при импорте товаров. """
+    @classmethod
+    def setUpTestData(cls):
+        create_sellers()
+        cls.seller = Seller.objects.get(name='Shop1')
+
+    def test_import_images(self):
+        """Тест создания изображений товаров при импорте."""
+        records = [('Ноутбуки', {'name': f'Ноутбук {i}', 'description': 'Описание',
+                                 'property': {'name': 'Цвет', 'value': 'Черный'},
+                                 'image': [f'{self.base_url}/{i}.png', f'{self.base_url}/same.png',
+                                           f'{self.base_url}/missing.png']})
+                   for i in range(3)]
+
+        stats = ProductImporter(self.seller, 'images.json').run(records)
+
+        self.assertEqual(stats.images_created, 3)
+        self.assertEqual(ProductImage.objects.count(), 3)
+        self.assertEqual(len(self.stored_files()), 1)
+        self.assertEqual(LoggingImportFileModel.objects.filter(file_name='images.json').count(), 3)
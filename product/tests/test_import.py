@@ -0,0 +1,301 @@
+import datetime
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import Permission
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, tag, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from product.import_stream import JsonStreamReader, iter_events, iter_stream_records
+from product import import_jobs
+from product.import_jobs import QUEUED_FILES_DIR, ImportJobBusy, create_import_job, run_import_job
+from product.importer import ProductImporter, iter_records
+from product.models import Category, ImportJob, LoggingImportFileModel, Offer, Product, ProductProperty
+from product.services import upload_product_file
+from shop.models import Seller
+from .test_product_catalog import create_sellers
+
+
+def make_file_data(count: int, category: str = 'Ноутбуки', price: int = 1000) -> dict:
+    """Возвращает содержимое файла импорта с count товарами."""
+    return {'category': {category: [
+        {'name': f'Ноутбук {i}',
+         'description': f'Описание {i}',
+         'property': {'name': 'Цвет', 'value': 'Черный'},
+         'offer': {'price': price + i}}
+        for i in range(count)
+    ]}}
+
+
+def make_file(data: dict) -> SimpleUploadedFile:
+    return SimpleUploadedFile(name='file.json', content=json.dumps(data).encode(), content_type='text/json')
+
+
+@tag("import")
+@override_settings(CACHES=settings.TEST_CACHES, IMPORT_BATCH_SIZE=100)
+class ProductImportTest(TestCase):
+    """ Тесты пакетного импорта товаров из файла. """
+    @classmethod
+    def setUpTestData(cls):
+        create_sellers()
+        cls.seller = Seller.objects.get(name='Shop1')
+
+    def test_import_creates_objects(self):
+        """Тест создания категорий, товаров, свойств и предложений."""
+        stats = upload_product_file(make_file(make_file_data(5)), self.seller, 'file.json')
+
+        self.assertEqual(stats.rows, 5)
+        self.assertEqual(stats.products_created, 5)
+        self.assertEqual(stats.offers_created, 5)
+        self.assertEqual(stats.errors, 0)
+        self.assertEqual(Category.objects.filter(name='Ноутбуки').count(), 1)
+        self.assertEqual(ProductProperty.objects.filter(product__name__startswith='Ноутбук').count(), 5)
+        self.assertEqual(Offer.objects.get(product__name='Ноутбук 3').price, 1003)
+        self.assertTrue(Product.objects.get(name='Ноутбук 3').catalog_entry.in_stock)
+
+    def test_queries_do_not_depend_on_file_size(self):
+        """Тест, что кол-во запросов на пакет не зависит от кол-ва товаров в пакете."""
+        with CaptureQueriesContext(connection) as small:
+            ProductImporter(self.seller, 'small.json').run(iter_records(make_file_data(5, 'Маленький')))
+        with CaptureQueriesContext(connection) as large:
+            ProductImporter(self.seller, 'large.json').run(
+                iter_records({'category': {'Большой': make_file_data(80)['category']['Ноутбуки'][5:]}}))
+        self.assertEqual(Product.objects.count(), 80)
+        self.assertLessEqual(len(large), len(small) + 2)
+
+    def test_reimport_updates_offers(self):
+        """Тест, что повторный импорт обновляет цены предложений, а не дублирует товары."""
+        upload_product_file(make_file(make_file_data(3)), self.seller, 'file.json')
+        stats = upload_product_file(make_file(make_file_data(3, price=2000)), self.seller, 'file.json')
+
+        self.assertEqual(stats.products_created, 0)
+        self.assertEqual(stats.offers_updated, 3)
+        self.assertEqual(Product.objects.count(), 3)
+        self.assertEqual(Offer.objects.count(), 3)
+        self.assertEqual(Offer.objects.get(product__name='Ноутбук 2').price, 2002)
+
+    def test_errors_are_logged(self):
+        """Тест записи ошибок некорректных записей в журнал импорта."""
+        data = make_file_data(3)
+        products = data['category']['Ноутбуки']
+        del products[0]['property']
+        products[1]['offer'] = {'price': 'дорого'}
+        products.append({'description': 'без наименования'})
+
+        stats = ProductImporter(self.seller, 'errors.json', batch_size=2).run(iter_records(data))
+
+        self.assertEqual(stats.batches, 2)
+        self.assertEqual(stats.errors, 3)
+        self.assertEqual(LoggingImportFileModel.objects.filter(file_name='errors.json').count(), 3)
+        self.assertFalse(Product.objects.filter(name='Ноутбук 0').exists())
+        self.assertFalse(Offer.objects.filter(product__name='Ноутбук 1').exists())
+        self.assertTrue(Offer.objects.filter(product__name='Ноутбук 2').exists())
+        self.assertEqual(set(stats.as_dict()['timings']) - {'images'},
+                         {'validation', 'categories', 'properties', 'products', 'offers', 'catalog', 'log'})
+
+    def test_images_fetched_outside_transaction(self):
+        """Тест, что изображения загружаются до транзакции пакета и только для новых товаров."""
+        upload_product_file(make_file(make_file_data(1)), self.seller, 'file.json')
+        data = make_file_data(2)
+        for index, item in enumerate(data['category']['Ноутбуки']):
+            item['image'] = [f'http://images.test/{index}.png']
+        depth = len(connection.atomic_blocks)
+        calls = []
+
+        def fetch_many(fetcher, urls):
+            calls.append((list(urls), len(connection.atomic_blocks)))
+            return {'http://images.test/1.png': 'products/1.png'}
+
+        with mock.patch('product.importer.ImageFetcher.fetch_many', autospec=True, side_effect=fetch_many):
+            stats = ProductImporter(self.seller, 'images.json').run(iter_records(data))
+        self.assertEqual(calls, [(['http://images.test/1.png'], depth)])
+        self.assertEqual(stats.images_created, 1)
+        self.assertEqual(Product.objects.get(name='Ноутбук 1').images.get().image.name, 'products/1.png')
+
+    def test_invalid_structure(self):
+        """Тест ошибки при отсутствии раздела category."""
+        with self.assertRaises(ValueError):
+            upload_product_file(make_file({'products': []}), self.seller, 'file.json')
+
+
+@tag("import")
+class StreamParserTest(SimpleTestCase):
+    """ Тесты потокового разбора файла импорта. """
+
+    def test_same_records_as_document_parser(self):
+        """Тест, что потоковый разбор возвращает те же записи, что и разбор файла целиком."""
+        data = make_file_data(20)
+        data['category']['Пустая'] = []
+        data['category']['Планшеты'] = make_file_data(3)['category']['Ноутбуки']
+        data['version'] = {'format': [1, 2]}
+        content = json.dumps(data, ensure_ascii=False, indent=2).encode()
+
+        for chunk_size in (1, 7, 1024):
+            with self.subTest(chunk_size=chunk_size):
+                records = list(iter_stream_records(io.BytesIO(content), chunk_size=chunk_size))
+                self.assertEqual(records, list(iter_records(data)))
+
+    def test_events(self):
+        """Тест последовательности событий разбора."""
+        content = b'{"category": {"A": [{"name": "x"}], "B": []}}'
+        self.assertEqual(list(iter_events(io.BytesIO(content))), [
+            ('start_category', 'A'), ('product', {'name': 'x'}), ('end_category', 'A'),
+            ('start_category', 'B'), ('end_category', 'B'),
+        ])
+
+    def test_memory_is_bounded_by_chunk(self):
+        """Тест, что в памяти хранится не больше порции чтения и одного товара."""
+        content = json.dumps(make_file_data(2000)).encode()
+        stream = io.BytesIO(content)
+        reader_sizes = []
+        original_fill = JsonStreamReader._fill
+
+        def fill(reader):
+            result = original_fill(reader)
+            reader_sizes.append(reader.buffer_size)
+            return result
+
+        with self.settings(IMPORT_STREAM_CHUNK_SIZE=4096), \
+                mock.patch.object(JsonStreamReader, '_fill', autospec=True, side_effect=fill):
+            records = iter_stream_records(stream)
+            next(records)
+            self.assertLess(stream.tell(), len(content))
+            self.assertEqual(sum(1 for _ in records), 1999)
+        self.assertLess(max(reader_sizes), 4096 * 2)
+
+    def test_malformed_record_stops_reading(self):
+        """Тест, что ошибка в записи посреди файла не приводит к чтению остатка файла в память."""
+        data = make_file_data(2000)
+        content = json.dumps(data).encode()
+        first = json.dumps(data['category']['Ноутбуки'][0]).encode()
+        content = content.replace(first, first[:-1] + b',,}', 1)
+        stream = io.BytesIO(content)
+        with self.settings(IMPORT_STREAM_MAX_RECORD_SIZE=4096):
+            with self.assertRaises(ValueError):
+                list(iter_stream_records(stream, chunk_size=1024))
+        self.assertLess(stream.tell(), 4096 * 2)
+
+    def test_invalid_files(self):
+        """Тест ошибок разбора некорректных файлов."""
+        for content, error in ((b'{"category": {"A": [{"name": }]}}', ValueError),
+                               (b'{"products": []}', ValueError),
+                               (b'{"category": {"A": {"name": "x"}}}', TypeError),
+                               (b'{"category": {"A": [{"name": "x"}', ValueError),
+                               (b'[]', ValueError)):
+            with self.subTest(content=content):
+                with self.assertRaises(error):
+                    list(iter_stream_records(io.BytesIO(content), chunk_size=5))
+
+
+@tag("import")
+@override_settings(CACHES=settings.TEST_CACHES, IMPORT_BATCH_SIZE=10)
+class ImportJobTest(TestCase):
+    """ Тесты фонового импорта с контрольными точками. """
+    @classmethod
+    def setUpTestData(cls):
+        create_sellers()
+        cls.seller = Seller.objects.get(name='Shop1')
+        cls.seller.user.user_permissions.add(Permission.objects.get(codename='add_product'))
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        media = self.settings(MEDIA_ROOT=self.media_root + '/')
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+    def test_run_job(self):
+        """Тест выполнения задания импорта."""
+        job = create_import_job(self.seller, make_file(make_file_data(25)), 'file.json')
+        job = run_import_job(job.pk)
+
+        self.assertEqual(job.status, ImportJob.STATUS_DONE)
+        self.assertEqual(job.progress, 100)
+        self.assertEqual(job.rows_processed, 25)
+        self.assertEqual(job.stats['products_created'], 25)
+        self.assertEqual(job.stats['batches'], 3)
+        self.assertEqual(Product.objects.count(), 25)
+
+    def test_resume_from_checkpoint(self):
+        """Тест продолжения прерванного импорта с последнего зафиксированного пакета."""
+        job = create_import_job(self.seller, make_file(make_file_data(25)), 'file.json')
+        save_checkpoint = import_jobs._save_checkpoint
+
+        def crash_on_second_batch(job, stream, stats):
+            if stats.batches == 2:
+                raise RuntimeError('worker lost')
+            save_checkpoint(job, stream, stats)
+
+        with mock.patch('product.import_jobs._save_checkpoint', crash_on_second_batch), \
+                self.assertRaises(RuntimeError):
+            run_import_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.STATUS_FAILED)
+        self.assertEqual(job.rows_processed, 10)
+        self.assertEqual(Product.objects.count(), 10)
+
+        job = run_import_job(job.pk)
+        self.assertEqual(job.status, ImportJob.STATUS_DONE)
+        self.assertEqual(job.rows_processed, 25)
+        self.assertEqual(job.stats['products_created'], 25)
+        self.assertEqual(Product.objects.count(), 25)
+        self.assertEqual(Offer.objects.count(), 25)
+
+    def test_running_job_is_not_imported_twice(self):
+        """Тест, что задание, которое выполняет другой воркер, не импортируется повторно до устаревания."""
+        job = create_import_job(self.seller, make_file(make_file_data(5)), 'file.json')
+        ImportJob.objects.filter(pk=job.pk).update(status=ImportJob.STATUS_RUNNING, heartbeat_at=timezone.now())
+        with self.assertRaises(ImportJobBusy):
+            run_import_job(job.pk)
+        self.assertFalse(Product.objects.exists())
+
+        stale = timezone.now() - datetime.timedelta(seconds=settings.IMPORT_JOB_HEARTBEAT_TIMEOUT + 1)
+        ImportJob.objects.filter(pk=job.pk).update(heartbeat_at=stale)
+        job = run_import_job(job.pk)
+        self.assertEqual(job.status, ImportJob.STATUS_DONE)
+        self.assertEqual(Product.objects.count(), 5)
+        self.assertEqual(run_import_job(job.pk).status, ImportJob.STATUS_DONE)
+
+    def test_invalid_file_fails_job(self):
+        """Тест завершения задания с ошибкой для некорректного файла."""
+        job = create_import_job(self.seller, make_file({'products': []}), 'file.json')
+        job = run_import_job(job.pk)
+        self.assertEqual(job.status, ImportJob.STATUS_FAILED)
+        self.assertTrue(LoggingImportFileModel.objects.filter(file_name='file.json').exists())
+
+    def test_upload_enqueues_job(self):
+        """Тест, что загрузка файла ставит задание в очередь и возвращает страницу состояния."""
+        self.client.force_login(self.seller.user)
+        with mock.patch('product.tasks.import_product_file.delay') as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('upload_file'), {'file_json': make_file(make_file_data(3))})
+        job = ImportJob.objects.get()
+        self.assertRedirects(response, reverse('import-job', args=[job.pk]), fetch_redirect_response=False)
+        delay.assert_called_once_with(job.pk)
+        self.assertFalse(Product.objects.exists())
+
+        run_import_job(job.pk)
+        status = self.client.get(reverse('import-job-status', args=[job.pk])).json()
+        self.assertEqual(status['status'], ImportJob.STATUS_DONE)
+        self.assertTrue(status['finished'])
+        self.assertEqual(status['stats']['rows'], 3)
+
+    def test_import_file_command(self):
+        """Тест команды импорта файла из каталога заданий."""
+        os.makedirs(os.path.join(self.media_root, QUEUED_FILES_DIR))
+        with open(os.path.join(self.media_root, QUEUED_FILES_DIR, 'seller.json'), 'w') as file:
+            json.dump(make_file_data(4), file)
+
+        call_command('import_file', 'seller.json', seller=self.seller.pk, stdout=io.StringIO())
+        self.assertEqual(ImportJob.objects.get().status, ImportJob.STATUS_DONE)
+        self.assertEqual(Product.objects.count(), 4)
@@ -0,0 +1,80 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.test import TestCase, tag
+from django.utils import timezone
+
+from product.inventory import commit_stock, release_expired_reservations, release_reservations, reserve_stock
+from product.models import Offer, Product, StockReservation
+from shop.models import Seller
+
+
+@tag('inventory')
+class InventoryTest(TestCase):
+    """ Тесты резервирования и списания остатков. """
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(password='test1234', email='stock@test.ru')
+        seller = Seller.objects.create(user=user, name='Shop', description='test', address='test', number=1234567)
+        product = Product.objects.create(name='product', description='description')
+        cls.offer = Offer.objects.create(product=product, seller=seller, price=100, stock=5)
+        cls.untracked = Offer.objects.create(product=product, seller=seller, price=200)
+
+    def offer_state(self):
+        self.offer.refresh_from_db()
+        return self.offer.stock, self.offer.reserved
+
+    def test_reserve_and_commit(self):
+        """Тест, что резерв уменьшает доступный остаток, а заказ списывает остаток и снимает резерв."""
+        expires_at = reserve_stock({self.offer.id: 3, self.untracked.id: 10}, 'first')
+        self.assertIsNotNone(expires_at)
+        self.assertEqual(self.offer_state(), (5, 3))
+        self.assertEqual(self.offer.available, 2)
+        with self.assertRaises(ValidationError):
+            reserve_stock({self.offer.id: 3}, 'second')
+        self.assertEqual(self.offer_state(), (5, 3))
+
+        commit_stock({self.offer.id: 3, self.untracked.id: 10}, 'first')
+        self.assertEqual(self.offer_state(), (2, 0))
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_reserve_replaces_previous(self):
+        """Тест, что повторный резерв оформления заменяет прежний."""
+        reserve_stock({self.offer.id: 2}, 'key')
+        reserve_stock({self.offer.id: 4}, 'key')
+        self.assertEqual(self.offer_state(), (5, 4))
+        release_reservations('key')
+        self.assertEqual(self.offer_state(), (5, 0))
+
+    def test_commit_without_reservation(self):
+        """Тест, что после истечения резерва заказ создается, только если товар никто не зарезервировал."""
+        reserve_stock({self.offer.id: 4}, 'other')
+        with self.assertRaises(ValidationError):
+            commit_stock({self.offer.id: 2}, 'expired')
+        commit_stock({self.offer.id: 1}, 'expired')
+        self.assertEqual(self.offer_state(), (4, 4))
+
+    def test_commit_releases_removed_items(self):
+        """Тест, что резерв товара, удаленного из корзины, снимается при создании заказа."""
+        reserve_stock({self.offer.id: 2}, 'key')
+        commit_stock({self.untracked.id: 1}, 'key')
+        self.assertEqual(self.offer_state(), (5, 0))
+
+    def test_release_expired(self):
+        """Тест снятия истекших резервов уборщиком."""
+        reserve_stock({self.offer.id: 1}, 'expired', ttl=60)
+        reserve_stock({self.offer.id: 2}, 'active', ttl=600)
+        now = timezone.now() + datetime.timedelta(seconds=120)
+        self.assertEqual(release_expired_reservations(now, batch_size=1), 1)
+        self.assertEqual(self.offer_state(), (5, 2))
+        self.assertEqual(list(StockReservation.objects.values_list('key', flat=True)), ['active'])
+
+    def test_catalog_stock_filter(self):
+        """Тест, что в каталоге товар отсутствует в наличии, когда учитываемый остаток закончился."""
+        product = self.offer.product
+        self.untracked.delete()
+        self.assertTrue(Product.objects.get(id=product.id).catalog_entry.in_stock)
+        self.offer.stock = 0
+        self.offer.save()
+        self.assertFalse(Product.objects.get(id=product.id).catalog_entry.in_stock)
@@ -112,7 +112,7 @@ class MainPageViewTest(TestCase):
         self.assertEqual(len(favorite), 3)
         # проверка, что выбраны только category.is_leaf_node()
         wrong_category = Category.objects.get(name="category_2")
-        self.assertNotIn(wrong_category, favorite)
+        self.assertNotIn(wrong_category.id, [item['id'] for item in favorite])
 
     def test_get_popular_products(self):
         """Тест, что получает список популярных товаров."""
@@ -121,9 +121,9 @@ class MainPageViewTest(TestCase):
         self.assertTrue("popular" in response.context)
         popular = response.context['popular']
         # список отсортирован по кол-ву продаж
-        self.assertEqual(popular[0].name, 'product 2')
-        self.assertEqual(popular[1].name, 'product 1')
-        self.assertEqual(popular[2].name, 'product 3')
+        self.assertEqual(popular[0]['name'], 'product 2')
+        self.assertEqual(popular[1]['name'], 'product 1')
+        self.assertEqual(popular[2]['name'], 'product 3')
 
     def test_get_day_offer(self):
         """Тест на получения товара дня."""
@@ -4,6 +4,7 @@ from django.urls import reverse
 from django.conf import settings
 from django.contrib.auth import get_user_model
 
+from product.catalog import refresh_catalog_products
 from product.models import Category, Product, Offer, Feedback
 from shop.models import Seller
 from orders.models import Order, OrderItem
@@ -38,6 +39,9 @@ class ProductCatalogViewTest(TestCase):
         # --- отзывы к товарам
         set__feedback()
 
+        # --- проекция каталога (bulk_create не вызывает сигналы)
+        refresh_catalog_products()
+
     def test_url_exists_at_correct_location(self):
         """Тест на доступность страницы по url"""
         response = self.client.get(self.url)
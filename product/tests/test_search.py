@@ -0,0 +1,186 @@
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, SimpleTestCase, tag, override_settings
+from django.urls import reverse
+
+from product.catalog import refresh_catalog_products
+from product.models import Category, Product, ProductProperty, Property
+from product.search import get_search_backend, search_products, suggest_products
+from product.search import backends
+from product.search.backends import InMemorySearchBackend
+from product.search.index import InvertedIndex
+from product.search.stemmers import analyze, stem
+from product.views import ProductCatalogView
+
+
+@tag("search")
+class StemmerTest(SimpleTestCase):
+    """ Тесты выделения основ слов. """
+
+    def test_russian_word_forms(self):
+        """Тест, что формы русского слова имеют одну основу."""
+        for words in (('ноутбук', 'ноутбуки', 'ноутбука', 'ноутбуками'),
+                      ('игровой', 'игровые', 'игрового'),
+                      ('зарядка', 'зарядки', 'зарядку')):
+            with self.subTest(words=words):
+                self.assertEqual(len({stem(word) for word in words}), 1)
+
+    def test_english_word_forms(self):
+        """Тест, что формы английского слова имеют одну основу."""
+        for words in (('laptop', 'laptops'), ('battery', 'batteries'), ('connect', 'connected', 'connection')):
+            with self.subTest(words=words):
+                self.assertEqual(len({stem(word) for word in words}), 1)
+
+    def test_analyze(self):
+        """Тест разбиения текста на слова: регистр, «ё», цифры."""
+        self.assertEqual(analyze('Жёсткий диск 512GB, SSD!'), [stem('жесткий'), stem('диск'), '512gb', 'ssd'])
+
+
+@tag("search")
+class InvertedIndexTest(SimpleTestCase):
+    """ Тесты инвертированного индекса. """
+
+    def setUp(self):
+        self.index = InvertedIndex({'name': 3, 'description': 1})
+        self.index.add(1, {'name': 'Игровой ноутбук', 'description': 'Быстрый процессор'}, 'Игровой ноутбук')
+        self.index.add(2, {'name': 'Процессор', 'description': 'Подходит для игровых ноутбуков'}, 'Процессор')
+        self.index.add(3, {'name': 'Мышь', 'description': 'Беспроводная'}, 'Мышь')
+
+    def test_ranking_by_field_weight(self):
+        """Тест, что совпадение в наименовании ранжируется выше совпадения в описании."""
+        self.assertEqual([doc_id for doc_id, _ in self.index.search('ноутбуки')], [1, 2])
+        self.assertEqual([doc_id for doc_id, _ in self.index.search('процессоры')], [2, 1])
+
+    def test_all_words_required(self):
+        """Тест, что документ должен содержать все слова запроса."""
+        self.assertEqual([doc_id for doc_id, _ in self.index.search('игровой мышь')], [])
+        self.assertEqual([doc_id for doc_id, _ in self.index.search('беспроводная мышь')], [3])
+
+    def test_prefix(self):
+        """Тест поиска последнего слова запроса по префиксу."""
+        self.assertEqual([doc_id for doc_id, _ in self.index.search('ноут')], [1, 2])
+        self.assertEqual(self.index.search('ноут', prefix=False), [])
+
+    def test_update_and_remove(self):
+        """Тест замены и удаления документов."""
+        self.index.add(3, {'name': 'Ноутбук офисный'}, 'Ноутбук офисный')
+        self.assertEqual(self.index.search('мышь'), [])
+        self.assertIn(3, [doc_id for doc_id, _ in self.index.search('ноутбук')])
+
+        self.index.remove(1)
+        self.assertEqual(len(self.index), 2)
+        self.assertEqual(self.index.search('игровой ноутбук', prefix=False)[0][0], 2)
+
+
+@tag("search")
+@override_settings(CACHES=settings.TEST_CACHES)
+class ProductSearchTest(TestCase):
+    """ Тесты поиска товаров. """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Ноутбуки')
+        cls.laptop = Product.objects.create(name='Игровой ноутбук', description='Ноутбук для игр',
+                                            category=category)
+        cls.mouse = Product.objects.create(name='Мышь', description='Мышь для игровых ноутбуков',
+                                           category=category)
+        cls.tablet = Product.objects.create(name='Планшет', description='Планшет', category=category)
+        color = Property.objects.create(name='Цвет')
+        ProductProperty.objects.create(product=cls.tablet, property=color, value='Красный')
+        refresh_catalog_products()
+
+    def setUp(self):
+        get_search_backend().rebuild()
+
+    def test_search_products(self):
+        """Тест поиска по наименованию, описанию и значениям свойств."""
+        self.assertEqual(search_products('ноутбуки'), [self.laptop.id, self.mouse.id])
+        self.assertEqual(search_products('красный'), [self.tablet.id])
+        self.assertEqual(search_products('телевизор'), [])
+
+    def test_incremental_update(self):
+        """Тест обновления индекса при изменении товара и свойства товара."""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tablet.name = 'Планшет для игр'
+            self.tablet.save()
+        self.assertIn(self.tablet.id, search_products('игры'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductProperty.objects.filter(product=self.tablet).delete()
+        self.assertEqual(search_products('красный'), [])
+
+    def test_catalog_filter_by_title(self):
+        """Тест фильтрации каталога по строке поиска с сортировкой по релевантности."""
+        response = self.client.get(reverse('catalog-view') + '?title=ноутбук')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item.id for item in response.context['catalog']], [self.laptop.id, self.mouse.id])
+
+    def test_catalog_cursor_by_relevance(self):
+        """Тест, что постраничный вывод результатов поиска по курсору сохраняет сортировку по релевантности."""
+        ranked = [self.tablet.id, self.mouse.id, self.laptop.id]
+        result, cursor = [], ''
+        with mock.patch('product.services.search_products', return_value=ranked), \
+                mock.patch.object(ProductCatalogView, 'paginate_by', 2):
+            while True:
+                response = self.client.get(reverse('catalog-view') + f'?title=товар&cursor={cursor}')
+                page = response.context['page_obj']
+                result.extend(item.id for item in page)
+                if not page.has_next():
+                    break
+                cursor = page.next_cursor
+        self.assertEqual(result, ranked)
+
+    def test_suggest(self):
+        """Тест подсказок автодополнения."""
+        self.assertEqual(suggest_products('пла'), [(self.tablet.id, 'Планшет')])
+        response = self.client.get(reverse('search-suggest') + '?title=ноу')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.json()['results']], [self.laptop.id, self.mouse.id])
+
+
+@tag("search")
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                       'LOCATION': 'search-tests'}})
+class SearchIndexSyncTest(TestCase):
+    """ Тесты согласования поисковых индексов разных процессов. """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Ноутбуки')
+        cls.laptop = Product.objects.create(name='Игровой ноутбук', description='Ноутбук', category=category)
+        cls.tablet = Product.objects.create(name='Планшет', description='Планшет', category=category)
+
+    def setUp(self):
+        cache.clear()
+        # индексы двух процессов
+        self.first, self.second = InMemorySearchBackend(), InMemorySearchBackend()
+        self.first.rebuild()
+        self.second.search('ноутбук')
+
+    def test_fresh_index_does_not_query_database(self):
+        """Тест, что актуальность индекса проверяется по версии в кеше без запросов к БД."""
+        with self.assertNumQueries(0):
+            self.assertEqual(self.first.search('ноутбук'), self.second.search('ноутбук'))
+
+    def test_changes_applied_incrementally(self):
+        """Тест, что изменения другого процесса применяются к индексу без полного перестроения."""
+        Product.objects.filter(id=self.tablet.id).update(name='Игровой планшет')
+        self.second.index_products([self.tablet.id])
+        Product.objects.filter(id=self.laptop.id).delete()
+        self.second.remove_products([self.laptop.id])
+
+        with mock.patch.object(backends, 'load_documents', wraps=backends.load_documents) as load:
+            self.assertEqual([doc_id for doc_id, _ in self.first.search('игровой')], [self.tablet.id])
+        load.assert_called_once()
+        self.assertEqual(sorted(load.call_args[0][0]), sorted([self.tablet.id, self.laptop.id]))
+
+    def test_missing_changes_rebuild_index(self):
+        """Тест, что при недоступном журнале изменений индекс перестраивается целиком."""
+        Product.objects.filter(id=self.tablet.id).update(name='Игровой планшет')
+        self.second.index_products([self.tablet.id])
+        cache.delete(InMemorySearchBackend._changes_key(cache.get(backends.SEARCH_VERSION_KEY)))
+        with mock.patch.object(backends, 'load_documents', wraps=backends.load_documents) as load:
+            self.assertEqual(len(self.first.search('игровой')), 2)
+        load.assert_called_once_with()
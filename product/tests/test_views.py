@@ -4,7 +4,8 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Permission
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import (
-    TestCase
+    TestCase,
+    override_settings,
     # RequestFactory,
 )
 
@@ -149,6 +150,7 @@ class TestUploadFileView(SettingsTest):
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
 
+    @override_settings(IMPORT_ASYNC=False)
     def test_post_upload_file(self):
         self.client.login(email='test1@test.ru', password='test1234')
         file_json = SimpleUploadedFile(
@@ -6,7 +6,10 @@ from product.views import (
     FeedbackDetailView,
     HistoryViewsView,
     ProductCatalogView,
-    UploadProductFileView
+    ProductSearchSuggestView,
+    UploadProductFileView,
+    ImportJobDetailView,
+    ImportJobStatusView,
 )
 
 
@@ -16,6 +19,9 @@ urlpatterns = [
     path('category/', CategoryView.as_view(), name='category'),
     path('offer/<int:pk>/', FeedbackDetailView.as_view(), name='offer-detail'),
     path('catalog/', ProductCatalogView.as_view(), name='catalog-view'),
+    path('search/suggest/', ProductSearchSuggestView.as_view(), name='search-suggest'),
     path('history_view/', HistoryViewsView.as_view(), name='history_view'),
     path('upload_file/', UploadProductFileView.as_view(), name='upload_file'),
+    path('import/<int:pk>/', ImportJobDetailView.as_view(), name='import-job'),
+    path('import/<int:pk>/status/', ImportJobStatusView.as_view(), name='import-job-status'),
 ]
@@ -1,11 +1,10 @@
 from random import randint
 
 from django.contrib.auth.mixins import PermissionRequiredMixin
-from django.http import HttpResponse
-import datetime
+from django.core.paginator import InvalidPage
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import render, redirect  # noqa F401
 from django.views import generic
-from django.core.cache import cache
 from django.urls import reverse
 from django.db.models import Prefetch
 from django.conf import settings
@@ -13,7 +12,6 @@ from django.conf import settings
 from .forms import FeedbackForm, UploadProductFileJsonForm
 from shop.models import Seller
 
-from config.settings_local import CACHE_STORAGE_BANNERS_TIME
 from product.models import (
     Product,
     Category,
@@ -23,6 +21,7 @@ from product.models import (
     Feedback,
     ProductImage,
     LoggingImportFileModel,
+    ImportJob,
 )
 
 from product.services import (
@@ -30,14 +29,20 @@ from product.services import (
     get_queryset_for_category,
     apply_filter_to_catalog,
     apply_sorting_to_catalog,
-    get_banners,
+    CATALOG_SORT_FIELDS,
+    get_catalog_products,
     ImageView,
-    get_favorite_categories,
-    get_popular_products,
-    get_limited_edition,
     upload_product_file,
 )
-from promotions.models import Promo2Product
+from product.facets import get_catalog_facets, get_seller_list
+from product.home_blocks import get_home_context
+from product.search import suggest_products
+from product.import_jobs import create_import_job, enqueue_import_job, get_job_status
+from product.catalog_cache import canonical_params, catalog_cache_key, get_cached_page, set_cached_page
+from shop.memo import get_instance
+from product.pagination import CURSOR_PARAM, CachedPagePaginator, CursorPaginator, is_cursor_mode
+from promotions.index import get_promotion_index
+from promotions.pricing import annotate_promo_prices, get_promo_prices
 
 
 class ProductDetailView(generic.DetailView, generic.CreateView):
@@ -69,9 +74,7 @@ class CategoryView(generic.ListView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        categories_list = Category.objects.all()
-        cached_data = cache.get_or_set("categories", categories_list, settings.CACHE_STORAGE_TIME)
-        context['categories'] = cached_data
+        context['categories'] = get_category(active_only=False)
         return context
 
 
@@ -87,36 +90,33 @@ class FeedbackDetailView(generic.DetailView, generic.CreateView):
     def get_success_url(self):
         return reverse('offer-detail', kwargs={'pk': self.kwargs['pk']})
 
+    def get_object(self, queryset=None):
+        """Предложение загружается один раз за запрос: при отображении и при сохранении отзыва."""
+        try:
+            return get_instance(Offer, self.kwargs['pk'])
+        except Offer.DoesNotExist:
+            raise Http404
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['offers'] = Offer.objects.filter(id=self.kwargs['pk'])
+        # при ошибке в форме отзыва self.object не задан
+        offer = get_instance(Offer, self.kwargs['pk'])
+        context['offers'] = [offer]
         context['categories'] = get_category()
-        context['drawing'] = ImageView.get_image(product_id=Offer.objects.get(id=self.kwargs['pk']).product_id)
-        context['product_image'] = ProductImage.objects.filter(
-            product=Offer.objects.get(id=self.kwargs['pk']).product
-        ).first()
-        context['feedback'] = Feedback.objects.filter(offer=Offer.objects.get(id=self.kwargs['pk']))
-        context['all_property'] = ProductProperty.objects.filter(
-            product=Offer.objects.get(id=self.kwargs['pk']).product
-        )
+        context['drawing'] = ImageView.get_image(product_id=offer.product_id)
+        context['product_image'] = ProductImage.objects.filter(product_id=offer.product_id).first()
+        context['feedback'] = Feedback.objects.filter(offer=offer)
+        context['all_property'] = ProductProperty.objects.filter(product_id=offer.product_id)
         if self.request.user.is_authenticated:
-            histiry_view_list = HistoryView.objects.filter(offer=Offer.objects.get(id=self.kwargs['pk']),
-                                                           user=self.request.user)
-            print(self.request.user)
-            if histiry_view_list:
-                history_old = HistoryView.objects.get(offer=Offer.objects.get(id=self.kwargs['pk']))
+            history_old = HistoryView.objects.filter(offer=offer, user=self.request.user).first()
+            if history_old is not None:
                 history_old.save(update_fields=['view_at'])
             else:
-                history_new = HistoryView(offer=self.object, user=self.request.user)
+                history_new = HistoryView(offer=offer, user=self.request.user)
                 history_new.save()
-        promo_list = Promo2Product.objects.filter(product=Offer.objects.get(id=self.kwargs['pk']).product)
-        price = Offer.objects.get(id=self.kwargs['pk']).price
-        for elem in promo_list:
-            if elem.promo.discount:
-                price = price / 100 * (100 - elem.promo.discount)
-            if elem.promo.fix_discount:
-                price -= elem.promo.fix_discount
-        context['promo'] = price
+        product_id = offer.product_id
+        promo_list = get_promotion_index().promos_for_product(product_id)
+        context['promo'] = get_promo_prices(product_id).get(int(self.kwargs['pk']))
         context['promotion'] = promo_list
         return context
 
@@ -150,27 +150,9 @@ class MainPageView(generic.TemplateView):
         # получает список категорий
         context['categories'] = get_category()
 
-        # получает список баннеров
-        cached_data = cache.get_or_set('banners',
-                                       get_banners(),
-                                       CACHE_STORAGE_BANNERS_TIME)
-        context['banners'] = cached_data
-
-        # получает список избранных категорий
-        context['favorite'] = get_favorite_categories()
-
-        # получает список популярных товаров
-        context['popular'] = get_popular_products()
-
-        # передает дату, до которой действует предложение дня
-        next_day = datetime.datetime.today() + datetime.timedelta(days=1)
-        next_day = next_day.strftime('%d.%m.%Y')
-        context['next_day'] = next_day
-
-        # получает предложение дня и список товаров ограниченного тиража
-        day_offer, limited = get_limited_edition()
-        context['day_offer'] = day_offer
-        context['limited'] = limited
+        # баннеры, избранные категории, популярные товары, предложение дня и товары ограниченного тиража
+        # берутся из кеша блоков главной страницы
+        context.update(get_home_context())
 
         return context
 
@@ -187,19 +169,15 @@ class ProductCatalogView(generic.ListView):
         context = super().get_context_data(**kwargs)
         context['categories'] = get_category()
         context['current_category'] = self.request.GET.get('category', '')
-        seller_list = Seller.objects.all()
-        seller_cached = cache.get_or_set('seller_cache', seller_list, settings.CACHE_STORAGE_TIME)
-        context['sellers'] = seller_cached
+        context['sellers'] = get_seller_list()
+        context['facets'] = get_catalog_facets(self.request)
+
+        # акции товаров страницы и цены со скидкой для карточек
+        annotate_promo_prices(context['catalog'])
 
         return context
 
     def get_queryset(self):
-        query_param = [f"{key}={value}" for key, value in self.request.GET.items() if key != 'page']
-        if query_param:
-            cache_key_2 = ''.join(query_param)
-        else:
-            cache_key_2 = 'blank'
-
         # get queryset for selected category
         queryset = get_queryset_for_category(request=self.request)
 
@@ -211,9 +189,53 @@ class ProductCatalogView(generic.ListView):
         sorted_queryset = apply_sorting_to_catalog(request=self.request,
                                                    queryset=filtered_queryset)
 
-        cached_data = cache.get_or_set(cache_key_2, sorted_queryset, settings.CACHE_STORAGE_TIME)
-
-        return cached_data
+        return sorted_queryset
+
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Постраничный вывод каталога.
+        По курсору - без OFFSET и без полного COUNT(*),
+        по номеру страницы - с кешированием id товаров страницы и общего кол-ва товаров.
+        """
+        if is_cursor_mode(self.request, settings.CATALOG_PAGINATION_MODE):
+            sort_field = CATALOG_SORT_FIELDS.get(self.request.GET.get('sort'))
+            # результаты поиска без выбранной сортировки выводятся по релевантности, как в apply_sorting_to_catalog
+            if sort_field is None and 'search_rank' in queryset.query.annotations:
+                sort_field = 'search_rank'
+            paginator = CursorPaginator(queryset, page_size, sort_field=sort_field,
+                                        count_limit=settings.PAGINATION_APPROXIMATE_COUNT_LIMIT)
+            page = paginator.page(self.request.GET.get(CURSOR_PARAM))
+            return paginator, page, page.object_list, page.has_other_pages()
+
+        page_number = self.request.GET.get(self.page_kwarg) or 1
+        if not str(page_number).isdigit() or int(page_number) > settings.CATALOG_CACHE_MAX_PAGE:
+            return super().paginate_queryset(queryset, page_size)
+
+        cache_key = catalog_cache_key(canonical_params(self.request.GET), int(page_number))
+        cached_page = get_cached_page(cache_key)
+        if cached_page is None:
+            result = super().paginate_queryset(queryset, page_size)
+            paginator, page = result[0], result[1]
+            set_cached_page(cache_key, [item.id for item in page.object_list], paginator.count)
+            return result
+
+        paginator = CachedPagePaginator(get_catalog_products(cached_page['ids']), page_size,
+                                        count=cached_page['count'])
+        try:
+            page = paginator.page(page_number)
+        except InvalidPage as ex:
+            raise Http404(str(ex))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+
+class ProductSearchSuggestView(generic.View):
+    """Подсказки автодополнения строки поиска товаров в формате JSON."""
+
+    def get(self, request, *args, **kwargs):
+        query = request.GET.get('title', '').strip()
+        products = suggest_products(query) if query else []
+        return JsonResponse({'results': [{'id': pk, 'name': name, 'url': reverse('product-detail', args=[pk])}
+                                         for pk, name in products]})
 
 
 class UploadProductFileView(PermissionRequiredMixin, generic.FormView):
@@ -238,12 +260,18 @@ class UploadProductFileView(PermissionRequiredMixin, generic.FormView):
             seller = Seller.objects.get(user=self.request.user)
             file_name = f'{randint(1, 9999)}_{file.name}'
 
+            if settings.IMPORT_ASYNC:
+                job = create_import_job(seller=seller, file=file, file_name=file_name)
+                enqueue_import_job(job)
+                return redirect('import-job', pk=job.pk)
+
             try:
-                upload_product_file(file=file, seller=seller, file_name=file_name)
+                stats = upload_product_file(file=file, seller=seller, file_name=file_name)
                 get_logger_error = LoggingImportFileModel.objects.filter(file_name=file_name, seller=seller)
 
                 if get_logger_error:
                     return render(self.request, 'product/logger_error.html', {'logger_error': get_logger_error,
+                                                                              'stats': stats,
                                                                               'categories': get_category()})
                 return redirect('catalog-view')
             except (TypeError, ValueError) as ex:
@@ -257,3 +285,31 @@ class UploadProductFileView(PermissionRequiredMixin, generic.FormView):
                                                                                  'categories': get_category()})
         form.add_error(None, 'Кодировка файла должна быть формата JSON')
         return render(self.request, 'product/upload_file.html', context={'form': form, 'categories': get_category()})
+
+
+class ImportJobDetailView(PermissionRequiredMixin, generic.DetailView):
+    """Страница состояния фонового импорта файла"""
+
+    template_name = 'product/import_job.html'
+    permission_required = ('product.add_product', )
+    context_object_name = 'job'
+
+    def handle_no_permission(self):
+        return HttpResponse('Нет доступа')
+
+    def get_queryset(self):
+        return ImportJob.objects.filter(seller__user=self.request.user)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['categories'] = get_category()
+        context['logger_error'] = LoggingImportFileModel.objects.filter(
+            file_name=self.object.file_name, seller=self.object.seller)[:settings.IMPORT_JOB_ERRORS_SHOWN]
+        return context
+
+
+class ImportJobStatusView(ImportJobDetailView):
+    """Состояние фонового импорта файла в формате JSON"""
+
+    def render_to_response(self, context, **response_kwargs):
+        return JsonResponse(get_job_status(self.object))
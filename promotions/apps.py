@@ -6,3 +6,6 @@ class PromotionsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "promotions"
     verbose_name = _('акции и скидки')
+
+    def ready(self):
+        import promotions.signals  # noqa: F401
@@ -0,0 +1,131 @@
+# Векторное вычисление скидок для множества товаров (цены на страницах списков товаров)
+from decimal import Decimal
+from typing import Iterable, List, Sequence
+
+import numpy as np
+
+from promotions.models import Promo
+
+# Коды типов акций, которые поддерживает векторный расчет (совпадают с DISCOUNT_HANDLERS)
+PRODUCT_DISCOUNT = 1
+FREE_PRODUCT = 3
+AMOUNT_DISCOUNT = 4
+CART_DISCOUNT = 5
+
+
+def to_cents(values: Iterable) -> np.ndarray:
+    """
+    Переводит денежные значения (Decimal, str, int) в копейки.
+    :param values: значения с точностью до копейки
+    :return: массив int64
+    """
+    return np.rint(np.asarray(list(values), dtype=np.float64) * 100).astype(np.int64)
+
+
+def from_cents(cents: np.ndarray) -> List[Decimal]:
+    """
+    Переводит копейки в Decimal с двумя знаками после запятой.
+    :param cents: массив копеек
+    :return: список значений
+    """
+    return [Decimal(int(value)).scaleb(-2) for value in cents]
+
+
+def _percent(amount: np.ndarray, percent: np.ndarray) -> np.ndarray:
+    """Процент от суммы в копейках с округлением половины копейки вверх, как ROUND_HALF_UP для Decimal."""
+    return (amount * percent + 50) // 100
+
+
+def calculate_discounts(codes: np.ndarray, prices: np.ndarray, quantities: np.ndarray, discounts: np.ndarray,
+                        fix_discounts: np.ndarray, promo_quantities: np.ndarray) -> np.ndarray:
+    """
+    Вычисляет скидки по правилам обработчиков DISCOUNT_HANDLERS для массивов позиций.
+    Все денежные значения в копейках, результат совпадает со скалярными обработчиками,
+    округленными до копейки. Условие акции на всю корзину (код 5) проверяется вызывающим кодом.
+    :param codes: коды типов акций
+    :param prices: цены единицы товара
+    :param quantities: кол-во единиц товара
+    :param discounts: размер скидки акции в процентах
+    :param fix_discounts: фиксированная сумма скидки акции
+    :param promo_quantities: кол-во единиц товара в акции
+    :return: скидки в копейках
+    """
+    codes, prices, quantities, discounts, fix_discounts, promo_quantities = (
+        np.asarray(array, dtype=np.int64)
+        for array in (codes, prices, quantities, discounts, fix_discounts, promo_quantities))
+    amount = prices * quantities
+    percent = _percent(amount, discounts)
+    has_percent = discounts != 0
+    has_fix = fix_discounts != 0
+    enough = quantities >= promo_quantities
+    free_items = np.where((promo_quantities == 0) | (quantities <= promo_quantities), 0,
+                          quantities // (promo_quantities + 1))
+
+    conditions = [
+        (codes == PRODUCT_DISCOUNT) & has_percent,
+        (codes == PRODUCT_DISCOUNT) & has_fix,
+        codes == FREE_PRODUCT,
+        (codes == AMOUNT_DISCOUNT) & enough & has_percent,
+        (codes == AMOUNT_DISCOUNT) & enough & has_fix,
+        (codes == CART_DISCOUNT) & has_percent,
+    ]
+    choices = [percent, fix_discounts * quantities, free_items * prices, percent, fix_discounts, percent]
+    return np.select(conditions, choices, default=0)
+
+
+def promo_params(promos: Sequence[Promo]) -> dict:
+    """
+    Собирает параметры акций в массивы.
+    :param promos: акции с загруженными типами
+    :return: массивы кодов, процентов, фиксированных скидок в копейках и кол-ва единиц товара
+    """
+    return {
+        'codes': np.array([promo.promo_type.code for promo in promos], dtype=np.int64),
+        'discounts': np.array([promo.discount for promo in promos], dtype=np.int64),
+        'fix_discounts': to_cents(promo.fix_discount for promo in promos),
+        'promo_quantities': np.array([promo.quantity for promo in promos], dtype=np.int64),
+    }
+
+
+def best_discounts(prices: np.ndarray, quantities: np.ndarray, promos_by_item: Sequence[Sequence[Promo]]) \
+        -> np.ndarray:
+    """
+    Вычисляет для каждой позиции наибольшую скидку по ее акциям.
+    Скидки всех пар (позиция, акция) вычисляются одним векторным расчетом.
+    :param prices: цены единицы товара в копейках
+    :param quantities: кол-во единиц товара
+    :param promos_by_item: акции каждой позиции
+    :return: скидки в копейках
+    """
+    prices = np.asarray(prices, dtype=np.int64)
+    quantities = np.broadcast_to(np.asarray(quantities, dtype=np.int64), prices.shape)
+    best = np.zeros(len(prices), dtype=np.int64)
+
+    promos = {}
+    for item_promos in promos_by_item:
+        for promo in item_promos:
+            promos.setdefault(promo.id, (len(promos), promo))
+    if not promos:
+        return best
+    params = promo_params([promo for _, promo in promos.values()])
+
+    counts = np.array([len(item_promos) for item_promos in promos_by_item], dtype=np.int64)
+    items = np.repeat(np.arange(len(prices)), counts)
+    indexes = np.array([promos[promo.id][0] for item_promos in promos_by_item for promo in item_promos],
+                       dtype=np.int64)
+    discounts = calculate_discounts(params['codes'][indexes], prices[items], quantities[items],
+                                    params['discounts'][indexes], params['fix_discounts'][indexes],
+                                    params['promo_quantities'][indexes])
+    np.maximum.at(best, items, discounts)
+    return best
+
+
+def discounted_prices(prices: Sequence, promos_by_item: Sequence[Sequence[Promo]]) -> List[Decimal]:
+    """
+    Вычисляет цены единицы товаров после наибольшей скидки для вывода в списках товаров.
+    :param prices: цены товаров
+    :param promos_by_item: акции каждого товара
+    :return: цены со скидкой, не меньше нуля
+    """
+    cents = to_cents(prices)
+    return from_cents(np.maximum(cents - best_discounts(cents, 1, promos_by_item), 0))
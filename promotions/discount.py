@@ -1,19 +1,18 @@
 from decimal import Decimal
-from django.db.models import Q, QuerySet
+from typing import List
 
+from promotions.index import get_promotion_index
 from promotions.models import Promo
 
 
-def promos_for_product(product_id: int) -> QuerySet:
+def promos_for_product(product_id: int) -> List[Promo]:
     """
-    Возвращает список акций, в которых участвует товар.
+    Возвращает список акций, в которых участвует товар, включая акции на всю корзину.
     :param product_id: id товара
     :return:
     """
-    promo_list = Promo.objects.filter(is_active=True).\
-        filter(Q(promo2products__product=product_id) | Q(promo_type__code=5))
-
-    return promo_list
+    index = get_promotion_index()
+    return index.promos_for_product(product_id) + index.cart_promos()
 
 
 def is_full_cart_discount(qty: int, total_price: Decimal, promo: Promo) -> bool:
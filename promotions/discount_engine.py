@@ -0,0 +1,54 @@
+# Пакетное вычисление скидок для всех товаров корзины
+from decimal import Decimal
+from typing import Dict, Iterable, List, Tuple
+
+from product.models import Offer
+from promotions.discount import is_full_cart_discount
+from promotions.discount_handlers import DISCOUNT_HANDLERS
+from promotions.index import get_promotion_index
+from promotions.models import Promo
+
+
+def load_cart_promotions(offer_ids: Iterable[str]) -> Tuple[Dict[str, int], Dict[int, List[Promo]], List[Promo]]:
+    """
+    Загружает одним запросом товары предложений корзины, акции берутся из индекса акций.
+    :param offer_ids: id предложений корзины
+    :return: кортеж (id товара по id предложения, акции по id товара, акции на всю корзину)
+    """
+    product_ids = {str(offer_id): product_id for offer_id, product_id in
+                   Offer.objects.filter(id__in=[int(offer_id) for offer_id in offer_ids])
+                   .values_list('id', 'product_id')}
+    if not product_ids:
+        return {}, {}, []
+
+    promos_by_product, cart_promos = get_promotion_index().promos_for_cart(product_ids.values())
+    return product_ids, promos_by_product, cart_promos
+
+
+def calculate_cart_discounts(lines: Dict[str, dict]) -> Dict[str, Decimal]:
+    """
+    Вычисляет приоритетную (наибольшую) скидку для каждой позиции корзины.
+    Данные загружаются фиксированным числом запросов, скидки вычисляются в памяти.
+    Скидка на всю корзину применяется, если корзина удовлетворяет условиям акции.
+    :param lines: позиции корзины {id предложения: {'price': ..., 'quantity': ...}}
+    :return: скидка по id предложения
+    """
+    product_ids, promos_by_product, cart_promos = load_cart_promotions(lines.keys())
+
+    qty = len(lines)
+    total_price = sum(Decimal(item['price']) * item['quantity'] for item in lines.values())
+    applicable_cart_promos = [promo for promo in cart_promos
+                              if is_full_cart_discount(qty=qty, total_price=total_price, promo=promo)]
+
+    discounts = {}
+    for offer_id, item in lines.items():
+        product_id = product_ids.get(str(offer_id))
+        best = Decimal(0)
+        if product_id is not None:
+            promos = promos_by_product.get(product_id, []) + applicable_cart_promos
+            for promo in promos:
+                handler = DISCOUNT_HANDLERS.get(promo.promo_type.code)
+                if handler is not None:
+                    best = max(best, handler(item, promo))
+        discounts[offer_id] = best
+    return discounts
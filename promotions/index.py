@@ -0,0 +1,308 @@
+# Индекс действующих акций: id товара -> акции, отдельно акции на всю корзину
+import datetime
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.core.cache import cache
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+
+from promotions.models import Promo, Promo2Product, PromoType
+from shop.cache import model_instances, model_row
+
+# Код типа акции "На всю корзину"
+CART_PROMO_CODE = 5
+
+PROMO_INDEX_KEY = 'promotions:index'
+PROMO_INDEX_VERSION_KEY = 'promotions:index:version'
+# Блокировка изменения снимка индекса в кеше: время жизни и время ожидания, секунд
+PROMO_INDEX_LOCK_KEY = 'promotions:index:lock'
+PROMO_INDEX_LOCK_TIMEOUT = 30
+PROMO_INDEX_LOCK_WAIT = 5
+LOCK_POLL_INTERVAL = 0.05
+
+# Время хранения заранее построенного снимка индекса
+PREWARMED_TIMEOUT = 60 * 60 * 24 * 2
+
+
+def current_promos(day: Optional[datetime.date] = None, scheduled: bool = False) -> QuerySet:
+    """
+    Возвращает акции, действующие в заданный день, с их типами.
+    :param day: день, по умолчанию сегодня
+    :param scheduled: включать неактивные акции, начинающиеся в этот день - их активирует планировщик акций
+        (отключенные администратором акции, начавшиеся раньше, не включаются)
+    :return: queryset акций
+    """
+    day = day or timezone.localdate()
+    active = Q(is_active=True)
+    if scheduled:
+        active |= Q(is_active=False, started=day)
+    return Promo.objects.filter(active, finished__gte=day).filter(
+        Q(started__isnull=True) | Q(started__lte=day)).select_related('promo_type')
+
+
+def _current_promos(promo_ids: Optional[Iterable[int]] = None, day: Optional[datetime.date] = None,
+                    scheduled: bool = False) -> List[Promo]:
+    """
+    Загружает действующие акции.
+    :param promo_ids: id акций, если не заданы - все акции
+    :param day: день, по умолчанию сегодня
+    :param scheduled: включать акции, которые будут активированы планировщиком
+    :return: список акций
+    """
+    promos = current_promos(day, scheduled)
+    if promo_ids is not None:
+        promos = promos.filter(id__in=list(promo_ids))
+    return list(promos)
+
+
+def _promo_links(promo_ids: Iterable[int]) -> Dict[int, List[int]]:
+    """
+    Загружает товары акций одним запросом.
+    :param promo_ids: id акций
+    :return: id товаров по id акции
+    """
+    links = defaultdict(list)
+    for promo_id, product_id in Promo2Product.product.through.objects.filter(
+            promo2product__promo_id__in=list(promo_ids)).values_list('promo2product__promo_id', 'product_id'):
+        links[promo_id].append(product_id)
+    return links
+
+
+def _add_promos(snapshot: dict, promos: List[Promo]) -> None:
+    """Добавляет акции и их товары в снимок индекса; акции и их типы хранятся кортежами значений полей."""
+    links = _promo_links(promo.id for promo in promos if promo.promo_type.code != CART_PROMO_CODE)
+    for promo in promos:
+        snapshot['promos'][promo.id] = model_row(promo)
+        snapshot['types'][promo.promo_type_id] = model_row(promo.promo_type)
+        if promo.promo_type.code == CART_PROMO_CODE:
+            snapshot['cart'].append(promo.id)
+            continue
+        for product_id in links.get(promo.id, []):
+            if promo.id not in snapshot['products'].setdefault(product_id, []):
+                snapshot['products'][product_id].append(promo.id)
+    snapshot['cart'].sort()
+    for promo_ids in snapshot['products'].values():
+        promo_ids.sort()
+
+
+def _remove_promos(snapshot: dict, promo_ids: Iterable[int]) -> None:
+    """Удаляет акции из снимка индекса."""
+    promo_ids = set(promo_ids)
+    for promo_id in promo_ids:
+        snapshot['promos'].pop(promo_id, None)
+    snapshot['cart'] = [promo_id for promo_id in snapshot['cart'] if promo_id not in promo_ids]
+    for product_id in list(snapshot['products']):
+        remaining = [promo_id for promo_id in snapshot['products'][product_id] if promo_id not in promo_ids]
+        if remaining:
+            snapshot['products'][product_id] = remaining
+        else:
+            del snapshot['products'][product_id]
+
+
+def build_snapshot(day: Optional[datetime.date] = None, scheduled: bool = False) -> dict:
+    """
+    Строит снимок индекса акций по данным БД.
+    :param day: день, на который строится индекс, по умолчанию сегодня
+    :param scheduled: включать акции, которые будут активированы планировщиком
+    :return: снимок: дата построения, акции и типы акций по id, id акций по id товара, id акций на всю корзину
+    """
+    day = day or timezone.localdate()
+    snapshot = {'date': day, 'promos': {}, 'types': {}, 'products': {}, 'cart': []}
+    _add_promos(snapshot, _current_promos(day=day, scheduled=scheduled))
+    return snapshot
+
+
+def prewarmed_key(day: datetime.date) -> str:
+    return f'{PROMO_INDEX_KEY}:{day.isoformat()}'
+
+
+def promo_instances(snapshot: dict) -> Dict[int, Promo]:
+    """
+    Восстанавливает акции снимка индекса с их типами без обращения к БД.
+    :param snapshot: снимок индекса
+    :return: акции по id
+    """
+    types = {promo_type.pk: promo_type for promo_type in model_instances(PromoType, snapshot['types'].values())}
+    promos = {}
+    for promo in model_instances(Promo, snapshot['promos'].values()):
+        promo.promo_type = types[promo.promo_type_id]
+        promos[promo.pk] = promo
+    return promos
+
+
+def product_promos(snapshot: dict, product_id: int, promos: Optional[Dict[int, Promo]] = None) -> List[Promo]:
+    """
+    Возвращает акции на товар в снимке индекса.
+    :param snapshot: снимок индекса
+    :param product_id: id товара
+    :param promos: восстановленные акции снимка, по умолчанию восстанавливаются из снимка
+    :return: список акций
+    """
+    promos = promo_instances(snapshot) if promos is None else promos
+    return [promos[promo_id] for promo_id in snapshot['products'].get(product_id, [])]
+
+
+@contextmanager
+def _index_lock():
+    """
+    Блокировка изменения снимка индекса в кеше, общая для всех процессов.
+    Возвращает False, если блокировку не удалось получить за PROMO_INDEX_LOCK_WAIT секунд.
+    """
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + PROMO_INDEX_LOCK_WAIT
+    while not cache.add(PROMO_INDEX_LOCK_KEY, token, PROMO_INDEX_LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            yield False
+            return
+        time.sleep(LOCK_POLL_INTERVAL)
+    try:
+        yield True
+    finally:
+        if cache.get(PROMO_INDEX_LOCK_KEY) == token:
+            cache.delete(PROMO_INDEX_LOCK_KEY)
+
+
+def snapshot_products(snapshot: dict, promo_ids: Iterable[int]) -> Set[int]:
+    """
+    Возвращает товары акций в снимке индекса.
+    :param snapshot: снимок индекса
+    :param promo_ids: id акций
+    :return: id товаров
+    """
+    promo_ids = set(promo_ids)
+    return {product_id for product_id, ids in snapshot['products'].items() if promo_ids.intersection(ids)}
+
+
+class PromotionIndex:
+    """
+    Индекс действующих акций в памяти процесса.
+    Снимок индекса хранится в кеше вместе с версией, поэтому процессы строят его из БД
+    только если снимка в кеше нет, он устарел или наступила новая дата (начало или окончание акций).
+    В кеше хранятся значения полей акций, объекты акций восстанавливаются при загрузке снимка.
+    Изменения акций применяются к снимку частично: перечитываются только измененные акции;
+    процессы изменяют снимок по очереди под общей блокировкой в кеше.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._snapshot = None
+        self._promos = None
+        self._version = None
+
+    def _use(self, snapshot: dict, version: int) -> None:
+        self._snapshot, self._promos, self._version = snapshot, promo_instances(snapshot), version
+
+    def _store(self, snapshot: dict) -> None:
+        version = time.time_ns()
+        cache.set_many({PROMO_INDEX_KEY: {'version': version, 'snapshot': snapshot},
+                        PROMO_INDEX_VERSION_KEY: version}, None)
+        self._use(snapshot, version)
+
+    def _state(self) -> Tuple[dict, Dict[int, Promo]]:
+        """Возвращает актуальный снимок индекса и восстановленные акции снимка."""
+        version = cache.get(PROMO_INDEX_VERSION_KEY)
+        today = timezone.localdate()
+        snapshot, promos = self._snapshot, self._promos
+        if version is not None and version == self._version and snapshot['date'] == today:
+            return snapshot, promos
+        with self._lock:
+            stored = cache.get(PROMO_INDEX_KEY)
+            if stored and stored['version'] == version and stored['snapshot']['date'] == today:
+                self._use(stored['snapshot'], version)
+            else:
+                # в начале дня используется снимок, заранее построенный планировщиком акций
+                self._store(cache.get(prewarmed_key(today)) or build_snapshot())
+            return self._snapshot, self._promos
+
+    def snapshot(self) -> dict:
+        """Возвращает актуальный снимок индекса."""
+        return self._state()[0]
+
+    def promos_for_product(self, product_id: int) -> List[Promo]:
+        """
+        Возвращает акции на товар без акций на всю корзину.
+        :param product_id: id товара
+        :return: список акций
+        """
+        snapshot, promos = self._state()
+        return product_promos(snapshot, product_id, promos)
+
+    def promos_for_products(self, product_ids: Iterable[int]) -> Dict[int, List[Promo]]:
+        """
+        Возвращает акции на товары без акций на всю корзину.
+        :param product_ids: id товаров
+        :return: акции по id товара, товары без акций не включаются
+        """
+        return self.promos_for_cart(product_ids)[0]
+
+    def cart_promos(self) -> List[Promo]:
+        """Возвращает действующие акции на всю корзину."""
+        snapshot, promos = self._state()
+        return [promos[promo_id] for promo_id in snapshot['cart']]
+
+    def promos_for_cart(self, product_ids: Iterable[int]) -> Tuple[Dict[int, List[Promo]], List[Promo]]:
+        """
+        Возвращает по одному снимку индекса акции на товары корзины и акции на всю корзину.
+        :param product_ids: id товаров
+        :return: кортеж (акции по id товара, акции на всю корзину)
+        """
+        snapshot, promos = self._state()
+        return ({product_id: product_promos(snapshot, product_id, promos)
+                 for product_id in set(product_ids) if product_id in snapshot['products']},
+                [promos[promo_id] for promo_id in snapshot['cart']])
+
+    def update_promos(self, promo_ids: Iterable[int]) -> Set[int]:
+        """
+        Перечитывает из БД акции и их товары и обновляет снимок индекса.
+        Удаленные и недействующие акции исключаются из индекса. Если общую блокировку получить
+        не удалось, снимок строится заново из БД.
+        :param promo_ids: id измененных акций
+        :return: id товаров, акции которых изменились
+        """
+        promo_ids = set(promo_ids)
+        with self._lock, _index_lock() as locked:
+            current = self.snapshot()
+            affected = snapshot_products(current, promo_ids)
+            for product_ids in _promo_links(promo_ids).values():
+                affected.update(product_ids)
+            if locked:
+                snapshot = {'date': current['date'], 'promos': dict(current['promos']),
+                            'types': dict(current['types']),
+                            'products': {product_id: list(ids) for product_id, ids in current['products'].items()},
+                            'cart': list(current['cart'])}
+                _remove_promos(snapshot, promo_ids)
+                _add_promos(snapshot, _current_promos(promo_ids))
+            else:
+                snapshot = build_snapshot()
+            self._store(snapshot)
+        return affected | snapshot_products(snapshot, promo_ids)
+
+    def rebuild(self) -> None:
+        """Полностью перестраивает индекс."""
+        with self._lock:
+            self._store(build_snapshot())
+
+    @staticmethod
+    def prewarm(day: datetime.date) -> dict:
+        """
+        Заранее строит снимок индекса на заданный день с учетом акций, которые активирует планировщик.
+        Снимок используется процессами при смене даты вместо построения индекса из БД.
+        :param day: день
+        :return: снимок индекса
+        """
+        snapshot = build_snapshot(day, scheduled=True)
+        cache.set(prewarmed_key(day), snapshot, PREWARMED_TIMEOUT)
+        return snapshot
+
+
+_index = PromotionIndex()
+
+
+def get_promotion_index() -> PromotionIndex:
+    """Возвращает индекс акций процесса."""
+    return _index
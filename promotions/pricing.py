@@ -0,0 +1,131 @@
+# Цены предложений с учетом акций и их кеширование по версиям товаров
+import time
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from product.models import Offer
+from promotions.batch_discount import discounted_prices
+from promotions.index import get_promotion_index
+from promotions.models import Promo
+
+
+def _version_key(product_id: int) -> str:
+    return f'promo-price-version:{product_id}'
+
+
+def _price_key(product_id: int, version: int) -> str:
+    return f'promo-price:{product_id}:{version}'
+
+
+def apply_promos(price: Decimal, promos: List[Promo]) -> Decimal:
+    """
+    Вычисляет цену с учетом акций на товар.
+    :param price: цена предложения
+    :param promos: акции на товар
+    :return: цена со скидкой
+    """
+    for promo in promos:
+        if promo.discount:
+            price = price / 100 * (100 - promo.discount)
+        if promo.fix_discount:
+            price -= promo.fix_discount
+    return price
+
+
+def get_price_versions(product_ids: Iterable[int]) -> Dict[int, int]:
+    """
+    Возвращает версии цен товаров, отсутствующие версии создаются.
+    :param product_ids: id товаров
+    :return: версия по id товара
+    """
+    product_ids = set(product_ids)
+    stored = cache.get_many([_version_key(product_id) for product_id in product_ids])
+    versions = {product_id: stored.get(_version_key(product_id)) for product_id in product_ids}
+    missing = {_version_key(product_id): time.time_ns() for product_id, version in versions.items() if version is None}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update({product_id: missing[_version_key(product_id)]
+                         for product_id, version in versions.items() if version is None})
+    return versions
+
+
+def bump_price_versions(product_ids: Iterable[int], versions: Optional[Dict[int, int]] = None) -> None:
+    """
+    Обновляет версии цен товаров, цены с прежней версией становятся недоступны.
+    :param product_ids: id товаров
+    :param versions: заранее выбранные версии товаров (цены с ними уже рассчитаны)
+    """
+    versions = versions or {}
+    version = time.time_ns()
+    cache.set_many({_version_key(product_id): versions.get(product_id, version) for product_id in product_ids}, None)
+
+
+def calculate_promo_prices(product_ids: Iterable[int], promos_by_product: Dict[int, List[Promo]]) \
+        -> Dict[int, Dict[int, Decimal]]:
+    """
+    Вычисляет одним запросом цены предложений товаров с учетом акций.
+    :param product_ids: id товаров
+    :param promos_by_product: акции по id товара
+    :return: цены по id предложения для каждого товара
+    """
+    prices = defaultdict(dict)
+    for offer_id, product_id, price in Offer.objects.filter(product_id__in=list(product_ids)).\
+            values_list('id', 'product_id', 'price'):
+        prices[product_id][offer_id] = apply_promos(price, promos_by_product.get(product_id, []))
+    return prices
+
+
+def get_promo_prices(product_id: int) -> Dict[int, Decimal]:
+    """
+    Возвращает кешированные цены предложений товара с учетом акций.
+    :param product_id: id товара
+    :return: цена со скидкой по id предложения
+    """
+    version = get_price_versions([product_id])[product_id]
+    prices = cache.get(_price_key(product_id, version))
+    if prices is None:
+        promos = get_promotion_index().promos_for_products([product_id])
+        prices = calculate_promo_prices([product_id], promos).get(product_id, {})
+        cache.set(_price_key(product_id, version), prices, settings.PROMO_PRICE_CACHE_TIME)
+    return prices
+
+
+def warm_promo_prices(promos_by_product: Dict[int, List[Promo]], product_ids: Iterable[int]) -> Dict[int, int]:
+    """
+    Заранее рассчитывает и кеширует цены товаров с новыми версиями.
+    Версии начинают действовать после передачи в bump_price_versions.
+    :param promos_by_product: акции по id товара на момент начала действия цен
+    :param product_ids: id товаров
+    :return: новая версия по id товара
+    """
+    product_ids = list(product_ids)
+    version = time.time_ns()
+    prices = calculate_promo_prices(product_ids, promos_by_product)
+    cache.set_many({_price_key(product_id, version): prices.get(product_id, {}) for product_id in product_ids},
+                   settings.PROMO_PRICE_CACHE_TIME)
+    return {product_id: version for product_id in product_ids}
+
+
+def annotate_promo_prices(items: Iterable, price_attr: str = 'avg_price') -> list:
+    """
+    Добавляет товарам списка акции (promos) и цену с наибольшей скидкой (promo_price).
+    Скидки всех товаров вычисляются одним векторным расчетом.
+    :param items: товары страницы
+    :param price_attr: атрибут цены товара
+    :return: список товаров
+    """
+    items = list(items)
+    promos = get_promotion_index().promos_for_products(item.id for item in items)
+    for item in items:
+        item.promos = promos.get(item.id, [])
+        item.promo_price = None
+    priced = [item for item in items if item.promos and getattr(item, price_attr) is not None]
+    if priced:
+        prices = discounted_prices([getattr(item, price_attr) for item in priced], [item.promos for item in priced])
+        for item, price in zip(priced, prices):
+            item.promo_price = price
+    return items
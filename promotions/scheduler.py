@@ -0,0 +1,129 @@
+# Планировщик акций: активация и завершение акций по датам, подготовка кешей к началу акций
+import datetime
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from promotions.index import PREWARMED_TIMEOUT, get_promotion_index, prewarmed_key, product_promos, \
+    promo_instances, snapshot_products
+from promotions.models import Promo
+from promotions.pricing import bump_price_versions, warm_promo_prices
+from shop.cache import invalidate_tags
+
+
+# Ключ дня последнего запуска планировщика акций
+SCHEDULE_DAY_KEY = 'promo-schedule:last-day'
+
+
+def _pending_versions_key(day: datetime.date) -> str:
+    return f'promo-price-pending:{day.isoformat()}'
+
+
+def _stale_price_key(day: datetime.date, product_id: int) -> str:
+    return f'promo-price-stale:{day.isoformat()}:{product_id}'
+
+
+def drop_pending_prices(product_ids: Iterable[int]) -> None:
+    """
+    Отмечает заранее рассчитанные на завтра цены товаров устаревшими (изменились предложения товаров).
+    Подготовленный индекс акций от цен предложений не зависит и сохраняется.
+    :param product_ids: id товаров
+    """
+    tomorrow = timezone.localdate() + datetime.timedelta(days=1)
+    cache.set_many({_stale_price_key(tomorrow, product_id): True for product_id in product_ids}, PREWARMED_TIMEOUT)
+
+
+def _pending_versions(day: datetime.date) -> Dict[int, int]:
+    """Возвращает заранее рассчитанные версии цен на день, кроме цен, отмеченных устаревшими."""
+    versions = cache.get(_pending_versions_key(day)) or {}
+    stale = cache.get_many([_stale_price_key(day, product_id) for product_id in versions])
+    return {product_id: version for product_id, version in versions.items()
+            if _stale_price_key(day, product_id) not in stale}
+
+
+def drop_prewarmed() -> None:
+    """Сбрасывает заранее подготовленные на завтра индекс акций и цены, так как они не учитывают изменения."""
+    tomorrow = timezone.localdate() + datetime.timedelta(days=1)
+    cache.delete_many([prewarmed_key(tomorrow), _pending_versions_key(tomorrow)])
+
+
+def refresh_promotions(promo_ids: Iterable[int], versions: Optional[Dict[int, int]] = None) -> None:
+    """
+    Обновляет индекс акций, список действующих акций и версии цен товаров измененных акций.
+    :param promo_ids: id измененных акций
+    :param versions: версии цен, рассчитанные заранее
+    """
+    promo_ids = list(promo_ids)
+    product_ids = get_promotion_index().update_promos(promo_ids)
+    bump_price_versions(product_ids, versions)
+    invalidate_tags(f'promo:{promo_id}' for promo_id in promo_ids)
+    drop_prewarmed()
+
+
+def run_promo_schedule(today: Optional[datetime.date] = None) -> Dict[str, list]:
+    """
+    Активирует акции, дата начала которых наступила после предыдущего запуска, и завершает акции
+    с прошедшей датой окончания. Акция активируется один раз: действующая акция, отключенная
+    администратором, не включается снова. Повторный запуск в тот же день ничего не меняет.
+    :param today: текущая дата, по умолчанию сегодня
+    :return: id активированных и завершенных акций
+    """
+    today = today or timezone.localdate()
+    # если день предыдущего запуска неизвестен, активируются только акции, начинающиеся сегодня
+    since = cache.get(SCHEDULE_DAY_KEY) or today - datetime.timedelta(days=1)
+    with transaction.atomic():
+        to_activate = Promo.objects.select_for_update().filter(
+            is_active=False, started__gt=since, started__lte=today, finished__gte=today)
+        activated = list(to_activate.values_list('id', flat=True))
+        to_expire = Promo.objects.select_for_update().filter(is_active=True, finished__lt=today)
+        expired = list(to_expire.values_list('id', flat=True))
+        Promo.objects.filter(id__in=activated).update(is_active=True)
+        Promo.objects.filter(id__in=expired).update(is_active=False)
+    cache.set(SCHEDULE_DAY_KEY, max(since, today), None)
+
+    if activated or expired:
+        refresh_promotions(activated + expired, _pending_versions(today))
+    return {'activated': activated, 'expired': expired}
+
+
+def upcoming_promos(day: datetime.date) -> Iterable[int]:
+    """
+    Возвращает id акций, которые начнутся или завершатся с наступлением дня.
+    :param day: день
+    :return: id акций
+    """
+    starting = Q(is_active=False, started=day, finished__gte=day)
+    finishing = Q(is_active=True, finished=day - datetime.timedelta(days=1))
+    return Promo.objects.filter(starting | finishing).values_list('id', flat=True)
+
+
+def prewarm_promotions(now: Optional[datetime.datetime] = None) -> Dict[str, int]:
+    """
+    Заранее строит индекс акций и рассчитывает цены товаров на следующий день, если до его начала
+    осталось не больше PROMO_PREWARM_MINUTES. Рассчитываются цены только товаров,
+    акции которых начнутся или завершатся; в начале дня процессы используют готовые данные,
+    а не обращаются одновременно к БД.
+    :param now: текущее время, по умолчанию сейчас
+    :return: кол-во акций и товаров, для которых подготовлены данные
+    """
+    now = timezone.localtime(now)
+    day = now.date() + datetime.timedelta(days=1)
+    starts_at = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min), now.tzinfo)
+    if starts_at - now > datetime.timedelta(minutes=settings.PROMO_PREWARM_MINUTES):
+        return {'promos': 0, 'products': 0}
+    promo_ids = list(upcoming_promos(day))
+    if not promo_ids:
+        return {'promos': 0, 'products': 0}
+
+    index = get_promotion_index()
+    snapshot = index.prewarm(day)
+    product_ids = snapshot_products(index.snapshot(), promo_ids) | snapshot_products(snapshot, promo_ids)
+    promos = promo_instances(snapshot)
+    promos_by_product = {product_id: product_promos(snapshot, product_id, promos) for product_id in product_ids}
+    versions = warm_promo_prices(promos_by_product, product_ids)
+    cache.set(_pending_versions_key(day), versions, PREWARMED_TIMEOUT)
+    return {'promos': len(promo_ids), 'products': len(product_ids)}
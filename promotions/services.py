@@ -1,62 +1,84 @@
+import datetime
+from typing import List, Optional
+
 from django.conf import settings
 from django.core.paginator import Paginator
-from django.db.models import QuerySet, Avg
-from django.core.cache import cache
+from django.db.models import Avg, QuerySet
 from django.http import HttpRequest
+from django.utils import timezone
 from product.models import Product
+from product.pagination import CURSOR_PARAM, CursorPaginator, is_cursor_mode
+from promotions.index import current_promos
 from promotions.models import Promo
+from shop.cache import CacheNamespace, cached, model_instances, model_rows
+
+# Кеш списков действующих акций и товаров акций
+PROMOTIONS_CACHE = CacheNamespace('promotions', local=True)
+
+
+@cached(PROMOTIONS_CACHE, tags=['promo:*'])
+def _active_promotion_rows(day: datetime.date) -> List[tuple]:
+    return model_rows(current_promos(day))
 
 
-def get_active_promotions(cache_key: str = None,
-                          cache_time: int = settings.CACHE_STORAGE_TIME) -> QuerySet:
+def get_active_promotions() -> List[Promo]:
     """
-    Возвращает кэшированный список активных акций
-    :param cache_key: ключ кеша
-    :param cache_time: время кэширования в секундах
-    :return:
+    Возвращает кэшированный список активных акций, действующих сегодня.
+    В кеше хранятся значения полей, объекты акций восстанавливаются без запросов к базе данных.
+    :return: список акций
     """
-    promotions = Promo.objects.filter(is_active=True)
+    return model_instances(Promo, _active_promotion_rows(timezone.localdate()))
+
+
+def _promo_products(promo: Promo) -> QuerySet:
+    """Товары акции; если товары акции не заданы - все товары."""
+    links = promo.promo2products.first()
+    products = links.product.all() if links is not None else Product.objects.all()
+    return products.order_by('id')
+
 
-    if cache_key is None:
-        cache_key = 'promotions'
-    cached_data = cache.get_or_set(cache_key, promotions, cache_time)
+@cached(PROMOTIONS_CACHE, key=lambda promo: [promo.id], tags=lambda promo: [f'promo:{promo.id}'])
+def _promo_product_ids(promo: Promo) -> Optional[List[int]]:
+    """Id товаров акции в порядке id; None, если товары акции не заданы и в акцию входят все товары."""
+    links = promo.promo2products.first()
+    if links is None:
+        return None
+    return list(links.product.order_by('id').values_list('id', flat=True))
 
-    return cached_data
 
+def _load_products(product_ids: List[int]) -> List[Product]:
+    """Загружает товары страницы одним запросом в порядке id."""
+    products = Product.objects.select_related('category').annotate(avg_price=Avg('offers__price')).\
+        in_bulk(product_ids)
+    return [products[pk] for pk in product_ids if pk in products]
 
-def get_related_products(obj, request: HttpRequest, cache_key: str = None,
-                         cache_time: int = settings.CACHE_STORAGE_TIME):
+
+def get_related_products(obj, request: HttpRequest):
     """
-    Возвращает кэшированный список продуктов, связанных с акцией
+    Возвращает страницу продуктов, связанных с акцией.
+    В кеше хранятся только id товаров акции, товары страницы загружаются одним запросом.
     :param obj: экземпляр модели акции
     :param request: Http request
-    :param cache_key: ключ кеша
-    :param cache_time: время кэширования в секундах
     :return:
     """
-    if cache_key is None:
-        cache_key = f'product_in_{obj.id}'
-
-    product_list = obj.promo2products.first()
-    if hasattr(product_list, 'product'):
-        product_list = product_list.product. \
-            select_related('category')
-    else:
-        product_list = Product.objects.\
-            select_related('category')
-
-    product_list = product_list.annotate(avg_price=Avg('offers__price')).order_by('id')
-
-    cached_products = cache.get_or_set(cache_key, product_list, cache_time)
-
     promo_product_per_page = request.session.get(settings.ADMIN_SETTINGS_ID)
     if promo_product_per_page is None or promo_product_per_page.get('PROMO_PRODUCTS_PER_PAGE') is None:
         count_per_page = settings.PROMO_PRODUCTS_PER_PAGE
     else:
         count_per_page = promo_product_per_page['PROMO_PRODUCTS_PER_PAGE']
 
-    paginator = Paginator(cached_products, count_per_page)
-    page_number = request.GET.get('page')
-    products = paginator.get_page(page_number)
+    if is_cursor_mode(request, settings.PROMO_PRODUCTS_PAGINATION_MODE):
+        product_list = _promo_products(obj).select_related('category').annotate(avg_price=Avg('offers__price'))
+        paginator = CursorPaginator(product_list, count_per_page,
+                                    count_limit=settings.PAGINATION_APPROXIMATE_COUNT_LIMIT)
+        return paginator.page(request.GET.get(CURSOR_PARAM))
+
+    product_ids = _promo_product_ids(obj)
+    if product_ids is None:
+        # id всех товаров не кешируются: новые товары сразу попадают в акцию
+        product_ids = Product.objects.order_by('id').values_list('id', flat=True)
+    paginator = Paginator(product_ids, count_per_page)
+    products = paginator.get_page(request.GET.get('page'))
+    products.object_list = _load_products(list(products.object_list))
 
     return products
@@ -0,0 +1,64 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from product.models import Offer
+from promotions.models import Promo, Promo2Product, PromoType
+from promotions.pricing import bump_price_versions
+from promotions.scheduler import drop_pending_prices, refresh_promotions
+
+
+def update_promotion_index(promo_ids) -> None:
+    """Обновляет индекс акций и версии цен товаров после фиксации транзакции."""
+    promo_ids = list(promo_ids)
+    transaction.on_commit(lambda: refresh_promotions(promo_ids))
+
+
+def update_promo_prices(product_ids) -> None:
+    """Сбрасывает цены товаров с учетом акций, в том числе рассчитанные на завтра, после фиксации транзакции."""
+    product_ids = list(product_ids)
+
+    def update():
+        bump_price_versions(product_ids)
+        drop_pending_prices(product_ids)
+
+    transaction.on_commit(update)
+
+
+@receiver([post_save, post_delete], sender=Promo)
+def update_index_on_promo_change(sender, instance, **kwargs):
+    """Обновляет индекс при изменении акции."""
+    update_promotion_index([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Promo2Product)
+def update_index_on_promo_link_change(sender, instance, **kwargs):
+    """Обновляет индекс при изменении связи акции с товарами."""
+    update_promotion_index([instance.promo_id])
+
+
+@receiver(m2m_changed, sender=Promo2Product.product.through)
+def update_index_on_promo_products_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Обновляет индекс при добавлении или удалении товаров акции."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        update_promotion_index([instance.promo_id])
+    elif action == 'pre_clear':
+        # при очистке акций товара связи известны только до удаления
+        update_promotion_index(instance.promo2products.values_list('promo_id', flat=True))
+    else:
+        update_promotion_index(Promo2Product.objects.filter(id__in=pk_set).values_list('promo_id', flat=True))
+
+
+@receiver(post_save, sender=PromoType)
+def update_index_on_promo_type_save(sender, instance, created, **kwargs):
+    """Обновляет индекс при изменении типа акций."""
+    if not created:
+        update_promotion_index(instance.promos.values_list('id', flat=True))
+
+
+@receiver([post_save, post_delete], sender=Offer)
+def update_prices_on_offer_change(sender, instance, **kwargs):
+    """Сбрасывает цены товара с учетом акций при изменении предложения."""
+    update_promo_prices([instance.product_id])
@@ -0,0 +1,15 @@
+from celery import shared_task
+
+from promotions.scheduler import prewarm_promotions, run_promo_schedule
+
+
+@shared_task
+def apply_promo_schedule():
+    """Активирует и завершает акции по датам начала и окончания."""
+    return run_promo_schedule()
+
+
+@shared_task
+def prewarm_promo_caches():
+    """Заранее готовит индекс акций и цены товаров к началу следующего дня."""
+    return prewarm_promotions()
@@ -0,0 +1,87 @@
+import random
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+from django.test import SimpleTestCase, tag
+
+from promotions.batch_discount import best_discounts, calculate_discounts, discounted_prices, from_cents, \
+    promo_params, to_cents
+from promotions.discount_handlers import DISCOUNT_HANDLERS
+from promotions.models import Promo, PromoType
+
+CENT = Decimal('0.01')
+
+
+def make_promo(rnd: random.Random, promo_id: int, code: int) -> Promo:
+    """Создает акцию со случайными параметрами, включая нулевые значения."""
+    return Promo(id=promo_id, promo_type=PromoType(name=f'type {code}', code=code),
+                 discount=rnd.choice([0, 0, rnd.randint(1, 99)]),
+                 fix_discount=rnd.choice([Decimal(0), Decimal(rnd.randint(1, 100000)).scaleb(-2)]),
+                 quantity=rnd.choice([0, 1, rnd.randint(2, 10)]))
+
+
+def scalar_discount(price: Decimal, quantity: int, promo: Promo) -> Decimal:
+    """Скидка скалярного обработчика, округленная до копейки."""
+    discount = DISCOUNT_HANDLERS[promo.promo_type.code]({'price': str(price), 'quantity': quantity}, promo)
+    return Decimal(discount).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+@tag('discount')
+class BatchDiscountTest(SimpleTestCase):
+    """ Тесты векторного расчета скидок. """
+
+    def setUp(self):
+        self.rnd = random.Random(2023)
+
+    def test_equivalence_with_handlers(self):
+        """Тест, что векторный расчет совпадает со скалярными обработчиками до копейки."""
+        for code in DISCOUNT_HANDLERS:
+            with self.subTest(code=code):
+                promos = [make_promo(self.rnd, i, code) for i in range(2000)]
+                prices = [Decimal(self.rnd.randint(1, 10 ** 7)).scaleb(-2) for _ in promos]
+                quantities = [self.rnd.randint(0, 30) for _ in promos]
+                params = promo_params(promos)
+
+                result = from_cents(calculate_discounts(params['codes'], to_cents(prices), quantities,
+                                                        params['discounts'], params['fix_discounts'],
+                                                        params['promo_quantities']))
+
+                expected = [scalar_discount(price, quantity, promo)
+                            for price, quantity, promo in zip(prices, quantities, promos)]
+                self.assertEqual(result, expected)
+
+    def test_half_cent_rounding(self):
+        """Тест округления половины копейки вверх."""
+        promo = Promo(id=1, promo_type=PromoType(code=1), discount=5, fix_discount=0, quantity=1)
+        params = promo_params([promo])
+        # 0.10 * 5% = 0.005
+        result = calculate_discounts(params['codes'], to_cents(['0.10']), [1], params['discounts'],
+                                     params['fix_discounts'], params['promo_quantities'])
+        self.assertEqual(from_cents(result), [scalar_discount(Decimal('0.10'), 1, promo)])
+        self.assertEqual(from_cents(result), [Decimal('0.01')])
+
+    def test_unknown_code(self):
+        """Тест, что для акций без обработчика скидка нулевая."""
+        result = calculate_discounts([2], [10000], [3], [50], [100], [1])
+        self.assertEqual(result.tolist(), [0])
+
+    def test_best_discounts(self):
+        """Тест выбора наибольшей скидки для каждого товара."""
+        promos = [make_promo(self.rnd, i, self.rnd.choice([1, 3, 4])) for i in range(20)]
+        promos_by_item = [self.rnd.sample(promos, self.rnd.randint(0, 4)) for _ in range(300)]
+        prices = [Decimal(self.rnd.randint(1, 10 ** 6)).scaleb(-2) for _ in promos_by_item]
+        quantities = [self.rnd.randint(1, 15) for _ in promos_by_item]
+
+        result = from_cents(best_discounts(to_cents(prices), np.array(quantities), promos_by_item))
+
+        expected = [max([scalar_discount(price, quantity, promo) for promo in item_promos], default=Decimal(0))
+                    for price, quantity, item_promos in zip(prices, quantities, promos_by_item)]
+        self.assertEqual(result, [max(value, Decimal(0)) for value in expected])
+
+    def test_discounted_prices(self):
+        """Тест цен со скидкой для списка товаров."""
+        percent = Promo(id=1, promo_type=PromoType(code=1), discount=10, fix_discount=0, quantity=1)
+        fixed = Promo(id=2, promo_type=PromoType(code=1), discount=0, fix_discount=Decimal(500), quantity=1)
+        prices = discounted_prices([Decimal('1000.00'), Decimal('300.00'), Decimal('99.99')],
+                                   [[percent], [percent, fixed], []])
+        self.assertEqual(prices, [Decimal('900.00'), Decimal('0.00'), Decimal('99.99')])
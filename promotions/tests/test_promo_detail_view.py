@@ -6,6 +6,14 @@ from promotions.models import PromoType, Promo, Promo2Product
 from product.models import Product, Category, Offer
 from shop.models import Seller
 from django.conf import settings
+from django.core.cache import cache
+
+LOCAL_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'promo-detail-tests',
+    }
+}
 
 
 @tag('promo-detail')
@@ -102,6 +110,21 @@ class PromoDetailViewTest(TestCase):
         product_list = response.context['page_obj'].object_list
         self.assertEqual(len(product_list), number_elements)
 
+    def test_cursor_pagination(self):
+        """Тест постраничного вывода товаров акции по курсору"""
+        response = self.client.get(self.url + '?cursor=')
+        self.assertEqual(response.status_code, 200)
+        page = response.context['page_obj']
+        self.assertTrue(page.has_next())
+        self.assertEqual(len(page.object_list), settings.PROMO_PRODUCTS_PER_PAGE)
+        response = self.client.get(self.url + f'?cursor={page.next_cursor}')
+        self.assertEqual(response.status_code, 200)
+        second_page = response.context['page_obj']
+        self.assertFalse(second_page.has_next())
+        self.assertTrue(second_page.has_previous())
+        number_elements = Product.objects.all().count() - settings.PROMO_PRODUCTS_PER_PAGE
+        self.assertEqual(len(second_page.object_list), number_elements)
+
     def test_correct_product_list(self):
         """Тест, что передаются только товары, связанные с акцией"""
         # привязываем к акции два товара
@@ -120,3 +143,13 @@ class PromoDetailViewTest(TestCase):
         # кол-во элементов на странице
         product_list = response.context['page_obj'].object_list
         self.assertEqual(len(product_list), len(products_in_promo))
+
+    @override_settings(CACHES=LOCAL_CACHES)
+    def test_new_product_in_promo_for_all_products(self):
+        """Тест, что новый товар сразу попадает в акцию на все товары"""
+        cache.clear()
+        self.client.get(self.url)
+        Product.objects.create(name='product 7', description='product 7 description')
+        response = self.client.get(self.url + '?page=2')
+        self.assertEqual(len(response.context['page_obj'].object_list),
+                         Product.objects.count() - settings.PROMO_PRODUCTS_PER_PAGE)
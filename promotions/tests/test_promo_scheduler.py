@@ -0,0 +1,166 @@
+import datetime
+from decimal import Decimal
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, tag, override_settings
+from django.utils import timezone
+
+from product.models import Category, Offer, Product
+from promotions.index import get_promotion_index, prewarmed_key
+from promotions.models import PromoType, Promo, Promo2Product
+from promotions.pricing import get_price_versions, get_promo_prices
+from promotions.scheduler import prewarm_promotions, run_promo_schedule
+from promotions.services import get_active_promotions
+from shop.models import Seller
+from users.models import CustomUser
+from .test_promotion_index import LOCAL_CACHES
+
+
+@tag('promo-scheduler')
+@override_settings(CACHES=LOCAL_CACHES, PROMO_PREWARM_MINUTES=15)
+class PromoSchedulerTest(TestCase):
+    """ Тесты планировщика акций. """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='fruits', active=True)
+        user = CustomUser.objects.create_user(email='seller@test.ru', password='12345', phone='9787470000')
+        seller = Seller.objects.create(user=user, name='Shop1', description='test', address='test',
+                                       number=1234567890)
+        cls.apple, cls.melon, cls.pear = [Product.objects.create(name=name, description='description',
+                                                                 category=category)
+                                          for name in ('apple', 'melon', 'pear')]
+        cls.offers = {product.id: Offer.objects.create(product=product, seller=seller, price=100)
+                      for product in (cls.apple, cls.melon, cls.pear)}
+        promo_type = PromoType.objects.create(name='promo type 1', code=1)
+        cls.today = timezone.localdate()
+        cls.tomorrow = cls.today + datetime.timedelta(days=1)
+
+        cls.running = cls.create_promo('running', promo_type, [cls.apple], cls.today, is_active=True, discount=10)
+        cls.starting = cls.create_promo('starting', promo_type, [cls.melon], cls.tomorrow + datetime.timedelta(days=3),
+                                        started=cls.tomorrow, discount=20)
+        cls.manual = cls.create_promo('manual', promo_type, [cls.pear], cls.tomorrow)
+
+    @staticmethod
+    def create_promo(name, promo_type, products, finished, is_active=False, started=None, discount=0):
+        promo = Promo.objects.create(name=name, promo_type=promo_type, description='description', started=started,
+                                     finished=finished, is_active=is_active, discount=discount)
+        Promo2Product.objects.create(promo=promo).product.set(products)
+        return promo
+
+    def setUp(self):
+        cache.clear()
+
+    def next_day(self):
+        return mock.patch('django.utils.timezone.localdate', return_value=self.tomorrow)
+
+    def test_schedule(self):
+        """Тест активации и завершения акций по датам."""
+        self.assertEqual(run_promo_schedule(self.today), {'activated': [], 'expired': []})
+        versions = get_price_versions([self.apple.id, self.melon.id, self.pear.id])
+
+        with self.next_day():
+            result = run_promo_schedule(self.tomorrow)
+            self.assertEqual(result, {'activated': [self.starting.id], 'expired': [self.running.id]})
+            self.assertEqual(run_promo_schedule(self.tomorrow), {'activated': [], 'expired': []})
+            self.assertEqual(get_promotion_index().promos_for_product(self.melon.id), [self.starting])
+            self.assertEqual(get_promotion_index().promos_for_product(self.apple.id), [])
+
+        self.assertTrue(Promo.objects.get(id=self.starting.id).is_active)
+        self.assertFalse(Promo.objects.get(id=self.running.id).is_active)
+        self.assertFalse(Promo.objects.get(id=self.manual.id).is_active)
+        new_versions = get_price_versions([self.apple.id, self.melon.id, self.pear.id])
+        self.assertNotEqual(new_versions[self.apple.id], versions[self.apple.id])
+        self.assertNotEqual(new_versions[self.melon.id], versions[self.melon.id])
+        self.assertEqual(new_versions[self.pear.id], versions[self.pear.id])
+
+    def test_disabled_promo_stays_inactive(self):
+        """Тест, что действующая акция, отключенная администратором, не активируется снова."""
+        with self.next_day():
+            run_promo_schedule(self.tomorrow)
+            Promo.objects.filter(id=self.starting.id).update(is_active=False)
+            self.assertEqual(run_promo_schedule(self.tomorrow), {'activated': [], 'expired': []})
+        self.assertEqual(run_promo_schedule(self.tomorrow + datetime.timedelta(days=1)),
+                         {'activated': [], 'expired': []})
+        self.assertFalse(Promo.objects.get(id=self.starting.id).is_active)
+
+    def test_prewarm(self):
+        """Тест подготовки индекса и цен к началу следующего дня."""
+        self.assertEqual(get_promo_prices(self.melon.id), {self.offers[self.melon.id].id: Decimal(100)})
+        midnight = timezone.make_aware(datetime.datetime.combine(self.tomorrow, datetime.time.min))
+        self.assertEqual(prewarm_promotions(midnight - datetime.timedelta(hours=1)), {'promos': 0, 'products': 0})
+        self.assertEqual(prewarm_promotions(midnight - datetime.timedelta(minutes=10)),
+                         {'promos': 2, 'products': 2})
+
+        with self.next_day():
+            with self.assertNumQueries(0):
+                self.assertEqual(get_promotion_index().promos_for_product(self.melon.id), [self.starting])
+            run_promo_schedule(self.tomorrow)
+            with self.assertNumQueries(0):
+                self.assertEqual(get_promo_prices(self.melon.id), {self.offers[self.melon.id].id: Decimal(80)})
+                self.assertEqual(get_promo_prices(self.apple.id), {self.offers[self.apple.id].id: Decimal(100)})
+
+    def test_offer_change_keeps_prewarmed_index(self):
+        """Тест, что изменение предложения сбрасывает только подготовленные цены товара, а не индекс акций."""
+        midnight = timezone.make_aware(datetime.datetime.combine(self.tomorrow, datetime.time.min))
+        prewarm_promotions(midnight - datetime.timedelta(minutes=10))
+        with self.captureOnCommitCallbacks(execute=True):
+            offer = self.offers[self.melon.id]
+            offer.price = 200
+            offer.save()
+        self.assertIsNotNone(cache.get(prewarmed_key(self.tomorrow)))
+
+        with self.next_day():
+            with self.assertNumQueries(0):
+                self.assertEqual(get_promotion_index().promos_for_product(self.melon.id), [self.starting])
+            run_promo_schedule(self.tomorrow)
+            self.assertEqual(get_promo_prices(self.melon.id), {offer.id: Decimal(160)})
+            with self.assertNumQueries(0):
+                self.assertEqual(get_promo_prices(self.apple.id), {self.offers[self.apple.id].id: Decimal(100)})
+
+    def test_prewarm_skips_disabled_promo(self):
+        """Тест, что отключенная администратором акция не попадает в заранее подготовленный индекс."""
+        disabled = self.create_promo('disabled', self.running.promo_type, [self.pear], self.tomorrow,
+                                     started=self.today, discount=30)
+        self.assertEqual(get_promotion_index().promos_for_product(self.pear.id), [])
+        midnight = timezone.make_aware(datetime.datetime.combine(self.tomorrow, datetime.time.min))
+        prewarm_promotions(midnight - datetime.timedelta(minutes=10))
+
+        with self.next_day():
+            run_promo_schedule(self.tomorrow)
+            self.assertEqual(get_promotion_index().promos_for_product(self.pear.id), [])
+        self.assertFalse(Promo.objects.get(id=disabled.id).is_active)
+
+    def test_change_drops_prewarmed(self):
+        """Тест, что изменение акции после подготовки сбрасывает подготовленные данные."""
+        midnight = timezone.make_aware(datetime.datetime.combine(self.tomorrow, datetime.time.min))
+        prewarm_promotions(midnight - datetime.timedelta(minutes=10))
+        with self.captureOnCommitCallbacks(execute=True):
+            Promo.objects.filter(id=self.starting.id).update(discount=50)
+            self.starting.refresh_from_db()
+            self.starting.save()
+
+        with self.next_day():
+            run_promo_schedule(self.tomorrow)
+            self.assertEqual(get_promo_prices(self.melon.id), {self.offers[self.melon.id].id: Decimal(50)})
+
+
+@tag('promo-scheduler')
+@override_settings(CACHES=settings.TEST_CACHES)
+class ActivePromotionsTest(TestCase):
+    """ Тесты списка действующих акций. """
+
+    def test_date_window(self):
+        """Тест, что в список не попадают акции вне периода действия."""
+        promo_type = PromoType.objects.create(name='promo type 1', code=1)
+        today = timezone.localdate()
+        current = Promo.objects.create(name='current', promo_type=promo_type, description='description',
+                                       finished=today, is_active=True)
+        Promo.objects.create(name='expired', promo_type=promo_type, description='description',
+                             finished=today - datetime.timedelta(days=1), is_active=True)
+        Promo.objects.create(name='future', promo_type=promo_type, description='description',
+                             started=today + datetime.timedelta(days=1), finished=today + datetime.timedelta(days=2),
+                             is_active=True)
+        self.assertEqual(list(get_active_promotions()), [current])
@@ -0,0 +1,139 @@
+import datetime
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import models
+from django.test import TestCase, tag, override_settings
+from django.utils import timezone
+
+from product.models import Category, Product
+from promotions.discount import promos_for_product
+from promotions import index as promotion_index
+from promotions.index import PROMO_INDEX_KEY, PROMO_INDEX_LOCK_KEY, get_promotion_index
+from promotions.models import PromoType, Promo, Promo2Product
+
+LOCAL_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'promotion-index-test',
+    }
+}
+
+
+@tag('promo-index')
+@override_settings(CACHES=LOCAL_CACHES)
+class PromotionIndexTest(TestCase):
+    """ Тесты индекса действующих акций. """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='fruits', active=True)
+        cls.apple, cls.melon, cls.pear = [Product.objects.create(name=name, description='description',
+                                                                 category=category)
+                                          for name in ('apple', 'melon', 'pear')]
+        product_type = PromoType.objects.create(name='promo type 1', code=1)
+        cart_type = PromoType.objects.create(name='promo type 5', code=5)
+        today = timezone.localdate()
+
+        cls.product_promo = cls.create_promo('product', product_type, today, [cls.apple, cls.melon])
+        cls.cart_promo = cls.create_promo('cart', cart_type, today, [])
+        cls.inactive_promo = cls.create_promo('inactive', product_type, today, [cls.apple], is_active=False)
+        cls.future_promo = cls.create_promo('future', product_type, today + datetime.timedelta(days=5), [cls.pear],
+                                            started=today + datetime.timedelta(days=1))
+        cls.expired_promo = cls.create_promo('expired', product_type, today - datetime.timedelta(days=1),
+                                             [cls.pear])
+
+    @staticmethod
+    def create_promo(name, promo_type, finished, products, is_active=True, started=None):
+        promo = Promo.objects.create(name=name, promo_type=promo_type, description='description',
+                                     finished=finished, started=started, is_active=is_active, discount=10)
+        Promo2Product.objects.create(promo=promo).product.set(products)
+        return promo
+
+    def setUp(self):
+        cache.clear()
+        self.index = get_promotion_index()
+
+    def test_lookup(self):
+        """Тест поиска действующих акций товаров и акций на всю корзину."""
+        self.assertEqual(self.index.promos_for_product(self.apple.id), [self.product_promo])
+        self.assertEqual(self.index.promos_for_product(self.pear.id), [])
+        self.assertEqual(self.index.cart_promos(), [self.cart_promo])
+        self.assertEqual(self.index.promos_for_products([self.apple.id, self.melon.id, self.pear.id]),
+                         {self.apple.id: [self.product_promo], self.melon.id: [self.product_promo]})
+        self.assertEqual(promos_for_product(self.melon.id), [self.product_promo, self.cart_promo])
+
+    def test_lookup_without_queries(self):
+        """Тест, что построенный индекс используется без запросов к БД."""
+        self.index.rebuild()
+        with self.assertNumQueries(0):
+            self.index.promos_for_product(self.apple.id)
+            self.index.cart_promos()
+
+    def test_shared_snapshot(self):
+        """Тест, что другой процесс получает снимок индекса из кеша."""
+        self.index.rebuild()
+        other = type(self.index)()
+        with self.assertNumQueries(0):
+            self.assertEqual(other.promos_for_product(self.apple.id), [self.product_promo])
+
+    def test_update_on_promo_change(self):
+        """Тест частичного обновления индекса при изменении акции и ее товаров."""
+        self.index.rebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.inactive_promo.is_active = True
+            self.inactive_promo.save()
+        self.assertEqual(self.index.promos_for_product(self.apple.id), [self.product_promo, self.inactive_promo])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product_promo.promo2products.get().product.remove(self.apple)
+        self.assertEqual(self.index.promos_for_product(self.apple.id), [self.inactive_promo])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pear.promo2products.add(self.product_promo.promo2products.get())
+        self.assertEqual(self.index.promos_for_product(self.pear.id), [self.product_promo])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product_promo.delete()
+        self.assertEqual(self.index.promos_for_product(self.pear.id), [])
+        self.assertEqual(self.index.promos_for_product(self.melon.id), [])
+
+    def test_date_rollover(self):
+        """Тест перестроения индекса при смене даты."""
+        self.index.rebuild()
+        tomorrow = timezone.localdate() + datetime.timedelta(days=1)
+        with mock.patch('promotions.index.timezone.localdate', return_value=tomorrow):
+            self.assertEqual(self.index.promos_for_product(self.pear.id), [self.future_promo])
+            self.assertEqual(self.index.promos_for_product(self.apple.id), [])
+            self.assertEqual(self.index.cart_promos(), [])
+
+    def test_cached_snapshot_has_plain_values(self):
+        """Тест, что в кеше хранятся значения полей акций, а не объекты моделей."""
+        self.index.rebuild()
+        snapshot = cache.get(PROMO_INDEX_KEY)['snapshot']
+        self.assertTrue(all(isinstance(row, tuple) for row in snapshot['promos'].values()))
+        self.assertFalse(any(isinstance(value, models.Model)
+                             for row in snapshot['promos'].values() for value in row))
+        promo = type(self.index)().promos_for_product(self.apple.id)[0]
+        self.assertEqual(promo, self.product_promo)
+        self.assertEqual(promo.promo_type.code, 1)
+
+    def test_update_waits_for_lock(self):
+        """Тест, что снимок изменяется под общей блокировкой, а при занятой блокировке строится из БД."""
+        self.index.rebuild()
+        other = type(self.index)()
+        other.promos_for_product(self.apple.id)
+        Promo.objects.filter(id=self.inactive_promo.id).update(is_active=True)
+        self.index.update_promos([self.inactive_promo.id])
+        self.assertIsNone(cache.get(PROMO_INDEX_LOCK_KEY))
+
+        # другой процесс удерживает блокировку
+        cache.add(PROMO_INDEX_LOCK_KEY, 'other', 30)
+        Promo.objects.filter(id=self.product_promo.id).update(is_active=False)
+        with mock.patch.object(promotion_index, 'PROMO_INDEX_LOCK_WAIT', 0), \
+                mock.patch.object(promotion_index, 'build_snapshot', wraps=promotion_index.build_snapshot) as build:
+            affected = other.update_promos([self.product_promo.id])
+        build.assert_called_once_with()
+        self.assertEqual(affected, {self.apple.id, self.melon.id})
+        self.assertEqual(cache.get(PROMO_INDEX_LOCK_KEY), 'other')
+        self.assertEqual(self.index.promos_for_product(self.apple.id), [self.inactive_promo])
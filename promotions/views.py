@@ -1,6 +1,7 @@
 from django.views.generic import ListView, DetailView
 from promotions.models import Promo
 from product.services import get_category
+from promotions.pricing import annotate_promo_prices
 from promotions.services import get_active_promotions, get_related_products
 from django.conf import settings
 
@@ -35,5 +36,6 @@ class PromoDetailView(DetailView):
         context = super().get_context_data(**kwargs)
         context['categories'] = get_category()
         products = get_related_products(self.object, self.request)
+        annotate_promo_prices(products)
         context['page_obj'] = products
         return context
@@ -6,3 +6,6 @@ class ShopConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'shop'
     verbose_name = _('магазин')
+
+    def ready(self):
+        import shop.signals  # noqa: F401
@@ -0,0 +1,365 @@
+# Общий слой кеширования: пространства имен с версиями, загрузка данных только при промахе,
+# хранение простых данных (values()) вместо объектов моделей, теги записей и счетчики попаданий/промахов
+import functools
+import hashlib
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Model, QuerySet
+from django.db.models.fields.files import FieldFile
+from django.dispatch import receiver
+
+# Максимальная длина частей ключа, более длинные части заменяются хешем
+MAX_KEY_PARTS_LENGTH = 150
+
+# Значение-маркер отсутствия записи в кеше (None - допустимое кешируемое значение)
+MISSING = object()
+
+# Тег всех объектов модели: сбрасывается при изменении любого объекта модели
+ALL = '*'
+
+# Счетчики попаданий и промахов по пространствам имен, отдельно в каждом процессе
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _count(namespace: str, event: str) -> None:
+    with _stats_lock:
+        _stats[(namespace, event)] += 1
+
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Возвращает счетчики кеша текущего процесса: попадания в локальный кеш процесса (l1_hit),
+    в общий кеш (l2_hit) и промахи.
+    :return: {пространство имен: {'l1_hit': ..., 'l2_hit': ..., 'miss': ...}}
+    """
+    with _stats_lock:
+        stats = {}
+        for (namespace, event), count in _stats.items():
+            stats.setdefault(namespace, {'l1_hit': 0, 'l2_hit': 0, 'miss': 0})[event] = count
+        return stats
+
+
+def reset_cache_stats() -> None:
+    """Обнуляет счетчики кеша текущего процесса."""
+    with _stats_lock:
+        _stats.clear()
+
+
+class LocalEntry:
+    """Запись локального кеша: версии, с которыми запись сохранена в общий кеш, теги и время проверки версий."""
+    __slots__ = ('version', 'value', 'tags', 'checked_at', 'expires_at')
+
+    def __init__(self, version: tuple, value: Any, tags: Sequence[str] = ()):
+        self.version = version
+        self.value = value
+        self.tags = frozenset(tags)
+        self.checked_at = time.monotonic()
+        self.expires_at = self.checked_at + settings.CACHE_LOCAL_TIMEOUT
+
+
+class LocalCache:
+    """
+    Локальный кеш процесса (LRU): не более CACHE_LOCAL_MAX_ENTRIES записей,
+    запись хранится не дольше CACHE_LOCAL_TIMEOUT секунд.
+    """
+
+    def __init__(self):
+        self._entries: 'OrderedDict[str, LocalEntry]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[LocalEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, version: tuple, value: Any, tags: Sequence[str] = ()) -> None:
+        with self._lock:
+            self._entries[key] = LocalEntry(version, value, tags)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.CACHE_LOCAL_MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_tagged(self, tags: Iterable[str]) -> None:
+        """Удаляет записи, объявившие хотя бы один из тегов."""
+        tags = set(tags)
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if not entry.tags.isdisjoint(tags)]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+local_cache = LocalCache()
+
+
+def local_cache_enabled() -> bool:
+    """Локальный кеш отключен вместе с общим (DummyCache) и при CACHE_LOCAL_TIMEOUT = 0."""
+    return settings.CACHE_LOCAL_TIMEOUT > 0 and not isinstance(caches[DEFAULT_CACHE_ALIAS], DummyCache)
+
+
+@receiver(setting_changed)
+def clear_local_cache_on_setting_change(setting, **kwargs):
+    if setting in ('CACHES', 'CACHE_LOCAL_TIMEOUT', 'CACHE_LOCAL_MAX_ENTRIES'):
+        local_cache.clear()
+
+
+def tag_key(tag: str) -> str:
+    return f'cache-tag:{tag}'
+
+
+def invalidate_tags(tags: Iterable[str]) -> None:
+    """
+    Делает устаревшими записи, объявившие теги. Тег объекта '<модель>:<id>' сбрасывает
+    и тег всех объектов модели '<модель>:*'. Версии тегов хранятся CACHE_TAG_TIMEOUT секунд.
+    :param tags: теги
+    """
+    expanded = set()
+    for tag in tags:
+        expanded.add(tag)
+        expanded.add(f'{tag.split(":", 1)[0]}:{ALL}')
+    cache.set_many({tag_key(tag): time.time_ns() for tag in expanded}, settings.CACHE_TAG_TIMEOUT)
+    # записи других процессов устареют при проверке версий
+    local_cache.delete_tagged(expanded)
+
+
+def invalidate_tags_on_commit(tags: Iterable[str]) -> None:
+    """Сбрасывает теги после фиксации транзакции."""
+    tags = list(tags)
+    transaction.on_commit(lambda: invalidate_tags(tags))
+
+
+class CacheNamespace:
+    """
+    Пространство имен кеша '<имя>:<схема>:<части ключа>'.
+    Запись хранится вместе с поколением пространства имен и версиями своих тегов ('category:3', 'seller:*'):
+    invalidate() увеличивает поколение, и все записи пространства становятся устаревшими без удаления
+    ключей, invalidate_tags() - только записи с этими тегами. Поколение, версии тегов и запись читаются
+    одним обращением к кешу. Схему нужно увеличивать при изменении формата данных.
+    Записи пространства с local=True читаются сначала из локального кеша процесса (L1), затем из общего (L2).
+    """
+
+    def __init__(self, name: str, timeout: Optional[int] = None, schema: int = 1, local: bool = False):
+        """
+        :param name: имя пространства имен
+        :param timeout: время хранения записей в секундах, по умолчанию CACHE_STORAGE_TIME
+        :param schema: версия формата данных
+        :param local: хранить записи также в локальном кеше процесса (для небольших часто читаемых данных)
+        """
+        self.name = name
+        self.timeout = timeout
+        self.schema = schema
+        self.local = local
+        self.generation_key = f'cache-generation:{name}'
+
+    def key(self, parts: Sequence) -> str:
+        """Ключ записи; части ключа с пробелами или слишком длинные заменяются хешем."""
+        suffix = ':'.join(map(str, parts))
+        if len(suffix) > MAX_KEY_PARTS_LENGTH or any(char.isspace() for char in suffix):
+            suffix = hashlib.sha1(suffix.encode()).hexdigest()
+        return f'{self.name}:{self.schema}:{suffix}'
+
+    def _timeout(self, timeout: Optional[int]) -> int:
+        if timeout is None:
+            timeout = self.timeout if self.timeout is not None else settings.CACHE_STORAGE_TIME
+        # запись не должна пережить версии своих тегов
+        return min(timeout, settings.CACHE_TAG_TIMEOUT)
+
+    def _generation(self, stored: Dict[str, Any]) -> int:
+        generation = stored.get(self.generation_key)
+        if generation is None:
+            generation = 1
+            cache.add(self.generation_key, generation, None)
+        return generation
+
+    def _version(self, stored: Dict[str, Any], tags: Sequence[str]) -> tuple:
+        return (self._generation(stored), *(stored.get(tag_key(tag), 0) for tag in tags))
+
+    def _versions(self, tags: Sequence[str]) -> tuple:
+        """Читает текущие поколение и версии тегов."""
+        return self._version(cache.get_many([self.generation_key, *map(tag_key, tags)]), tags)
+
+    def _read_local(self, key: str, tags: Sequence[str]) -> Any:
+        """
+        Возвращает значение из локального кеша процесса. Запись старше CACHE_LOCAL_CHECK_INTERVAL секунд
+        проверяется по версиям в общем кеше: другие процессы сбрасывают записи через поколение и теги.
+        :return: значение или MISSING
+        """
+        entry = local_cache.get(key)
+        if entry is None:
+            return MISSING
+        if time.monotonic() - entry.checked_at >= settings.CACHE_LOCAL_CHECK_INTERVAL:
+            if self._versions(tags) != entry.version:
+                local_cache.delete(key)
+                return MISSING
+            entry.checked_at = time.monotonic()
+        _count(self.name, 'l1_hit')
+        return entry.value
+
+    def _read(self, key: str, tags: Sequence[str]) -> Tuple[tuple, Any]:
+        """
+        Читает запись, поколение и версии тегов одним обращением к кешу.
+        :return: (текущие поколение и версии тегов, значение или MISSING, если записи нет или она устарела)
+        """
+        if self.local and local_cache_enabled():
+            value = self._read_local(key, tags)
+            if value is not MISSING:
+                return (), value
+        stored = cache.get_many([self.generation_key, key, *map(tag_key, tags)])
+        version = self._version(stored, tags)
+        entry = stored.get(key)
+        if entry is not None and entry[0] == version:
+            _count(self.name, 'l2_hit')
+            self._store_local(key, version, entry[1], tags)
+            return version, entry[1]
+        _count(self.name, 'miss')
+        return version, MISSING
+
+    def _store_local(self, key: str, version: tuple, value: Any, tags: Sequence[str]) -> None:
+        if self.local and local_cache_enabled():
+            local_cache.set(key, version, value, tags)
+
+    def _write(self, key: str, version: tuple, value: Any, timeout: Optional[int], tags: Sequence[str]) -> None:
+        cache.set(key, (version, value), self._timeout(timeout))
+        self._store_local(key, version, value, tags)
+
+    def get(self, parts: Sequence, default: Any = None, tags: Sequence[str] = ()) -> Any:
+        """
+        Возвращает значение записи текущего поколения.
+        :param parts: части ключа
+        :param default: значение при отсутствии записи
+        :param tags: теги записи
+        :return: значение
+        """
+        value = self._read(self.key(parts), tags)[1]
+        return default if value is MISSING else value
+
+    def set(self, parts: Sequence, value: Any, timeout: Optional[int] = None, tags: Sequence[str] = ()) -> None:
+        """
+        Сохраняет значение записи.
+        :param parts: части ключа
+        :param value: значение, простые данные без объектов моделей и querysets
+        :param timeout: время хранения в секундах
+        :param tags: теги записи
+        """
+        self._write(self.key(parts), self._versions(tags), value, timeout, tags)
+
+    def get_or_load(self, parts: Sequence, loader: Callable[[], Any], timeout: Optional[int] = None,
+                    tags: Sequence[str] = ()) -> Any:
+        """
+        Возвращает значение записи, при промахе вычисляет его loader и сохраняет.
+        :param parts: части ключа
+        :param loader: функция расчета значения, вызывается только при промахе
+        :param timeout: время хранения в секундах
+        :param tags: теги записи
+        :return: значение
+        """
+        key = self.key(parts)
+        version, value = self._read(key, tags)
+        if value is MISSING:
+            value = loader()
+            self._write(key, version, value, timeout, tags)
+        return value
+
+    def delete(self, parts: Sequence) -> None:
+        key = self.key(parts)
+        cache.delete(key)
+        local_cache.delete(key)
+
+    def invalidate(self) -> None:
+        """Делает устаревшими все записи пространства имен."""
+        local_cache.clear()
+        try:
+            cache.incr(self.generation_key)
+        except ValueError:
+            cache.set(self.generation_key, 2, None)
+
+
+def cached(namespace: CacheNamespace, key: Optional[Callable[..., Sequence]] = None,
+           timeout: Optional[int] = None, tags: Union[Sequence[str], Callable[..., Sequence[str]]] = ()) -> Callable:
+    """
+    Декоратор функции, результат которой кешируется в пространстве имен.
+    Функция вызывается только при промахе, поэтому должна возвращать простые данные.
+    :param namespace: пространство имен
+    :param key: функция, возвращающая части ключа по аргументам, по умолчанию - сами аргументы
+    :param timeout: время хранения в секундах
+    :param tags: теги записи или функция, возвращающая теги по аргументам
+    :return: декоратор
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            parts = key(*args, **kwargs) if key is not None else (*args, *sorted(kwargs.items()))
+            entry_tags = tags(*args, **kwargs) if callable(tags) else tags
+            return namespace.get_or_load([func.__name__, *parts], lambda: func(*args, **kwargs), timeout, entry_tags)
+
+        wrapper.namespace = namespace
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+
+def _attnames(model) -> List[str]:
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def model_rows(queryset: QuerySet, *extra: str) -> List[tuple]:
+    """
+    Сериализует объекты queryset в кортежи значений полей модели для хранения в кеше.
+    :param queryset: queryset
+    :param extra: дополнительные поля (аннотации, поля связанных моделей)
+    :return: список кортежей значений
+    """
+    return list(queryset.values_list(*_attnames(queryset.model), *extra))
+
+
+def model_row(instance: Model) -> tuple:
+    """
+    Сериализует объект модели в кортеж значений полей, как model_rows.
+    :param instance: объект модели
+    :return: кортеж значений
+    """
+    values = (getattr(instance, name) for name in _attnames(type(instance)))
+    # файлы хранятся по имени, как их возвращает values_list
+    return tuple(value.name if isinstance(value, FieldFile) else value for value in values)
+
+
+def model_instances(model, rows: Iterable[tuple], *extra: str) -> List[Model]:
+    """
+    Восстанавливает объекты модели из кортежей model_rows без обращения к базе данных.
+    :param model: модель
+    :param rows: кортежи значений
+    :param extra: дополнительные поля, переданные в model_rows, становятся атрибутами объектов
+    :return: список объектов
+    """
+    names = _attnames(model)
+    instances = []
+    for row in rows:
+        instance = model.from_db(DEFAULT_DB_ALIAS, names, row[:len(names)])
+        for name, value in zip(extra, row[len(names):]):
+            setattr(instance, name, value)
+        instances.append(instance)
+    return instances
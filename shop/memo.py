@@ -0,0 +1,143 @@
+# Запоминание результатов повторных обращений в пределах одного запроса: объекты моделей по id
+# (identity map) и результаты функций сервисов, отчет об исключенных повторных запросах
+import contextvars
+import functools
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from django.conf import settings
+from django.db.models import Model
+
+logger = logging.getLogger(__name__)
+
+_current_memo = contextvars.ContextVar('request_memo', default=None)
+
+
+class RequestMemo:
+    """Значения, запомненные в пределах запроса, и кол-во повторных обращений к ним."""
+
+    def __init__(self):
+        self.values: Dict[tuple, Any] = {}
+        self.hits = Counter()
+
+    def get_or_call(self, key: tuple, label: str, func: Callable[[], Any]) -> Any:
+        """
+        Возвращает запомненное значение, при первом обращении вычисляет его func.
+        :param key: ключ значения
+        :param label: название обращения для отчета
+        :param func: функция расчета значения
+        :return: значение
+        """
+        if key in self.values:
+            self.hits[label] += 1
+            return self.values[key]
+        value = self.values[key] = func()
+        return value
+
+    def report(self) -> Dict[str, int]:
+        """Возвращает кол-во повторных обращений, исключенных по каждому обращению."""
+        return dict(self.hits.most_common())
+
+
+def get_request_memo() -> Optional[RequestMemo]:
+    """Возвращает запомненные значения текущего запроса или None вне запроса."""
+    return _current_memo.get()
+
+
+@contextmanager
+def request_memo():
+    """Включает запоминание значений в пределах блока (запроса, задачи)."""
+    memo = RequestMemo()
+    token = _current_memo.set(memo)
+    try:
+        yield memo
+    finally:
+        _current_memo.reset(token)
+
+
+def memoize_per_request(func: Callable) -> Callable:
+    """
+    Декоратор функции, результат которой запоминается в пределах запроса по аргументам.
+    Вне запроса и при нехешируемых аргументах функция вызывается каждый раз.
+    """
+    label = f'{func.__module__}.{func.__qualname__}'
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        memo = get_request_memo()
+        if memo is None:
+            return func(*args, **kwargs)
+        key = (label, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return func(*args, **kwargs)
+        return memo.get_or_call(key, label, lambda: func(*args, **kwargs))
+
+    return wrapper
+
+
+def _object_key(model, pk) -> tuple:
+    return ('object', model._meta.label, str(pk))
+
+
+def get_instance(model, pk) -> Model:
+    """
+    Возвращает объект модели по id; в пределах запроса объект загружается один раз.
+    :param model: модель
+    :param pk: id объекта
+    :return: объект модели
+    :raises model.DoesNotExist: если объекта нет
+    """
+    memo = get_request_memo()
+    if memo is None:
+        return model._default_manager.get(pk=pk)
+    return memo.get_or_call(_object_key(model, pk), model._meta.label,
+                            lambda: model._default_manager.get(pk=pk))
+
+
+def get_instances(model, pks: Iterable) -> Dict[Any, Model]:
+    """
+    Возвращает объекты модели по id одним запросом; объекты, уже загруженные в запросе, не запрашиваются.
+    :param model: модель
+    :param pks: id объектов
+    :return: объекты по id, отсутствующие в базе данных объекты пропускаются
+    """
+    pks = list(pks)
+    memo = get_request_memo()
+    if memo is None:
+        return model._default_manager.in_bulk(pks)
+    objects, missing = {}, []
+    for pk in pks:
+        key = _object_key(model, pk)
+        if key in memo.values:
+            memo.hits[model._meta.label] += 1
+            objects[pk] = memo.values[key]
+        else:
+            missing.append(pk)
+    if missing:
+        loaded = model._default_manager.in_bulk(missing)
+        for pk in missing:
+            if pk in loaded:
+                objects[pk] = memo.values[_object_key(model, pk)] = loaded[pk]
+    return objects
+
+
+class RequestMemoMiddleware:
+    """
+    Включает запоминание значений на время обработки запроса (включая отрисовку шаблона).
+    При REQUEST_MEMO_REPORT в журнал пишется отчет об исключенных повторных обращениях.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with request_memo() as memo:
+            response = self.get_response(request)
+        if settings.REQUEST_MEMO_REPORT and memo.hits:
+            logger.debug('%s %s: исключено повторных обращений %s: %s', request.method, request.path,
+                         sum(memo.hits.values()), memo.report())
+        return response
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from shop.cache import invalidate_tags_on_commit
+from shop.models import Seller
+
+
+@receiver([post_save, post_delete], sender=Seller)
+def invalidate_cache_on_seller_change(sender, instance, **kwargs):
+    """Сбрасывает записи кеша, зависящие от продавцов."""
+    invalidate_tags_on_commit([f'seller:{instance.pk}'])
@@ -1,3 +1,225 @@
-from django.test import TestCase  # noqa F401
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, tag, override_settings
+
+from product.facets import get_sellers
+from shop.cache import (CacheNamespace, cache_stats, cached, invalidate_tags, local_cache, model_instances,
+                        model_rows, reset_cache_stats, tag_key)
+from shop.memo import (RequestMemoMiddleware, get_instance, get_instances, get_request_memo, memoize_per_request,
+                       request_memo)
+from shop.models import Seller
+
+LOCAL_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shop-cache-tests',
+    }
+}
+
+TEST_CACHE = CacheNamespace('test')
+LOCAL_TEST_CACHE = CacheNamespace('local-test', local=True)
+
+
+@cached(TEST_CACHE)
+def seller_names(prefix):
+    return list(Seller.objects.filter(name__startswith=prefix).values_list('name', flat=True))
+
+
+@memoize_per_request
+def seller_count(prefix):
+    return Seller.objects.filter(name__startswith=prefix).count()
+
+
+@tag('cache')
+@override_settings(CACHES=LOCAL_CACHES)
+class CacheNamespaceTest(TestCase):
+    """ Тесты общего слоя кеширования. """
+    @classmethod
+    def setUpTestData(cls):
+        for index in range(2):
+            user = get_user_model().objects.create_user(password='test1234', email=f'seller{index}@test.ru',
+                                                        phone=f'900000000{index}')
+            Seller.objects.create(user=user, name=f'Shop {index}', description='test', address='test',
+                                  number=1234567 + index)
+
+    def setUp(self) -> None:
+        cache.clear()
+        local_cache.clear()
+        reset_cache_stats()
+
+    def test_loader_runs_only_on_miss(self):
+        """Тест, что функция расчета вызывается только при промахе и счетчики учитывают обращения."""
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return None
+
+        self.assertIsNone(TEST_CACHE.get_or_load(['none'], loader))
+        self.assertIsNone(TEST_CACHE.get_or_load(['none'], loader))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache_stats()['test'], {'l1_hit': 0, 'l2_hit': 1, 'miss': 1})
+
+    def test_decorator(self):
+        """Тест, что результат декорированной функции кешируется по аргументам."""
+        self.assertEqual(seller_names('Shop'), ['Shop 0', 'Shop 1'])
+        with self.assertNumQueries(0):
+            self.assertEqual(seller_names('Shop'), ['Shop 0', 'Shop 1'])
+        self.assertEqual(seller_names('Shop 1'), ['Shop 1'])
+
+    def test_invalidate(self):
+        """Тест, что после сброса пространства имен записи считаются устаревшими."""
+        seller_names('Shop')
+        Seller.objects.filter(name='Shop 1').delete()
+        self.assertEqual(seller_names('Shop'), ['Shop 0', 'Shop 1'])
+        TEST_CACHE.invalidate()
+        self.assertEqual(seller_names('Shop'), ['Shop 0'])
+
+    def test_schema_version(self):
+        """Тест, что записи разных версий формата данных не пересекаются."""
+        TEST_CACHE.set(['value'], 1)
+        self.assertIsNone(CacheNamespace('test', schema=2).get(['value']))
+        self.assertEqual(TEST_CACHE.get(['value']), 1)
+
+    def test_model_rows(self):
+        """Тест, что объекты моделей восстанавливаются из значений полей без запросов к базе данных."""
+        sellers = Seller.objects.order_by('id')
+        rows = model_rows(sellers, 'user__email')
+        with self.assertNumQueries(0):
+            restored = model_instances(Seller, rows, 'user__email')
+        self.assertEqual(restored, list(sellers))
+        self.assertEqual([seller.name for seller in restored], ['Shop 0', 'Shop 1'])
+        self.assertEqual(restored[0].user__email, 'seller0@test.ru')
+        self.assertFalse(restored[0]._state.adding)
+
+    def test_tags(self):
+        """Тест, что сброс тега объекта сбрасывает только записи этого объекта и всех объектов модели."""
+        TEST_CACHE.set(['first'], 1, tags=['seller:1'])
+        TEST_CACHE.set(['second'], 2, tags=['seller:2'])
+        TEST_CACHE.set(['all'], 3, tags=['seller:*'])
+        TEST_CACHE.set(['category'], 4, tags=['category:1'])
+        invalidate_tags(['seller:1'])
+        self.assertIsNone(TEST_CACHE.get(['first'], tags=['seller:1']))
+        self.assertEqual(TEST_CACHE.get(['second'], tags=['seller:2']), 2)
+        self.assertIsNone(TEST_CACHE.get(['all'], tags=['seller:*']))
+        self.assertEqual(TEST_CACHE.get(['category'], tags=['category:1']), 4)
+
+    def test_seller_change_invalidates_cache(self):
+        """Тест, что изменение продавца сбрасывает кешированный список продавцов."""
+        self.assertEqual([name for _pk, name in get_sellers()], ['Shop 0', 'Shop 1'])
+        with self.captureOnCommitCallbacks(execute=True):
+            Seller.objects.filter(name='Shop 1').first().delete()
+        self.assertEqual([name for _pk, name in get_sellers()], ['Shop 0'])
+
+    def test_local_tier(self):
+        """Тест, что запись локального пространства имен читается из кеша процесса без обращения к общему кешу."""
+        LOCAL_TEST_CACHE.get_or_load(['value'], lambda: 1, tags=['seller:1'])
+        with mock.patch('shop.cache.cache.get_many') as get_many:
+            self.assertEqual(LOCAL_TEST_CACHE.get_or_load(['value'], lambda: 2, tags=['seller:1']), 1)
+        get_many.assert_not_called()
+        local_cache.clear()
+        self.assertEqual(LOCAL_TEST_CACHE.get(['value'], tags=['seller:1']), 1)
+        self.assertEqual(cache_stats()['local-test'], {'l1_hit': 1, 'l2_hit': 1, 'miss': 1})
+
+    def test_local_tier_version_check(self):
+        """Тест, что запись кеша процесса сбрасывается, когда другой процесс изменил версию тега."""
+        LOCAL_TEST_CACHE.set(['value'], 1, tags=['seller:1'])
+        LOCAL_TEST_CACHE.set(['value'], 2, tags=['seller:1'])
+        # другой процесс: версия тега меняется в общем кеше, локальный кеш этого процесса не очищается
+        cache.set(tag_key('seller:1'), 1, None)
+        with override_settings(CACHE_LOCAL_CHECK_INTERVAL=60):
+            self.assertEqual(LOCAL_TEST_CACHE.get(['value'], tags=['seller:1']), 2)
+        with override_settings(CACHE_LOCAL_CHECK_INTERVAL=0):
+            self.assertIsNone(LOCAL_TEST_CACHE.get(['value'], tags=['seller:1']))
+
+    def test_tag_versions_expire(self):
+        """Тест, что версии тегов хранятся ограниченное время, а записи с тегами не дольше версий тегов."""
+        with mock.patch('shop.cache.cache.set_many') as set_many:
+            invalidate_tags(['seller:1'])
+        self.assertEqual(set_many.call_args.args[1], settings.CACHE_TAG_TIMEOUT)
+        with mock.patch('shop.cache.cache.set') as set_entry:
+            TEST_CACHE.set(['value'], 1, timeout=settings.CACHE_TAG_TIMEOUT * 2, tags=['seller:1'])
+        self.assertEqual(set_entry.call_args.args[2], settings.CACHE_TAG_TIMEOUT)
+
+    def test_local_tier_invalidate_tags(self):
+        """Тест, что сброс тегов удаляет из кеша процесса только записи с этими тегами."""
+        LOCAL_TEST_CACHE.set(['first'], 1, tags=['seller:1'])
+        LOCAL_TEST_CACHE.set(['second'], 2, tags=['seller:2'])
+        LOCAL_TEST_CACHE.set(['all'], 3, tags=['seller:*'])
+        LOCAL_TEST_CACHE.set(['category'], 4, tags=['category:1'])
+        invalidate_tags(['seller:1'])
+        self.assertIsNone(local_cache.get(LOCAL_TEST_CACHE.key(['first'])))
+        self.assertIsNone(local_cache.get(LOCAL_TEST_CACHE.key(['all'])))
+        self.assertIsNotNone(local_cache.get(LOCAL_TEST_CACHE.key(['second'])))
+        self.assertIsNotNone(local_cache.get(LOCAL_TEST_CACHE.key(['category'])))
+
+    @override_settings(CACHE_LOCAL_MAX_ENTRIES=2)
+    def test_local_tier_size(self):
+        """Тест, что кеш процесса хранит не больше CACHE_LOCAL_MAX_ENTRIES последних записей."""
+        for index in range(3):
+            LOCAL_TEST_CACHE.set([index], index)
+        LOCAL_TEST_CACHE.get([1])
+        LOCAL_TEST_CACHE.set([3], 3)
+        self.assertEqual(len(local_cache), 2)
+        self.assertIsNotNone(local_cache.get(LOCAL_TEST_CACHE.key([1])))
+        self.assertIsNone(local_cache.get(LOCAL_TEST_CACHE.key([2])))
+
+
+@tag('cache')
+class RequestMemoTest(TestCase):
+    """ Тесты запоминания значений в пределах запроса. """
+    @classmethod
+    def setUpTestData(cls):
+        cls.sellers = []
+        for index in range(2):
+            user = get_user_model().objects.create_user(password='test1234', email=f'memo{index}@test.ru',
+                                                        phone=f'900000001{index}')
+            cls.sellers.append(Seller.objects.create(user=user, name=f'Shop {index}', description='test',
+                                                     address='test', number=1234567 + index))
+
+    def test_memoize_per_request(self):
+        """Тест, что результат функции запоминается только в пределах запроса."""
+        with self.assertNumQueries(2):
+            seller_count('Shop')
+            seller_count('Shop')
+        with request_memo() as memo:
+            with self.assertNumQueries(2):
+                self.assertEqual(seller_count('Shop'), 2)
+                self.assertEqual(seller_count('Shop'), 2)
+                self.assertEqual(seller_count(prefix='Shop 1'), 1)
+        self.assertEqual(memo.report(), {'shop.tests.seller_count': 1})
+        self.assertIsNone(get_request_memo())
+
+    def test_identity_map(self):
+        """Тест, что объект модели загружается один раз за запрос и загруженные объекты не запрашиваются снова."""
+        first, second = self.sellers
+        with request_memo() as memo:
+            with self.assertNumQueries(2):
+                seller = get_instance(Seller, first.pk)
+                self.assertIs(get_instance(Seller, str(first.pk)), seller)
+                sellers = get_instances(Seller, [first.pk, second.pk])
+                self.assertIs(sellers[first.pk], seller)
+                self.assertEqual(sellers[second.pk], second)
+                get_instances(Seller, [second.pk])
+        self.assertEqual(memo.report(), {'shop.Seller': 3})
+        with self.assertRaises(Seller.DoesNotExist):
+            get_instance(Seller, 0)
+
+    @override_settings(REQUEST_MEMO_REPORT=True)
+    def test_middleware(self):
+        """Тест, что middleware включает запоминание на время запроса и пишет отчет."""
+        def view(request):
+            seller_count('Shop')
+            seller_count('Shop')
+            get_instance(Seller, self.sellers[0].pk)
+            get_instance(Seller, self.sellers[0].pk)
+            return HttpResponse()
+
+        with self.assertLogs('shop.memo', 'DEBUG') as logs, self.assertNumQueries(2):
+            RequestMemoMiddleware(view)(RequestFactory().get('/'))
+        self.assertIn('исключено повторных обращений 2', logs.output[0])
+        self.assertIsNone(get_request_memo())